@@ -1,67 +1,69 @@
-from pathlib import Path
+import argparse
 import csv
-import pdfplumber
 import shutil
+import sys
+import time
+from pathlib import Path
 
-PDF_DIR = Path(r"C:\Users\ssar\Desktop\RAG_notes\project\data_raw")
-BAD_DIR = Path(r"C:\Users\ssar\Desktop\RAG_notes\project\data_raw_bad")
-REPORT = Path(r"C:\Users\ssar\Desktop\RAG_notes\project\eval\pdf_audit.csv")
+# Add project root to PYTHONPATH
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
 
-PAGES_TO_CHECK = 10
+from src.pdf_audit import (
+    AUDIT_MANIFEST, MIN_CHARS_THRESHOLD, PAGES_TO_CHECK, load_audit, run_audit, save_audit,
+)
 
-MIN_CHARS_THRESHOLD = 200
+FIELDS = ["pdf", "pages", "pages_checked", "chars_checked", "chars_per_page", "status", "seconds", "error"]
 
-def extract_chars_quick(pdf_path: Path) -> int:
-    total = 0
-    with pdfplumber.open(pdf_path) as pdf:
-        n = min(PAGES_TO_CHECK, len(pdf.pages))
-        for i in range(n):
-            txt = pdf.pages[i].extract_text() or ""
-            total += len(txt)
-    return total
 
 def main():
-    PDF_DIR.mkdir(parents=True, exist_ok=True)
-    BAD_DIR.mkdir(parents=True, exist_ok=True)
-    REPORT.parent.mkdir(parents=True, exist_ok=True)
+    parser = argparse.ArgumentParser(description="Check which PDFs have a usable text layer.")
+    parser.add_argument("--pdf-dir", default=str(ROOT / "data_raw"))
+    parser.add_argument("--report", default=str(ROOT / "eval" / "pdf_audit.csv"))
+    parser.add_argument("--manifest", default=str(ROOT / AUDIT_MANIFEST),
+                        help="JSON read by `python -m src.ingest` to skip NEEDS_OCR/ERROR files")
+    parser.add_argument("--pages-to-check", type=int, default=PAGES_TO_CHECK)
+    parser.add_argument("--min-chars", type=int, default=MIN_CHARS_THRESHOLD)
+    parser.add_argument("--workers", type=int, default=0, help="Processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="Re-audit PDFs that haven't changed")
+    parser.add_argument("--move-bad-to", default=None, help="Move NEEDS_OCR/ERROR PDFs into this directory")
+    args = parser.parse_args()
 
-    pdfs = sorted(PDF_DIR.glob("*.pdf"))
+    pdf_dir = Path(args.pdf_dir)
+    pdfs = sorted(pdf_dir.glob("*.pdf"))
     print("PDFs found:", len(pdfs))
 
-    rows = []
-    bad = []
-
-    for p in pdfs:
-        try:
-            chars = extract_chars_quick(p)
-        except Exception as e:
-            chars = -1
-            rows.append({"pdf": p.name, "chars_checked": chars, "status": "ERROR", "error": str(e)})
-            bad.append(p)
-            continue
-
-        status = "OK" if chars >= MIN_CHARS_THRESHOLD else "NEEDS_OCR"
-        rows.append({"pdf": p.name, "chars_checked": chars, "status": status, "error": ""})
-
-        if status != "OK":
-            bad.append(p)
+    manifest = Path(args.manifest)
+    t0 = time.perf_counter()
+    rows = run_audit(pdfs, workers=args.workers, pages_to_check=args.pages_to_check, min_chars=args.min_chars,
+                     previous=None if args.force else load_audit(manifest))
+    elapsed = time.perf_counter() - t0
+    save_audit(rows, manifest)
 
-    # write report
-    with open(REPORT, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=["pdf", "chars_checked", "status", "error"])
+    report = Path(args.report)
+    report.parent.mkdir(parents=True, exist_ok=True)
+    with open(report, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=FIELDS, extrasaction="ignore")
         w.writeheader()
-        w.writerows(rows)
+        for r in rows:
+            w.writerow({**r, "chars_per_page": "|".join(str(n) for n in r["chars_per_page"])})
 
-    print(f"✅ Wrote report: {REPORT}")
-    print(f"Bad PDFs: {len(bad)}")
+    bad = [r for r in rows if r["status"] != "OK"]
+    print(f"✅ Wrote report: {report}")
+    print(f"✅ Wrote manifest: {manifest}")
+    print(f"Audited in {elapsed:.2f}s | bad PDFs: {len(bad)}")
+    for r in bad:
+        print(f"  {r['status']:<9} {r['pdf']} {r['error']}")
 
-    # move bad pdfs to BAD_DIR (safer than delete)
-    for p in bad:
-        dest = BAD_DIR / p.name
-        if not dest.exists():
-            shutil.move(str(p), str(dest))
+    if args.move_bad_to and bad:
+        bad_dir = Path(args.move_bad_to)
+        bad_dir.mkdir(parents=True, exist_ok=True)
+        for r in bad:
+            dest = bad_dir / r["pdf"]
+            if not dest.exists():
+                shutil.move(str(pdf_dir / r["pdf"]), str(dest))
+        print(f"✅ Moved {len(bad)} PDFs to: {bad_dir}")
 
-    print(f"✅ Moved {len(bad)} PDFs to: {BAD_DIR}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,70 @@
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+# Add project root to PYTHONPATH
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from src.bench_utils import pct
+from src.bm25 import build_bm25_retriever
+from src.eval import load_eval_jsonl
+from src.rerank import Reranker
+from src.retrieve import build_retriever
+
+
+def rank_metrics(runs: List[List[str]], golds: List[List[str]]) -> Dict[str, float]:
+    out = {"hit@1": 0.0, "hit@3": 0.0, "hit@5": 0.0, "mrr@10": 0.0}
+    for ids, gold in zip(runs, golds):
+        gold = set(gold)
+        rank = next((i + 1 for i, cid in enumerate(ids[:10]) if cid in gold), None)
+        if rank is None:
+            continue
+        for k in (1, 3, 5):
+            out[f"hit@{k}"] += rank <= k
+        out["mrr@10"] += 1.0 / rank
+    return {k: v / max(len(runs), 1) for k, v in out.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval quality and added latency of the reranker.")
+    parser.add_argument("--retriever", choices=["tfidf", "bm25"], default="bm25")
+    parser.add_argument("--pool", type=int, default=100)
+    parser.add_argument("--budget-ms", type=float, nargs="*", default=[5.0, 20.0, 50.0])
+    parser.add_argument("--repeat", type=int, default=5, help="timing repetitions per question")
+    args = parser.parse_args()
+
+    chunks_path = str(ROOT / "data_processed" / "chunks.jsonl")
+    bm25 = build_bm25_retriever(chunks_path, exclude_junk=True)
+    tfidf = build_retriever(chunks_path, exclude_junk=True)
+    primary = bm25 if args.retriever == "bm25" else tfidf
+    reranker = Reranker(bm25=bm25, tfidf=tfidf, sentence_store=bm25.sentences)
+
+    items = load_eval_jsonl(ROOT / "eval" / "eval_questions.jsonl")
+    golds = [it.gold_chunk_ids for it in items]
+    pools = [primary.search(it.question, top_k=args.pool) for it in items]
+
+    base = rank_metrics([[h["chunk_id"] for h in p[:10]] for p in pools], golds)
+    print(f"{'run':<22} " + " ".join(f"{k:>7}" for k in base) + f" {'p50 ms':>8} {'p95 ms':>8}")
+    print(f"{args.retriever + ' (no rerank)':<22} " + " ".join(f"{v:7.3f}" for v in base.values()))
+
+    for budget_ms in [None] + list(args.budget_ms):
+        runs, lat = [], []
+        for it, pool in zip(items, pools):
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                out = reranker.rerank(it.question, pool, top_k=10,
+                                      budget_s=budget_ms / 1000 if budget_ms is not None else None)
+                lat.append((time.perf_counter() - t0) * 1000)
+            runs.append([h["chunk_id"] for h in out])
+        m = rank_metrics(runs, golds)
+        name = f"rerank {args.pool}" + (f" @{budget_ms:g}ms" if budget_ms is not None else " (no budget)")
+        print(f"{name:<22} " + " ".join(f"{v:7.3f}" for v in m.values())
+              + f" {statistics.median(lat):8.2f} {pct(lat, 0.95):8.2f}")
+
+
+if __name__ == "__main__":
+    main()
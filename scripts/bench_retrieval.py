@@ -0,0 +1,312 @@
+import argparse
+import csv
+import json
+import math
+import multiprocessing as mp
+import pickle
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+# Add project root to PYTHONPATH
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from src.bench_utils import git_rev, pct
+from src.bm25 import BM25Retriever
+from src.eval import load_eval_jsonl
+from src.synth_corpus import CorpusProfile, synthesize, write_chunks_jsonl
+
+
+def _build_bm25(chunks):
+    return BM25Retriever(chunks)
+
+
+def _build_tfidf(chunks):
+    from src.retrieve import TfidfRetriever
+    return TfidfRetriever(chunks)
+
+
+def _build_sentence(chunks):
+    from src.sentence_index import SentenceIndex
+    return SentenceIndex(chunks)
+
+
+# name -> (build(chunks), search(index, query, top_k), index state that would be persisted).
+# New engines: add an entry here.
+ENGINES: Dict[str, Dict[str, Callable]] = {
+    "bm25": {
+        "build": _build_bm25,
+        "search": lambda r, q, k: r.search_ids(q, top_k=k),
+        "state": lambda r: [r.vocab, r.post_docs, r.post_tfs, r.df, r.term_offsets, r.doc_len],
+        "vocab": lambda r: len(r.vocab),
+    },
+    "tfidf": {
+        "build": _build_tfidf,
+        "search": lambda r, q, k: r.search_ids(q, top_k=k),
+        "state": lambda r: [r.vocab, r.vectorizer.idf_, r.matrix],
+        "vocab": lambda r: len(r.vocab),
+    },
+    "sentence": {
+        "build": _build_sentence,
+        "search": lambda r, q, k: r.search(q, top_k=k),
+        "state": lambda r: [r.sent_ids, r.index.vocab, r.index.post_docs, r.index.post_tfs, r.index.df,
+                            r.index.term_offsets, r.index.doc_len, r.sent_chunk],
+        "vocab": lambda r: len(r.index.vocab),
+    },
+}
+
+
+def _rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        import os
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _peak_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def _run_one(engine: str, corpus: str, queries: List[str], top_k: int, repeat: int, out) -> None:
+    """
+    Child process: build one engine over one corpus and time its queries.
+    A fresh process per run keeps RSS numbers per engine and isolates OOM kills.
+    """
+    spec = ENGINES[engine]
+    chunks = BM25Retriever.load_chunks_jsonl(Path(corpus))
+    rss0, peak0 = _rss_mb(), _peak_mb()
+    t0 = time.perf_counter()
+    index = spec["build"](chunks)
+    build_s = time.perf_counter() - t0
+    rss1, peak1 = _rss_mb(), _peak_mb()
+
+    disk = sum(len(pickle.dumps(x, protocol=pickle.HIGHEST_PROTOCOL)) for x in spec["state"](index))
+
+    search = spec["search"]
+    for q in queries[:5]:
+        search(index, q, top_k)
+    lat = []
+    for _ in range(repeat):
+        for q in queries:
+            t = time.perf_counter()
+            search(index, q, top_k)
+            lat.append((time.perf_counter() - t) * 1000)
+
+    out.put({
+        "status": "ok",
+        "chunks": len(chunks),
+        "vocab": spec["vocab"](index),
+        "build_s": round(build_s, 3),
+        "index_mb": round(rss1 - rss0, 1) if rss0 is not None else None,
+        "build_peak_mb": round(peak1 - peak0, 1) if peak0 is not None else None,
+        "disk_mb": round(disk / 2 ** 20, 2),
+        "p50_ms": round(statistics.median(lat), 3),
+        "p95_ms": round(pct(lat, 0.95), 3),
+        "p99_ms": round(pct(lat, 0.99), 3),
+        "max_ms": round(max(lat), 3),
+        "qps": round(1000 / statistics.fmean(lat), 1),
+    })
+
+
+def run_isolated(engine: str, corpus: Path, queries: List[str], top_k: int, repeat: int,
+                 timeout_s: float) -> Dict[str, Any]:
+    ctx = mp.get_context("spawn")
+    out = ctx.Queue()
+    p = ctx.Process(target=_run_one, args=(engine, str(corpus), queries, top_k, repeat, out))
+    t0 = time.perf_counter()
+    p.start()
+    try:
+        return out.get(timeout=timeout_s)
+    except Exception:
+        if p.is_alive():
+            p.terminate()
+            return {"status": "timeout", "wall_s": round(time.perf_counter() - t0, 1)}
+        return {"status": f"failed (exit {p.exitcode})"}
+    finally:
+        p.join(5)
+
+
+def synthetic_queries(profile: CorpusProfile, n: int, seed: int) -> List[str]:
+    """
+    2-5 word queries of mid-frequency words (frequency ranks 50-5000): realistic posting lengths
+    that grow with the corpus, unlike eval questions whose terms may be rare in synthetic text.
+    """
+    rng = np.random.default_rng(seed)
+    pool = [w for w in profile.words[50:5000] if w.isalpha() and len(w) >= 3]
+    return [" ".join(rng.choice(pool, size=int(rng.integers(2, 6)), replace=False)) for _ in range(n)]
+
+
+def corpus_for(profile: CorpusProfile, scale: float, seed: int, corpus_dir: Path, regen: bool) -> Path:
+    n_chunks = int(round(profile.n_chunks * scale))
+    path = corpus_dir / f"synthetic_{n_chunks}_seed{seed}.jsonl"
+    if regen or not path.exists():
+        t0 = time.perf_counter()
+        write_chunks_jsonl(synthesize(profile, n_chunks, seed=seed), path)
+        print(f"  generated {n_chunks} chunks in {time.perf_counter() - t0:.1f}s -> {path}")
+    return path
+
+
+def growth_exponent(rows: List[Dict[str, Any]], key: str) -> Optional[float]:
+    """
+    Log-log slope of `key` against corpus size between the two largest successful scales
+    (1.0 = linear in the number of chunks).
+    """
+    ok = [r for r in rows if r["status"] == "ok" and r.get(key)]
+    if len(ok) < 2:
+        return None
+    a, b = ok[-2], ok[-1]
+    if a["chunks"] == b["chunks"]:
+        return None
+    return round(math.log(b[key] / a[key]) / math.log(b["chunks"] / a["chunks"]), 2)
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: Path, tolerance: float) -> int:
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    base_rows = {(r["engine"], r["scale"]): r for r in base["results"] if r["status"] == "ok"}
+    print(f"\nvs baseline {baseline_path.name} ({base['meta'].get('git')}), flagging > {tolerance:.0%} worse:")
+    regressions = 0
+    for r in results:
+        b = base_rows.get((r["engine"], r["scale"]))
+        if b is None or r["status"] != "ok":
+            continue
+        parts = []
+        for k in ("build_s", "index_mb", "disk_mb", "p50_ms", "p95_ms"):
+            if not b.get(k) or r.get(k) is None:
+                continue
+            ratio = r[k] / b[k]
+            flag = " !" if ratio > 1 + tolerance else ""
+            regressions += bool(flag)
+            parts.append(f"{k} x{ratio:.2f}{flag}")
+        print(f"  {r['engine']:<9} x{r['scale']:<6g} " + "  ".join(parts))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index build/memory/size and query latency on synthetic corpora.")
+    parser.add_argument("--chunks", default=str(ROOT / "data_processed" / "chunks.jsonl"),
+                        help="Real corpus whose statistics the synthetic corpora copy")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10, 100],
+                        help="Corpus sizes as multiples of the real corpus (e.g. 1 10 100 1000)")
+    parser.add_argument("--engines", default=",".join(ENGINES))
+    parser.add_argument("--synthetic-queries", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout-s", type=float, default=900.0, help="Per engine x scale (build + queries)")
+    parser.add_argument("--max-build-s", type=float, default=300.0, help="Stop scaling an engine past this")
+    parser.add_argument("--max-p95-ms", type=float, default=200.0, help="Stop scaling an engine past this")
+    parser.add_argument("--corpus-dir", default=str(ROOT / "data_processed" / "synthetic"))
+    parser.add_argument("--regen", action="store_true", help="Regenerate cached synthetic corpora")
+    parser.add_argument("--out-dir", default=str(ROOT / "eval" / "bench"))
+    parser.add_argument("--save-baseline", action="store_true", help="Also write retrieval_baseline.json")
+    parser.add_argument("--compare", default=None, help="Baseline JSON (default: out-dir/retrieval_baseline.json)")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Exit non-zero if any metric is more than this much worse than the baseline")
+    args = parser.parse_args()
+
+    engines = [e.strip() for e in args.engines.split(",") if e.strip()]
+    unknown = [e for e in engines if e not in ENGINES]
+    if unknown:
+        raise SystemExit(f"Unknown engines: {unknown} (known: {list(ENGINES)})")
+
+    real_path = Path(args.chunks)
+    profile = CorpusProfile.from_chunks(BM25Retriever.load_chunks_jsonl(real_path))
+    print(f"profile: {profile.n_chunks} chunks, {profile.n_tokens} words, vocab {len(profile.words)}, "
+          f"Heaps K={profile.heaps_k:.2f} beta={profile.heaps_beta:.3f}")
+
+    queries = [it.question for it in load_eval_jsonl(ROOT / "eval" / "eval_questions.jsonl")]
+    queries += synthetic_queries(profile, args.synthetic_queries, args.seed)
+
+    # the real corpus first, as a calibration point for the synthetic x1
+    corpora = [("real", 0.0, real_path)]
+    for scale in sorted(args.scales):
+        corpora.append((f"x{scale:g}", scale, None))
+
+    results: List[Dict[str, Any]] = []
+    stopped: Dict[str, str] = {}
+    for label, scale, path in corpora:
+        print(f"\n[{label}]")
+        for engine in engines:
+            if engine in stopped:
+                results.append({"engine": engine, "corpus": label, "scale": scale, "status": "skipped"})
+                print(f"  {engine:<9} skipped ({stopped[engine]})")
+                continue
+            if path is None:
+                path = corpus_for(profile, scale, args.seed, Path(args.corpus_dir), args.regen)
+            r = {"engine": engine, "corpus": label, "scale": scale,
+                 **run_isolated(engine, path, queries, args.top_k, args.repeat, args.timeout_s)}
+            results.append(r)
+            if r["status"] != "ok":
+                stopped[engine] = f"{r['status']} at {label}"
+                print(f"  {engine:<9} {r['status']}")
+                continue
+            print(f"  {engine:<9} build {r['build_s']:>8.2f}s  index {r['index_mb']} MB  disk {r['disk_mb']} MB  "
+                  f"p50 {r['p50_ms']:.2f} ms  p95 {r['p95_ms']:.2f} ms  p99 {r['p99_ms']:.2f} ms  "
+                  f"vocab {r['vocab']}")
+            if r["build_s"] > args.max_build_s:
+                stopped[engine] = f"build {r['build_s']:.0f}s > {args.max_build_s:g}s at {label}"
+            elif r["p95_ms"] > args.max_p95_ms:
+                stopped[engine] = f"p95 {r['p95_ms']:.0f} ms > {args.max_p95_ms:g} ms at {label}"
+
+    print("\nscaling (log-log slope vs chunks between the two largest scales; 1.0 = linear):")
+    for engine in engines:
+        rows = [r for r in results if r["engine"] == engine and r["scale"] > 0]
+        slopes = {k: growth_exponent(rows, k) for k in ("build_s", "index_mb", "p50_ms", "p95_ms")}
+        note = f"  limit: {stopped[engine]}" if engine in stopped else ""
+        print(f"  {engine:<9} " + "  ".join(f"{k} {v}" for k, v in slopes.items()) + note)
+
+    meta = {
+        "git": git_rev(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": f"{platform.system()} {platform.machine()}",
+        "cpus": mp.cpu_count(),
+        "queries": len(queries),
+        "args": vars(args),
+    }
+    profile_info = {"chunks": profile.n_chunks, "words": profile.n_tokens, "vocab": len(profile.words),
+                    "heaps_k": profile.heaps_k, "heaps_beta": profile.heaps_beta}
+    out = {"meta": meta, "profile": profile_info, "results": results, "limits": stopped}
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stem = f"retrieval_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{meta['git']}"
+    with open(out_dir / f"{stem}.json", "w", encoding="utf-8") as f:
+        json.dump(out, f, indent=2)
+    fields = ["engine", "corpus", "scale", "status", "chunks", "vocab", "build_s", "index_mb", "build_peak_mb",
+              "disk_mb", "p50_ms", "p95_ms", "p99_ms", "max_ms", "qps"]
+    with open(out_dir / f"{stem}.csv", "w", encoding="utf-8", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        w.writeheader()
+        w.writerows(results)
+    print("\n✅ Wrote:", out_dir / f"{stem}.json")
+
+    baseline = Path(args.compare) if args.compare else out_dir / "retrieval_baseline.json"
+    regressions = compare(results, baseline, args.tolerance) if baseline.exists() else 0
+    if args.save_baseline:
+        with open(out_dir / "retrieval_baseline.json", "w", encoding="utf-8") as f:
+            json.dump(out, f, indent=2)
+        print("✅ Wrote:", out_dir / "retrieval_baseline.json")
+    if regressions:
+        sys.exit(f"{regressions} metric(s) more than {args.tolerance:.0%} worse than the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,6 @@
 import sys
 from pathlib import Path
 from typing import List, Dict, Any
-import re
 
 # Add project root to PYTHONPATH
 ROOT = Path(__file__).resolve().parents[1]
@@ -10,6 +9,7 @@ sys.path.append(str(ROOT))
 from src.retrieve import build_retriever           # TF-IDF
 from src.bm25 import build_bm25_retriever          # BM25
 from src.answer import answer_with_citations
+from src.junk import is_junk_chunk
 
 
 # --- Pick demo queries that behave well across manuals ---
@@ -22,41 +22,11 @@ QUERIES = [
 ]
 
 
-def is_junk_chunk(text: str) -> bool:
-    """
-    Heuristic filter for TOC/Index/garbage chunks that often pollute retrieval.
-    Keep it simple + safe (high precision).
-    """
-    t = (text or "").strip()
-    if not t:
-        return True
-
-    low = t.lower()
-
-    # Common TOC / Index markers
-    if low.startswith("index"):
-        return True
-    if "table of contents" in low or low.startswith("contents"):
-        return True
-    if "....." in t:  # typical TOC dot leaders
-        return True
-
-    # Many short lines = likely index/TOC
-    lines = [ln.strip() for ln in t.splitlines() if ln.strip()]
-    if len(lines) >= 18:
-        avg_len = sum(len(ln) for ln in lines) / max(1, len(lines))
-        # Lots of short lines -> looks like index entries
-        if avg_len < 35:
-            return True
-
-    return False
-
-
 def filter_hits(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """Drop junk chunks but preserve ordering/scores of the remaining hits."""
     out = []
     for h in hits:
-        if not is_junk_chunk(h.get("text", "")):
+        if not is_junk_chunk(h):
             out.append(h)
     return out
 
@@ -0,0 +1,266 @@
+import argparse
+import csv
+import itertools
+import json
+import statistics
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Add project root to PYTHONPATH
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+from src.bench_utils import git_rev, pct
+
+
+def load_queries(path: Path) -> List[str]:
+    """
+    JSONL with a "question" (or "query") field per line, or plain text with one query per line.
+    """
+    out = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                obj = json.loads(line)
+                q = obj.get("question") or obj.get("query")
+                if q:
+                    out.append(str(q))
+            else:
+                out.append(line)
+    if not out:
+        raise RuntimeError(f"No queries loaded from {path}")
+    return out
+
+
+class Runner:
+    def __init__(self, url: str, timeout: float, trace: bool, pool: int, extra: Dict[str, Any]):
+        self.url = url.rstrip("/") + "/query"
+        self.timeout = timeout
+        self.trace = trace
+        self.extra = extra
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def one(self, question: str, retriever: str, mode: str, scheduled: Optional[float] = None) -> Dict[str, Any]:
+        payload = {"question": question, "retriever": retriever, "mode": mode, **self.extra}
+        headers = {"X-RAG-Trace": "1"} if self.trace else {}
+        t0 = time.perf_counter()
+        start = scheduled if scheduled is not None else t0
+        rec: Dict[str, Any] = {"status": "error", "queued_ms": (t0 - start) * 1000}
+        try:
+            r = self.session.post(self.url, json=payload, headers=headers, timeout=self.timeout)
+            rec["status"] = str(r.status_code)
+            if r.ok:
+                body = r.json()
+                rec["answered_by"] = body.get("answered_by")
+                rec["cached"] = bool(body.get("cached"))
+                rec["degraded"] = bool(body.get("degraded"))
+                trace = body.get("trace")
+                if trace:
+                    rec["server_ms"] = trace.get("total_ms")
+                    stages: Dict[str, float] = defaultdict(float)
+                    for s in trace.get("stages", []):
+                        stages[s["stage"]] += s["ms"]
+                    rec["stages"] = dict(stages)
+        except requests.Timeout:
+            rec["status"] = "timeout"
+        except requests.RequestException:
+            rec["status"] = "connection"
+        # latency from the scheduled send time, so an overloaded server can't hide queueing (open loop)
+        rec["latency_ms"] = (time.perf_counter() - start) * 1000
+        return rec
+
+
+def run_closed(runner: Runner, queries: List[str], retriever: str, mode: str,
+               concurrency: int, n_requests: int, duration: Optional[float]) -> List[Dict[str, Any]]:
+    it = itertools.cycle(queries)
+    lock = threading.Lock()
+    results: List[Dict[str, Any]] = []
+    deadline = time.perf_counter() + duration if duration else None
+
+    def worker():
+        while True:
+            with lock:
+                if (deadline is None and len(results) + pending[0] >= n_requests) or \
+                        (deadline is not None and time.perf_counter() >= deadline):
+                    return
+                pending[0] += 1
+                q = next(it)
+            rec = runner.one(q, retriever, mode)
+            with lock:
+                pending[0] -= 1
+                results.append(rec)
+
+    pending = [0]
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def run_open(runner: Runner, queries: List[str], retriever: str, mode: str,
+             rate: float, n_requests: int, duration: Optional[float], max_inflight: int) -> List[Dict[str, Any]]:
+    if duration:
+        n_requests = int(rate * duration)
+    it = itertools.cycle(queries)
+    futures = []
+    t0 = time.perf_counter() + 0.05
+    with ThreadPoolExecutor(max_workers=max_inflight) as pool:
+        for i in range(n_requests):
+            scheduled = t0 + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(runner.one, next(it), retriever, mode, scheduled))
+    return [f.result() for f in futures]
+
+
+def summarize(results: List[Dict[str, Any]], wall_s: float) -> Dict[str, Any]:
+    ok = [r for r in results if r["status"] == "200"]
+    lat = [r["latency_ms"] for r in ok]
+    server = [r["server_ms"] for r in ok if r.get("server_ms") is not None]
+    stages: Dict[str, List[float]] = defaultdict(list)
+    for r in ok:
+        for name, ms in (r.get("stages") or {}).items():
+            stages[name].append(ms)
+
+    def rnd(v):
+        return round(v, 3) if v is not None else None
+
+    return {
+        "requests": len(results),
+        "ok": len(ok),
+        "error_rate": round(1 - len(ok) / len(results), 4) if results else None,
+        "errors": dict(Counter(r["status"] for r in results if r["status"] != "200")),
+        "throughput_rps": round(len(ok) / wall_s, 3) if wall_s > 0 else None,
+        "p50_ms": rnd(pct(lat, 0.50)),
+        "p95_ms": rnd(pct(lat, 0.95)),
+        "p99_ms": rnd(pct(lat, 0.99)),
+        "mean_ms": rnd(statistics.fmean(lat)) if lat else None,
+        "max_ms": rnd(max(lat)) if lat else None,
+        "server_p50_ms": rnd(pct(server, 0.50)),
+        "server_p95_ms": rnd(pct(server, 0.95)),
+        "answered_by": dict(Counter(r.get("answered_by") for r in ok)),
+        "cached_rate": round(sum(r.get("cached", False) for r in ok) / len(ok), 4) if ok else None,
+        "degraded_rate": round(sum(r.get("degraded", False) for r in ok) / len(ok), 4) if ok else None,
+        "stages": {
+            name: {"p50_ms": rnd(pct(v, 0.50)), "p95_ms": rnd(pct(v, 0.95)), "n": len(v)}
+            for name, v in sorted(stages.items())
+        },
+    }
+
+
+CSV_FIELDS = ["retriever", "mode", "requests", "ok", "error_rate", "throughput_rps", "p50_ms", "p95_ms",
+              "p99_ms", "mean_ms", "max_ms", "server_p50_ms", "server_p95_ms", "cached_rate", "degraded_rate"]
+
+
+def compare(current: Dict[str, Any], baseline_path: Path) -> None:
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    base_rows = {(s["retriever"], s["mode"]): s for s in base["scenarios"]}
+    print(f"\nvs {baseline_path.name} ({base['meta'].get('git')}):")
+    for s in current["scenarios"]:
+        b = base_rows.get((s["retriever"], s["mode"]))
+        if b is None:
+            continue
+        parts = []
+        for k in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "error_rate"):
+            if s.get(k) is None or not b.get(k):
+                continue
+            parts.append(f"{k} {b[k]} -> {s[k]} ({(s[k] - b[k]) / b[k] * 100:+.1f}%)")
+        print(f"  {s['retriever']}/{s['mode']}: " + ", ".join(parts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay queries against /query and report latency/throughput.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--queries", default=str(ROOT / "eval" / "eval_questions.jsonl"),
+                        help="JSONL with question/query fields, or one query per line")
+    parser.add_argument("--retrievers", default="bm25", help="Comma-separated")
+    parser.add_argument("--modes", default="extractive", help="Comma-separated (extractive, llm, hybrid, sentence)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Closed loop: parallel clients")
+    parser.add_argument("--rate", type=float, default=None, help="Open loop: requests/second (overrides --concurrency)")
+    parser.add_argument("--requests", type=int, default=None, help="Requests per scenario (default: all queries once)")
+    parser.add_argument("--duration", type=float, default=None, help="Seconds per scenario (overrides --requests)")
+    parser.add_argument("--warmup", type=int, default=3, help="Unrecorded requests per scenario (index build, caches)")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--max-inflight", type=int, default=256)
+    parser.add_argument("--no-trace", action="store_true", help="Don't request server-side stage timings")
+    parser.add_argument("--payload", default="{}", help='Extra JSON for every request, e.g. \'{"rerank": true}\'')
+    parser.add_argument("--out-dir", default=str(ROOT / "eval" / "loadtest"))
+    parser.add_argument("--compare", default=None, help="Earlier result JSON to diff against")
+    args = parser.parse_args()
+
+    queries = load_queries(Path(args.queries))
+    n_requests = args.requests or len(queries)
+    pool = args.max_inflight if args.rate else args.concurrency
+    runner = Runner(args.url, args.timeout, trace=not args.no_trace, pool=pool, extra=json.loads(args.payload))
+
+    scenarios = []
+    for retriever in [r.strip() for r in args.retrievers.split(",") if r.strip()]:
+        for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+            for q in queries[:args.warmup]:
+                runner.one(q, retriever, mode)
+            t0 = time.perf_counter()
+            if args.rate:
+                results = run_open(runner, queries, retriever, mode, args.rate, n_requests, args.duration,
+                                   args.max_inflight)
+            else:
+                results = run_closed(runner, queries, retriever, mode, args.concurrency, n_requests, args.duration)
+            s = {"retriever": retriever, "mode": mode, **summarize(results, time.perf_counter() - t0)}
+            scenarios.append(s)
+            print(f"{retriever}/{mode}: {s['ok']}/{s['requests']} ok, {s['throughput_rps']} req/s, "
+                  f"p50 {s['p50_ms']} ms, p95 {s['p95_ms']} ms, p99 {s['p99_ms']} ms")
+            for name, st in s["stages"].items():
+                print(f"    {name:<20} p50 {st['p50_ms']:>9} ms  p95 {st['p95_ms']:>9} ms")
+
+    meta = {
+        "git": git_rev(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "url": args.url,
+        "queries": args.queries,
+        "load": {"rate": args.rate} if args.rate else {"concurrency": args.concurrency},
+        "requests": n_requests,
+        "duration": args.duration,
+        "payload": json.loads(args.payload),
+    }
+    result = {"meta": meta, "scenarios": scenarios}
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stem = f"loadtest_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{meta['git']}"
+    with open(out_dir / f"{stem}.json", "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    with open(out_dir / f"{stem}.csv", "w", encoding="utf-8", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=["git"] + CSV_FIELDS, extrasaction="ignore")
+        w.writeheader()
+        for s in scenarios:
+            w.writerow({"git": meta["git"], **s})
+    print("✅ Wrote:", out_dir / f"{stem}.json")
+    print("✅ Wrote:", out_dir / f"{stem}.csv")
+
+    if args.compare:
+        compare(result, Path(args.compare))
+
+    if any(s["ok"] == 0 for s in scenarios):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,12 @@
 #extractive answers
 import re
-from typing import List, Dict
+from array import array
+from types import SimpleNamespace
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+
+from .chunk_table import ChunkTable, StringTable
 
 print("LOADED: src/answer.py")
 
@@ -101,42 +107,88 @@ def fact_signal_score(sentence: str) -> int:
         score += 1  # table-like specs
     return score
 
-def split_sentences(text: str) -> List[str]:
-    # 1) keep lines, preserve list items
-    raw_lines = [ln.rstrip() for ln in text.splitlines() if ln.strip()]
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
 
-    kept_lines: List[str] = []
-    bullet_items: List[str] = []
+Span = Tuple[int, int]
 
-    for ln in raw_lines:
-        s = ln.strip()
+
+def _strip_span(text: str, start: int, end: int) -> Span:
+    # offsets of text[start:end].strip()
+    part = text[start:end]
+    stripped = part.strip()
+    lead = len(part) - len(part.lstrip())
+    return start + lead, start + lead + len(stripped)
+
+
+def sentence_spans(text: str) -> List[Tuple[Span, ...]]:
+    """
+    split_sentences as offsets into `text`: each sentence is one or more (start, end)
+    segments (a prose sentence can run over several lines), joined with single spaces.
+    """
+    # 1) keep lines, preserve list items
+    lines: List[Span] = []
+    bullet_items: List[Span] = []
+    pos = 0
+    for ln in text.splitlines(keepends=True):
+        start, end = _strip_span(text, pos, pos + len(ln))
+        pos += len(ln)
+        if start == end:
+            continue
+        s = text[start:end]
 
         # keep bullet/list items as standalone candidates
-        if BULLET_RE.match(s):
-            bullet_items.append(BULLET_RE.sub("", s).strip())
+        m = BULLET_RE.match(s)
+        if m:
+            bullet_items.append(_strip_span(text, start + m.end(), end))
             continue
 
         # drop headings/artifacts
         if is_headingish(s):
             continue
 
-        kept_lines.append(s)
+        lines.append((start, end))
+
+    # 2) sentence split for normal prose, on the kept lines joined with spaces
+    cleaned = " ".join(text[a:b] for a, b in lines)
+    line_pos = []
+    c = 0
+    for a, b in lines:
+        line_pos.append(c)
+        c += b - a + 1
 
-    # 2) sentence split for normal prose
-    cleaned = " ".join(kept_lines)
-    sents = re.split(r"(?<=[.!?])\s+", cleaned) if cleaned else []
+    def segments(a: int, b: int) -> Tuple[Span, ...]:
+        # cleaned[a:b] -> the parts of the kept lines it covers
+        out = []
+        for (start, end), c in zip(lines, line_pos):
+            lo, hi = max(a, c), min(b, c + end - start)
+            if lo < hi:
+                out.append((start + lo - c, start + hi - c))
+        return tuple(out)
 
-    out: List[str] = []
+    out: List[Tuple[Span, ...]] = []
 
     # 3) include bullet items (short is OK)
-    out.extend([b for b in bullet_items if len(b) >= 3])
+    out.extend([(b,) for b in bullet_items if b[1] - b[0] >= 3])
 
     # 4) include shorter prose sentences (60 is too strict for manuals)
-    out.extend([s.strip() for s in sents if len(s.strip()) >= 25])
+    if cleaned:
+        piece = 0
+        for m in [*SENTENCE_END_RE.finditer(cleaned), None]:
+            a, b = _strip_span(cleaned, piece, m.start() if m else len(cleaned))
+            if b - a >= 25:
+                out.append(segments(a, b))
+            if m:
+                piece = m.end()
 
     return out
 
 
+def span_text(text: str, segments) -> str:
+    return " ".join(text[a:b] for a, b in segments)
+
+
+def split_sentences(text: str) -> List[str]:
+    return [span_text(text, segs) for segs in sentence_spans(text)]
 
 
 def looks_like_noise(text: str) -> bool:
@@ -173,6 +225,218 @@ def extract_relevant_clause(query: str, sentence: str) -> str:
     return scored[0][1]
 
 
+CLAUSE_SEP_RE = re.compile(r"[;:]")
+
+
+def _clause_spans(sentence: str) -> List[Span]:
+    # extract_relevant_clause's ';' / ':' parts (stripped) as offsets; [] when there is nothing to split
+    if not CLAUSE_SEP_RE.search(sentence):
+        return []
+    bounds = [0, *(x for m in CLAUSE_SEP_RE.finditer(sentence) for x in (m.start(), m.end())), len(sentence)]
+    return [_strip_span(sentence, a, b) for a, b in zip(bounds[::2], bounds[1::2])]
+
+
+# ----------------------------
+# index-time sentence features
+# ----------------------------
+
+def _csr(values: array, dtype) -> np.ndarray:
+    return np.frombuffer(values, dtype=dtype) if len(values) else np.zeros(0, dtype=dtype)
+
+
+class SentenceStore:
+    """
+    Sentence split, token ids, clauses and fact signals of a chunk list, precomputed once
+    and kept in flat arrays (a few buffers, not an object per sentence) so forked
+    workers keep sharing them:
+
+    - chunk i has sentences chunk_sent[i]:chunk_sent[i+1] (none for noise chunks);
+      sentence s is the segments seg_start/seg_end[sent_seg[s]:sent_seg[s+1]] of the
+      chunk text (offsets into it), joined with spaces (see sentence_spans)
+    - term_ids[sent_term[s]:sent_term[s+1]]: sorted ids of tokens(sentence)
+    - fact: fact_signal_score, has_signal: "signal" in the sentence (the "return" rule)
+    - clause_start/end[sent_clause[s]:sent_clause[s+1]]: offsets of its ';' / ':' clauses
+    - chunk_terms[chunk_term[i]:chunk_term[i+1]]: sorted ids of tokens(chunk text)
+
+    `vocab` maps every token of the chunk texts (bm25.tokenize) to its id, in first-seen
+    order, as a StringTable; BM25Retriever indexes with the same table instead of building its own.
+    `chunks` is kept as a ChunkTable (chunk texts / ids in flat buffers too).
+    """
+
+    def __init__(self, chunks, vocab: Optional[StringTable] = None):
+        self.chunks = chunks = ChunkTable.of(chunks)
+
+        noise, fact, has_signal = array("b"), array("b"), array("b")
+        sent_chunk, seg_start, seg_end = array("i"), array("i"), array("i")
+        term_ids, chunk_terms = array("i"), array("i")
+        clause_start, clause_end = array("i"), array("i")
+        chunk_sent, sent_seg, sent_term = array("q", [0]), array("q", [0]), array("q", [0])
+        sent_clause, chunk_term = array("q", [0]), array("q", [0])
+
+        # term -> id while building; frozen into a StringTable below
+        given = vocab
+        vocab: Dict[str, int] = {} if given is None else dict(zip(given, range(len(given))))
+        for ci, text in enumerate(chunks.texts):
+            for t in TOKEN_RE.findall(text):
+                vocab.setdefault(t.lower(), len(vocab))
+            chunk_terms.extend(sorted({vocab[t] for t in tokens(text)}))
+            chunk_term.append(len(chunk_terms))
+
+            noise.append(looks_like_noise(text))
+            if not noise[-1]:
+                for segs in sentence_spans(text):
+                    s = span_text(text, segs)
+                    sent_chunk.append(ci)
+                    for a, b in segs:
+                        seg_start.append(a)
+                        seg_end.append(b)
+                    sent_seg.append(len(seg_start))
+                    term_ids.extend(sorted({vocab.setdefault(t, len(vocab)) for t in tokens(s)}))
+                    sent_term.append(len(term_ids))
+                    fact.append(fact_signal_score(s))
+                    has_signal.append("signal" in s.lower())
+                    for a, b in _clause_spans(s):
+                        clause_start.append(a)
+                        clause_end.append(b)
+                    sent_clause.append(len(clause_start))
+            chunk_sent.append(len(fact))
+
+        self.vocab = given if given is not None and len(vocab) == len(given) else StringTable(vocab)
+        self.noise = _csr(noise, np.int8).astype(bool)
+        self.fact = _csr(fact, np.int8)
+        self.has_signal = _csr(has_signal, np.int8).astype(bool)
+        self.sent_chunk = _csr(sent_chunk, np.int32)
+        self.seg_start, self.seg_end = _csr(seg_start, np.int32), _csr(seg_end, np.int32)
+        self.term_ids, self.chunk_terms = _csr(term_ids, np.int32), _csr(chunk_terms, np.int32)
+        self.clause_start, self.clause_end = _csr(clause_start, np.int32), _csr(clause_end, np.int32)
+        self.chunk_sent, self.sent_seg = _csr(chunk_sent, np.int64), _csr(sent_seg, np.int64)
+        self.sent_term, self.sent_clause = _csr(sent_term, np.int64), _csr(sent_clause, np.int64)
+        self.chunk_term = _csr(chunk_term, np.int64)
+
+    def __len__(self) -> int:
+        return len(self.noise)
+
+    def index_of(self, chunk_id: str) -> Optional[int]:
+        return self.chunks.index_of(chunk_id)
+
+    def sentence_range(self, ci: int) -> range:
+        return range(int(self.chunk_sent[ci]), int(self.chunk_sent[ci + 1]))
+
+    def text(self, si: int) -> str:
+        text = self.chunks.text(int(self.sent_chunk[si]))
+        lo, hi = self.sent_seg[si], self.sent_seg[si + 1]
+        return span_text(text, zip(self.seg_start[lo:hi].tolist(), self.seg_end[lo:hi].tolist()))
+
+    def query_ids(self, q_tokens) -> np.ndarray:
+        """
+        Sorted ids of the query tokens that occur in the corpus.
+        """
+        ids = (self.vocab.get(t) for t in q_tokens)
+        return np.array(sorted({i for i in ids if i is not None}), dtype=np.int32)
+
+    def overlaps(self, ci: int, q_ids: np.ndarray) -> np.ndarray:
+        """
+        Per sentence of chunk `ci`: how many of `q_ids` it contains.
+        """
+        bounds = self.sent_term[self.chunk_sent[ci]:self.chunk_sent[ci + 1] + 1]
+        # a query has a handful of ids: one broadcast compare beats np.isin's setup
+        found = (self.term_ids[bounds[0]:bounds[-1], None] == q_ids).any(axis=1)
+        counts = np.concatenate(([0], np.cumsum(found)))
+        bounds = bounds - bounds[0]
+        return counts[bounds[1:]] - counts[bounds[:-1]]
+
+    def relevant_clause(self, q_tokens: set, si: int) -> str:
+        """
+        extract_relevant_clause on the precomputed clause offsets.
+        """
+        sentence = self.text(si)
+        lo, hi = self.sent_clause[si], self.sent_clause[si + 1]
+        clauses = [sentence[a:b] for a, b in zip(self.clause_start[lo:hi].tolist(), self.clause_end[lo:hi].tolist())]
+        scored = [(len(q_tokens.intersection(tokens(c))), c) for c in clauses]
+        scored = [x for x in scored if x[0] > 0]
+        if not scored:
+            return sentence
+        scored.sort(key=lambda x: (-x[0], len(x[1])))
+        return scored[0][1]
+
+    def context_tokens(self, ci: int, q_tokens) -> set:
+        """
+        The model identifiers (tokens with a digit) among `q_tokens` that occur in
+        tokens(doc_id + text) of chunk `ci`: all that answer_confidence looks up in its context.
+        """
+        q_models = [t for t in q_tokens if re.search(r"\d", t)]
+        if not q_models:
+            return set()
+        ids = self.chunk_terms[self.chunk_term[ci]:self.chunk_term[ci + 1]]
+        doc = set(tokens(self.chunks.doc_id(ci)))
+        out = set()
+        for t in q_models:
+            tid = self.vocab.get(t)
+            k = np.searchsorted(ids, tid) if tid is not None else ids.size
+            if t in doc or (k < ids.size and ids[k] == tid):
+                out.add(t)
+        return out
+
+
+def precompute_sentences(text: str, doc_id: str = "") -> SentenceStore:
+    """
+    One-chunk store (chunk index 0) for text that is not in an index.
+    """
+    return SentenceStore([SimpleNamespace(chunk_id="", doc_id=doc_id, text=text)])
+
+
+def build_sentence_store(chunks, vocab: Optional[StringTable] = None) -> SentenceStore:
+    """
+    Computed once per chunk source when an index is built (see SentenceStore).
+    """
+    return SentenceStore(chunks, vocab=vocab)
+
+
+def sentences_for(h: Dict, store: Optional[SentenceStore]) -> Tuple[SentenceStore, int]:
+    """
+    (store, chunk index) with the sentences of hit `h`; split on the fly when `store` doesn't have it.
+    """
+    ci = store.index_of(h.get("chunk_id")) if store is not None else None
+    if ci is None:
+        return precompute_sentences(h.get("text") or "", h.get("doc_id", "")), 0
+    return store, ci
+
+
+# a fact answer whose values are in the wrong unit stays below any sensible hybrid threshold
+WRONG_UNIT_CONFIDENCE = 0.5
+
+
+def answer_confidence(q_tokens: set, overlap: int, fact: int, text: str, fact_mode: bool,
+                      context_tokens: Optional[set] = None, quantity: Optional[str] = None,
+                      text_quantity: Optional[str] = None) -> float:
+    """
+    0..1 confidence that an extracted sentence/clause answers the question:
+    query-term coverage, plus (fact questions only) spec-like content and a number in the clause.
+    Non-fact answers are capped at 0.5; a few matching sentences rarely answer them fully.
+
+    `context_tokens` (tokens of the source chunk + doc_id, or just the question tokens among them) halves the confidence when a model
+    identifier from the question (a token with a digit, e.g. "ds20") is missing from it:
+    the value is probably for another product.
+
+    `quantity` (spec_index.question_quantity, e.g. "frequency") caps a fact answer at
+    WRONG_UNIT_CONFIDENCE unless the clause leads with a value of that quantity (`text_quantity`,
+    spec_index.value_quantity): a voltage doesn't answer a frequency question, however well the
+    words match, and in a clause spanning a table row the first value is the one it answers with.
+    """
+    coverage = overlap / max(len(q_tokens), 1)
+    if not fact_mode:
+        conf = 0.5 * coverage
+    else:
+        has_number = 1.0 if re.search(r"\d", text) else 0.0
+        conf = 0.6 * coverage + 0.25 * min(fact, 6) / 6.0 + 0.15 * has_number
+        if quantity is not None and text_quantity != quantity:
+            conf = min(conf, WRONG_UNIT_CONFIDENCE)
+    if context_tokens is not None:
+        if any(re.search(r"\d", t) and t not in context_tokens for t in q_tokens):
+            conf *= 0.5
+    return conf
+
+
 # ----------------------------
 # main function
 # ----------------------------
@@ -181,54 +445,68 @@ def answer_with_citations(
     query: str,
     hits: List[Dict],
     max_sentences: int = 3,
+    sentence_store: Optional[SentenceStore] = None,
 ):
     """
     Extractive answer with citations.
     Selects the most query-relevant sentences from retrieved chunks.
     For fact-style questions, extracts a short clause and returns only 1 sentence.
+    "confidence" is the highest answer_confidence over the selected sentences (0 if none).
+
+    `sentence_store` (see build_sentence_store) supplies precomputed sentence
+    features per chunk_id; chunks missing from it are split on the fly.
     """
+    # spec_index imports this module
+    from .spec_index import question_quantity, value_quantity
+
     fact_mode = is_fact_question(query)
+    quantity = question_quantity(query) if fact_mode else None
 
     selected = []      # list of (sentence, chunk_id)
     citations = []     # ordered unique chunk_ids
+    confidence = 0.0
 
-    q_low = query.lower()
+    q_tokens = set(tokens(query))
+    skip_signal = "return" in query.lower()
+    q_ids = sentence_store.query_ids(q_tokens) if sentence_store is not None else None
 
     for h in hits:
         chunk_id = h["chunk_id"]
-        text = h["text"]
 
-        if looks_like_noise(text):
+        store, ci = sentences_for(h, sentence_store)
+        sentences = store.sentence_range(ci)
+        if store.noise[ci] or not sentences:
             continue
 
-        sents = split_sentences(text)
-        if not sents:
-            continue
-
-        ranked = sorted(
-            sents,
-            key=lambda s: (
-                sent_score(query, s)
-                + (fact_signal_score(s) if fact_mode else 0)
-            ),
-            reverse=True,
-        )
-
+        overlaps = store.overlaps(ci, q_ids if store is sentence_store else store.query_ids(q_tokens)).tolist()
+        context = None
+        scored = []
+        for si, overlap in zip(sentences, overlaps):
+            fact = int(store.fact[si])
+            scored.append((overlap + (fact if fact_mode else 0), overlap, fact, si))
 
-        for s in ranked:
-            s_low = s.lower()
+        # stable sort: equal scores keep sentence order
+        scored.sort(key=lambda x: x[0], reverse=True)
 
+        for _, overlap, fact, si in scored:
             # if query is about returning, avoid signaling sentences
-            if "return" in q_low and "signal" in s_low:
+            if skip_signal and store.has_signal[si]:
                 continue
 
-            if sent_score(query, s) == 0:
+            if overlap == 0:
                 continue
 
             if fact_mode:
-                s = extract_relevant_clause(query, s)
+                s = store.relevant_clause(q_tokens, si)
+            else:
+                s = store.text(si)
 
             selected.append((s, chunk_id))
+            if context is None:
+                context = store.context_tokens(ci, q_tokens)
+            confidence = max(confidence, answer_confidence(
+                q_tokens, overlap, fact, s, fact_mode, context,
+                quantity=quantity, text_quantity=value_quantity(s) if quantity else None))
             if chunk_id not in citations:
                 citations.append(chunk_id)
 
@@ -253,6 +531,7 @@ def answer_with_citations(
         return {
             "answer": "No relevant information found in the retrieved documents.",
             "citations": [],
+            "confidence": 0.0,
         }
 
     answer_parts = []
@@ -265,4 +544,5 @@ def answer_with_citations(
     return {
         "answer": answer,
         "citations": citations,
+        "confidence": round(confidence, 3),
     }
@@ -0,0 +1,265 @@
+#LLM answer cache (in-memory LRU + SQLite tier)
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .bm25 import tokenize
+from .metrics import CACHE_REQUESTS
+from .query_utils import _normalize_text
+
+DEFAULT_CACHE_PATH = str(Path("data_processed") / "answer_cache.sqlite")
+
+
+def normalize_question(question: str) -> str:
+    """
+    Case/spacing/punctuation-insensitive form of the question used in cache keys.
+    """
+    return " ".join(tokenize(_normalize_text(question)))
+
+
+def template_hash(template: str) -> str:
+    return hashlib.sha1(template.encode("utf-8")).hexdigest()[:16]
+
+
+def context_fingerprint(hits: List[Dict]) -> str:
+    """
+    Hash of the exact chunk texts sent to the LLM.
+    If any referenced chunk changes, the fingerprint changes and the entry is dropped.
+    """
+    h = hashlib.sha1()
+    for hit in hits:
+        h.update((hit.get("chunk_id") or "").encode("utf-8"))
+        h.update(b"\x00")
+        h.update((hit.get("text") or "").encode("utf-8"))
+        h.update(b"\x01")
+    return h.hexdigest()
+
+
+def make_key(question: str, chunk_ids: List[str], prompt_hash: str, model: str) -> str:
+    payload = json.dumps(
+        [normalize_question(question), list(chunk_ids), prompt_hash, model],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """
+    Two-tier answer cache: a bounded in-memory LRU in front of an optional SQLite file.
+
+    Entries expire after `ttl_s` seconds. Each tier is size-bounded; the SQLite tier
+    evicts least-recently-used rows. Entries are validated against the current
+    context fingerprint on read, and can be invalidated explicitly by chunk_id.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = DEFAULT_CACHE_PATH,
+        max_memory_entries: int = 256,
+        max_disk_entries: int = 10_000,
+        ttl_s: float = 7 * 24 * 3600,
+    ):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_s = ttl_s
+
+        self._mem: "OrderedDict[str, Tuple[float, str, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+        self.hits = 0
+        self.misses = 0
+
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS answer_cache (
+                    key TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS answer_cache_chunks (
+                    key TEXT NOT NULL,
+                    chunk_id TEXT NOT NULL
+                )
+                """
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS ix_answer_cache_chunks ON answer_cache_chunks(chunk_id)"
+            )
+            self._db.commit()
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_s > 0 and now - created_at > self.ttl_s
+
+    def get(self, key: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                created_at, fp, value = entry
+                if fp == fingerprint and not self._expired(created_at, now):
+                    self._mem.move_to_end(key)
+                    self.hits += 1
+                    CACHE_REQUESTS.inc(cache="answer", result="hit")
+                    return dict(value)
+                self._mem.pop(key, None)
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT fingerprint, value, created_at FROM answer_cache WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                if row is not None:
+                    fp, raw, created_at = row
+                    if fp == fingerprint and not self._expired(created_at, now):
+                        self._db.execute(
+                            "UPDATE answer_cache SET accessed_at = ? WHERE key = ?", (now, key)
+                        )
+                        self._db.commit()
+                        value = json.loads(raw)
+                        self._remember(key, created_at, fp, value)
+                        self.hits += 1
+                        CACHE_REQUESTS.inc(cache="answer", result="hit")
+                        return dict(value)
+                    self._delete_keys([key])
+
+            self.misses += 1
+            CACHE_REQUESTS.inc(cache="answer", result="miss")
+            return None
+
+    def put(self, key: str, fingerprint: str, value: Dict[str, Any], chunk_ids: Iterable[str] = ()) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, fingerprint, dict(value))
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO answer_cache (key, fingerprint, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, fingerprint, json.dumps(value, ensure_ascii=False), now, now),
+            )
+            self._db.execute("DELETE FROM answer_cache_chunks WHERE key = ?", (key,))
+            self._db.executemany(
+                "INSERT INTO answer_cache_chunks (key, chunk_id) VALUES (?, ?)",
+                [(key, cid) for cid in dict.fromkeys(chunk_ids)],
+            )
+            self._evict_disk(now)
+            self._db.commit()
+
+    def invalidate_chunks(self, chunk_ids: Iterable[str]) -> int:
+        """
+        Drop every cached answer that used any of `chunk_ids` as context.
+        Returns the number of entries removed.
+        """
+        ids = list(chunk_ids)
+        if not ids:
+            return 0
+        with self._lock:
+            keys = set()
+            for key, (_, _, value) in list(self._mem.items()):
+                if set(value.get("citations", [])) & set(ids):
+                    keys.add(key)
+            if self._db is not None:
+                for cid in ids:
+                    for (key,) in self._db.execute(
+                        "SELECT key FROM answer_cache_chunks WHERE chunk_id = ?", (cid,)
+                    ):
+                        keys.add(key)
+            self._delete_keys(list(keys))
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM answer_cache")
+                self._db.execute("DELETE FROM answer_cache_chunks")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        disk_entries = 0
+        if self._db is not None:
+            with self._lock:
+                disk_entries = self._db.execute("SELECT COUNT(*) FROM answer_cache").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+            "memory_entries": len(self._mem),
+            "disk_entries": disk_entries,
+        }
+
+    # --- internals (caller holds the lock) ---
+
+    def _remember(self, key: str, created_at: float, fingerprint: str, value: Dict[str, Any]) -> None:
+        self._mem[key] = (created_at, fingerprint, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_memory_entries:
+            self._mem.popitem(last=False)
+
+    def _delete_keys(self, keys: List[str]) -> None:
+        for key in keys:
+            self._mem.pop(key, None)
+        if self._db is not None and keys:
+            self._db.executemany("DELETE FROM answer_cache WHERE key = ?", [(k,) for k in keys])
+            self._db.executemany("DELETE FROM answer_cache_chunks WHERE key = ?", [(k,) for k in keys])
+            self._db.commit()
+
+    def _evict_disk(self, now: float) -> None:
+        if self.ttl_s > 0:
+            expired = [
+                k for (k,) in self._db.execute(
+                    "SELECT key FROM answer_cache WHERE created_at < ?", (now - self.ttl_s,)
+                )
+            ]
+            self._delete_keys(expired)
+        n = self._db.execute("SELECT COUNT(*) FROM answer_cache").fetchone()[0]
+        if n > self.max_disk_entries:
+            stale = [
+                k for (k,) in self._db.execute(
+                    "SELECT key FROM answer_cache ORDER BY accessed_at ASC LIMIT ?",
+                    (n - self.max_disk_entries,),
+                )
+            ]
+            self._delete_keys(stale)
+
+
+_CACHE: Optional[AnswerCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """
+    Process-wide cache configured from env vars:
+    RAG_ANSWER_CACHE (sqlite path, "memory" for memory only, "off" to disable),
+    RAG_ANSWER_CACHE_TTL (seconds), RAG_ANSWER_CACHE_SIZE (memory entries).
+    """
+    global _CACHE
+    setting = os.getenv("RAG_ANSWER_CACHE", DEFAULT_CACHE_PATH)
+    if setting.lower() in ("off", "0", "false", "none"):
+        return None
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = AnswerCache(
+                path=None if setting.lower() == "memory" else setting,
+                max_memory_entries=int(os.getenv("RAG_ANSWER_CACHE_SIZE", "256")),
+                ttl_s=float(os.getenv("RAG_ANSWER_CACHE_TTL", str(7 * 24 * 3600))),
+            )
+        return _CACHE
@@ -1,20 +1,50 @@
 #FastAPI backend
+import gc
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
 from functools import lru_cache
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from pathlib import Path
-import re
+import requests
 
 from fastapi.middleware.cors import CORSMiddleware
 
-from .retrieve import build_retriever, build_retriever_from_records
-from .bm25 import build_bm25_retriever, build_bm25_retriever_from_records
-from .answer import answer_with_citations
+from .retrieve import TfidfRetriever
+from .bm25 import BM25Retriever
+from .answer import answer_with_citations, build_sentence_store, is_fact_question
+from .sentence_index import SentenceIndex, answer_from_sentence_index
+from .spec_index import SpecIndex, answer_from_spec_index
+from .junk import classify_chunks
+from .dedup import collapse_chunks, collapse_near_duplicates
+from .chunk_table import ChunkTable, GroupTable
 from .chunks_mssql import load_chunks_from_mssql
 from .llm_ollama import answer_with_llm
+from .llm_gate import LLM_REJECTED, LLMBusy, get_llm_gate
+from .rerank import Reranker
+from .retrieval_cache import CachedRetriever
+from .retrieval_pool import PooledRetriever, fork_available
+from .answer_cache import get_answer_cache
+from .tracing import current_trace, profiled, start_trace
+from .metrics import (
+    EXTRACTIVE_CONFIDENCE, HYBRID_DECISIONS, INDEX_CHUNKS, INDEX_FRESHNESS, INDEX_TERMS, INDEX_UPDATES, LLM_ERRORS, LLM_TIMEOUTS, REQUEST_SECONDS, REQUESTS_TOTAL,
+    memory_breakdown, render_latest, stage,
+)
+
+
+@asynccontextmanager
+async def _lifespan(app):
+    preload_retrievers()
+    yield
+    # retrieval pool workers would otherwise outlive the server
+    for r in list(LOADED_RETRIEVERS.values()):
+        _close_retriever(r)
 
 
-app = FastAPI(title="RAG POC Manuals")
+app = FastAPI(title="RAG POC Manuals", lifespan=_lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -25,90 +55,473 @@ app.add_middleware(
 )
 
 
-def is_junk_chunk(h) -> bool:
-    t = (h.get("text") or "").lower()
-    head = t[:600]
+class QueryIn(BaseModel):
+    question: str
+    top_k: int = 10
+    retriever: str = "bm25"      # "bm25", "tfidf", "bm25_sql", "tfidf_sql"
+    mode: str = "llm"            # "llm", "extractive", "sentence" or "hybrid"
+    trace: bool = False          # return a timing breakdown with the response
+    profile: bool = False        # also cProfile the retrieval step (implies trace)
+    latency_budget_s: float | None = None  # degrade to extractive if the LLM can't make it
+    allow_fallback: bool = True  # False -> 429 instead of an extractive answer when busy
+    collapse_duplicates: bool = False  # merge near-duplicate hits into the best-ranked one
+    sentence_scope: str = "hits"  # mode="sentence": "hits" (top retrieved chunks) or "corpus"
+    spec_lookup: bool | None = None  # answer spec questions from the spec-value index (default: RAG_SPEC_LOOKUP)
+    confidence_threshold: float | None = None  # mode="hybrid" (default: RAG_HYBRID_THRESHOLD)
+    rerank: bool | None = None   # rescore a larger candidate pool (default: RAG_RERANK)
+    rerank_pool: int | None = None
+    rerank_budget_ms: float | None = None
+
+
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RAG_RETRIEVAL_CACHE_SIZE", "1024"))
+# >0: run search in that many forked worker processes sharing the parent's index
+RETRIEVAL_WORKERS = int(os.getenv("RAG_RETRIEVAL_WORKERS", "0"))
+# index one representative per near-duplicate chunk group
+DEDUP_INDEX = os.getenv("RAG_DEDUP", "0").lower() in ("1", "true", "yes")
+
+# answer spec questions ("nominal voltage of the DS20") from extracted spec values, skipping retrieval
+SPEC_LOOKUP = os.getenv("RAG_SPEC_LOOKUP", "0").lower() in ("1", "true", "yes")
+
+# mode="hybrid": fact questions whose extractive answer is at least this confident skip the LLM
+HYBRID_THRESHOLD = float(os.getenv("RAG_HYBRID_THRESHOLD", "0.75"))
+
+# reranking: candidate pool size and per-request time budget
+RERANK = os.getenv("RAG_RERANK", "0").lower() in ("1", "true", "yes")
+RERANK_POOL = int(os.getenv("RAG_RERANK_POOL", "100"))
+RERANK_BUDGET_MS = float(os.getenv("RAG_RERANK_BUDGET_MS", "20"))
+
+# set by src.serve: each forked worker holds its own indexes, and a POST reaches only one of them,
+# so /index/update is refused there instead of leaving the other workers serving the old chunks
+PREFORKED = os.getenv("RAG_PREFORKED", "0") == "1"
+
+# built (and, with RETRIEVAL_WORKERS, forked) at startup; others are built on first use, in-process.
+# With RERANK, their reranker and its BM25 + TF-IDF pair are built at startup too.
+PRELOAD_RETRIEVERS = [n.strip() for n in os.getenv(
+    "RAG_PRELOAD_RETRIEVERS", "bm25" if RETRIEVAL_WORKERS > 0 or RERANK else "").split(",") if n.strip()]
+
+# retrievers built so far (for monitoring endpoints; never triggers a build)
+LOADED_RETRIEVERS = {}
+# serializes builds/swaps; queries read LOADED_RETRIEVERS without it
+_RETRIEVER_LOCK = threading.Lock()
+
 
-    if "contents" in head or "index" in head:
-        return True
+def get_retriever(name: str):
+    r = LOADED_RETRIEVERS.get(name)
+    if r is not None:
+        return r
+    with _RETRIEVER_LOCK:
+        if name not in LOADED_RETRIEVERS:
+            LOADED_RETRIEVERS[name] = _load_retriever(name)
+        return LOADED_RETRIEVERS[name]
+
+
+def _load_retriever(name: str, pooled: bool = False, start_pool: bool = True):
+    """
+    Build `name` and wrap it. `pooled`: run searches in RETRIEVAL_WORKERS forked processes.
+    Pools fork at startup and from /index/update, i.e. on a threadpool thread while other
+    requests run; the locks the workers' searches take (metrics) are re-created in the child.
+    """
+    with stage("retriever_build", retriever=name):
+        r = _build_retriever(name)
+    r.name = name
+    _record_index_size(name, r)
+    if pooled and RETRIEVAL_WORKERS > 0:
+        if fork_available():
+            r = PooledRetriever(r, name, workers=RETRIEVAL_WORKERS, start=start_pool)
+        else:
+            print("RAG_RETRIEVAL_WORKERS ignored: process pool needs the 'fork' start method")
+    if RETRIEVAL_CACHE_SIZE > 0:
+        r = CachedRetriever(r, name, max_entries=RETRIEVAL_CACHE_SIZE)
+    return r
+
+
+def _pool_of(r):
+    if isinstance(r, CachedRetriever):
+        r = r.retriever
+    return r if isinstance(r, PooledRetriever) else None
+
+
+def preload_retrievers() -> None:
+    """
+    Build PRELOAD_RETRIEVERS, freeze everything allocated so far out of the cyclic GC
+    (once, so the workers' collections don't un-share index pages), then fork the pools.
+    """
+    built = {}
+    for name in PRELOAD_RETRIEVERS + _rerank_retrievers():
+        if name not in LOADED_RETRIEVERS and name not in built:
+            built[name] = _load_retriever(name, pooled=name in PRELOAD_RETRIEVERS, start_pool=False)
+    with _RETRIEVER_LOCK:
+        LOADED_RETRIEVERS.update(built)
+    # pools aren't started yet, so until the fork these searches would run in-process
+    _preload_rerankers()
+    pools = [p for p in map(_pool_of, built.values()) if p is not None]
+    if pools:
+        gc.collect()
+        gc.freeze()
+        for p in pools:
+            p.start()
 
-    if "summary of" in head and "guidelines" in head:
-        return True
 
-    if t.count(",") > 25 and len(t) > 800:
-        return True
+@lru_cache(maxsize=4)
+def get_sentence_index(name: str) -> SentenceIndex:
+    r = get_retriever(name)
+    with stage("sentence_index_build", retriever=name):
+        return SentenceIndex(r.chunks, sentence_store=getattr(r, "sentences", None), skip=getattr(r, "junk", None))
 
-    if len(re.findall(r"\b[A-Z]?\d+\-\d+\b", head)) >= 8:
-        return True
 
-    return False
+@lru_cache(maxsize=4)
+def get_spec_index(name: str) -> SpecIndex:
+    r = get_retriever(name)
+    with stage("spec_index_build", retriever=name):
+        return SpecIndex(r.chunks, skip=getattr(r, "junk", None))
 
 
-class QueryIn(BaseModel):
-    question: str
-    top_k: int = 10
-    retriever: str = "bm25"      # "bm25", "tfidf", "bm25_sql", "tfidf_sql"
-    mode: str = "llm"            # "llm" or "extractive"
+# the BM25 + TF-IDF pair over the same chunk source, for reranking features
+RERANK_PAIRS = {
+    "bm25": ("bm25", "tfidf"),
+    "tfidf": ("bm25", "tfidf"),
+    "bm25_sql": ("bm25_sql", "tfidf_sql"),
+    "tfidf_sql": ("bm25_sql", "tfidf_sql"),
+}
 
 
 @lru_cache(maxsize=4)
-def get_retriever(name: str):
-    chunks_path = str(Path("data_processed") / "chunks.jsonl")
+def get_reranker(name: str) -> Reranker:
+    bm25_name, tfidf_name = RERANK_PAIRS.get(name, ("bm25", "tfidf"))
+    bm25 = get_retriever(bm25_name)
+    return Reranker(bm25=bm25, tfidf=get_retriever(tfidf_name), sentence_store=getattr(bm25, "sentences", None))
+
+
+def _rerank_retrievers() -> list[str]:
+    if not RERANK:
+        return []
+    return [n for name in PRELOAD_RETRIEVERS for n in RERANK_PAIRS.get(name, ("bm25", "tfidf"))]
+
 
-    if name == "bm25":
-        return build_bm25_retriever(chunks_path)
+def _preload_rerankers() -> None:
+    """
+    Build the rerankers of the preloaded retrievers, so the first rerank request doesn't
+    spend its budget building the TF-IDF half of the pair and the reranker's term lists.
+    Must not run under _RETRIEVER_LOCK (get_retriever takes it).
+    """
+    if RERANK:
+        for name in PRELOAD_RETRIEVERS:
+            with stage("reranker_build", retriever=name):
+                get_reranker(name)
 
-    if name == "tfidf":
-        return build_retriever(chunks_path)
 
-    # SQL-backed retrievers (SQL is source of truth)
-    if name in ("tfidf_sql", "bm25_sql"):
-        records = load_chunks_from_mssql()  # cached via lru_cache
+def _record_index_size(name: str, r) -> None:
+    INDEX_CHUNKS.set(len(r.chunks), retriever=name)
+    if hasattr(r, "vocab"):
+        INDEX_TERMS.set(len(r.vocab), retriever=name)
 
-        if name == "bm25_sql":
-            return build_bm25_retriever_from_records(records)
-        return build_retriever_from_records(records)
 
-    # default fallback
-    return build_retriever(chunks_path)
+# chunk source ("jsonl" / "mssql") -> (chunks, duplicates, junk classification, sentence store),
+# built once and shared by the BM25 and TF-IDF retrievers over it; dropped on /index/update.
+# All flat buffers (ChunkTable / GroupTable / SentenceStore), so forked workers keep sharing them.
+_CHUNK_SOURCES = {}
+
+
+def _chunk_source(source: str):
+    data = _CHUNK_SOURCES.get(source)
+    if data is None:
+        if source == "mssql":
+            # SQL is source of truth
+            chunks = BM25Retriever.load_chunks_from_records(load_chunks_from_mssql())  # cached via lru_cache
+        else:
+            chunks = BM25Retriever.load_chunks_jsonl(Path("data_processed") / "chunks.jsonl")
+        duplicates = None
+        if DEDUP_INDEX:
+            # index one representative per near-duplicate group
+            chunks, duplicates = collapse_chunks(chunks)
+        chunks = ChunkTable(chunks)
+        data = (chunks, GroupTable.of(duplicates), classify_chunks(chunks), build_sentence_store(chunks))
+        _CHUNK_SOURCES[source] = data
+    return data
+
+
+def _build_retriever(name: str):
+    chunks, duplicates, junk, sentences = _chunk_source("mssql" if name in ("tfidf_sql", "bm25_sql") else "jsonl")
+    # "tfidf" is also the default fallback
+    cls = BM25Retriever if name in ("bm25", "bm25_sql") else TfidfRetriever
+    # junk chunks are flagged at build time and skipped inside top-k selection
+    return cls(chunks, exclude_junk=True, duplicates=duplicates, junk=junk, sentences=sentences)
+
+
+class IndexUpdateIn(BaseModel):
+    doc_ids: list[str] = []              # added/changed/removed documents (their cached answers are dropped)
+    retrievers: list[str] | None = None  # default: every retriever built so far
+    detected_at: float | None = None     # epoch seconds the change was noticed (for freshness)
+
+
+def refresh_retrievers(names: list[str], doc_ids=()) -> dict:
+    """
+    Rebuild `names` from their chunk source and swap them in. Queries keep using the old
+    index until the swap; sentence/spec indexes are rebuilt on next use, the preloaded
+    retrievers' rerankers right after the swap.
+    """
+    doc_ids = set(doc_ids)
+    stale_chunk_ids = []
+    out = {}
+    with _RETRIEVER_LOCK:
+        _CHUNK_SOURCES.clear()
+        for name in names:
+            t0 = time.perf_counter()
+            old = LOADED_RETRIEVERS.get(name)
+            # the new index isn't frozen: a refresh must not pin the old one in the permanent generation
+            new = _load_retriever(name, pooled=old is not None and _pool_of(old) is not None)
+            LOADED_RETRIEVERS[name] = new
+            if old is not None:
+                stale_chunk_ids.extend(ch.chunk_id for ch in old.chunks if ch.doc_id in doc_ids)
+                _close_retriever(old)
+            INDEX_UPDATES.inc(retriever=name)
+            out[name] = {
+                "chunks": len(new.chunks),
+                "index_version": new.index_version,
+                "build_s": round(time.perf_counter() - t0, 3),
+            }
+        get_sentence_index.cache_clear()
+        get_spec_index.cache_clear()
+        get_reranker.cache_clear()
+    _preload_rerankers()
+
+    answer_cache = get_answer_cache()
+    invalidated = answer_cache.invalidate_chunks(stale_chunk_ids) if answer_cache is not None else 0
+    return {"retrievers": out, "answers_invalidated": invalidated}
+
+
+def _close_retriever(r) -> None:
+    # in-flight searches on `r` finish in its pool first (see PooledRetriever.close)
+    pool = _pool_of(r)
+    if pool is not None:
+        pool.close()
+
+
+@app.post("/index/update")
+def index_update(u: IndexUpdateIn):
+    """
+    Called by `python -m src.watch` after new chunks were written (chunks.jsonl / MSSQL).
+    """
+    if PREFORKED:
+        raise HTTPException(status_code=409, detail="preforked server (src.serve): restart it to load new chunks")
+    names = u.retrievers if u.retrievers is not None else list(LOADED_RETRIEVERS)
+    with stage("index_update"):
+        out = refresh_retrievers(names, u.doc_ids)
+    if u.detected_at is not None:
+        out["freshness_s"] = round(time.time() - u.detected_at, 3)
+        INDEX_FRESHNESS.observe(out["freshness_s"])
+    return out
+
+
+@app.get("/index")
+def index_info():
+    """
+    What `python -m src.watch` checks before it starts.
+    """
+    return {
+        "live_updates": not PREFORKED,
+        "retrievers": {name: r.index_version for name, r in LOADED_RETRIEVERS.items()},
+    }
 
 
 @app.post("/query")
-def query(q: QueryIn):
+def query(q: QueryIn, x_rag_trace: str | None = Header(default=None)):
+    t0 = time.perf_counter()
+    mode = q.mode.lower()
+    status = "error"
+
+    # header alternative to the body flags: "X-RAG-Trace: 1" or "X-RAG-Trace: profile"
+    header = (x_rag_trace or "").strip().lower()
+    want_profile = q.profile or header == "profile"
+    want_trace = q.trace or want_profile or header in ("1", "true", "yes")
+
+    try:
+        if want_trace:
+            with start_trace() as trace:
+                out = _answer_query(q, mode, t0, profile=want_profile)
+            out["trace"] = trace.to_dict()
+        else:
+            out = _answer_query(q, mode, t0)
+        status = "ok"
+        return out
+    except HTTPException as e:
+        status = str(e.status_code)
+        raise
+    finally:
+        REQUEST_SECONDS.observe(time.perf_counter() - t0, retriever=q.retriever, mode=mode)
+        REQUESTS_TOTAL.inc(retriever=q.retriever, mode=mode, status=status)
+
+
+def _answer_query(q: QueryIn, mode: str, t0: float, profile: bool = False):
     r = get_retriever(q.retriever)
-    hits = r.search(q.question, top_k=q.top_k)
-
-    filtered_hits = [h for h in hits if not is_junk_chunk(h)]
+    sentence_store = getattr(r, "sentences", None)
+
+    if SPEC_LOOKUP if q.spec_lookup is None else q.spec_lookup:
+        spec_index = get_spec_index(q.retriever)
+        with stage("spec_lookup", retriever=q.retriever):
+            spec = answer_from_spec_index(q.question, spec_index)
+        if spec is not None:
+            hits = r.hits_from_ids([spec_index.chunks.index_of(spec["citations"][0])], [1.0])
+            return {
+                "question": q.question,
+                "answer": spec["answer"],
+                "citations": spec["citations"],
+                "cached": False,
+                "answered_by": "spec_index",
+                "confidence": None,
+                "spec": spec["spec"],
+                "degraded": False,
+                "degrade_reason": None,
+                "expected_wait_s": None,
+                "top_k": hits,
+                "top_k_filtered": hits,
+            }
+    rerank = RERANK if q.rerank is None else q.rerank
+    pool = max(q.rerank_pool or RERANK_POOL, q.top_k) if rerank else q.top_k
+    with profiled(current_trace() if profile else None, key="retrieval_profile"):
+        with stage("retrieval", retriever=q.retriever):
+            hits = r.search(q.question, top_k=pool)
+
+    # no junk pass here: every retriever is built with exclude_junk, so junk chunks never reach the top k
+    filtered_hits = hits
+
+    if rerank:
+        budget_ms = q.rerank_budget_ms if q.rerank_budget_ms is not None else RERANK_BUDGET_MS
+        reranker = get_reranker(q.retriever)
+        with stage("rerank", retriever=q.retriever):
+            filtered_hits = reranker.rerank(q.question, filtered_hits, top_k=q.top_k, budget_s=budget_ms / 1000)
+        hits = hits[:q.top_k]
+
+    if q.collapse_duplicates:
+        with stage("dedup", retriever=q.retriever):
+            filtered_hits = collapse_near_duplicates(filtered_hits)
 
     answer_text = ""
     citations = []
+    cached = False
+    degraded = None
+    confidence = None
+    answered_by = mode
+    extractive = None
+
+    if mode == "hybrid":
+        # extractive first; the LLM only runs when that answer is not confident enough
+        with stage("extractive", retriever=q.retriever):
+            extractive = answer_with_citations(q.question, filtered_hits, max_sentences=3, sentence_store=sentence_store)
+        confidence = extractive["confidence"]
+        EXTRACTIVE_CONFIDENCE.observe(confidence)
+        threshold = q.confidence_threshold if q.confidence_threshold is not None else HYBRID_THRESHOLD
+        if is_fact_question(q.question) and confidence >= threshold:
+            answered_by = "extractive"
+            answer_text = extractive["answer"]
+            citations = extractive["citations"]
+        else:
+            answered_by = "llm"
+        HYBRID_DECISIONS.inc(decision=answered_by)
 
-    if q.mode.lower() == "llm":
+    if answered_by == "llm":
         llm_hits = filtered_hits[:5]  # keep context small
-        llm_out = answer_with_llm(q.question, llm_hits)
+        budget = None
+        if q.latency_budget_s is not None:
+            budget = q.latency_budget_s - (time.perf_counter() - t0)
+        try:
+            with stage("llm", retriever=q.retriever):
+                llm_out = answer_with_llm(q.question, llm_hits, gate=get_llm_gate(), latency_budget_s=budget,
+                                        sentence_store=sentence_store)
+        except LLMBusy as e:
+            if not q.allow_fallback:
+                LLM_REJECTED.inc(reason=e.reason, outcome="429")
+                raise HTTPException(
+                    status_code=429,
+                    detail=str(e),
+                    headers={"Retry-After": str(max(1, int(round(e.retry_after_s))))},
+                )
+            LLM_REJECTED.inc(reason=e.reason, outcome="degraded")
+            degraded = {"reason": e.reason, "expected_wait_s": round(e.expected_wait_s, 3)}
+            llm_out = None
+        except requests.Timeout:
+            LLM_TIMEOUTS.inc()
+            raise
+        except Exception:
+            LLM_ERRORS.inc()
+            raise
 
         # answer_with_llm might return str OR dict; handle both safely
-        if isinstance(llm_out, dict):
+        if llm_out is None:
+            # over budget / queue full: fall back to the extractive answer
+            if extractive is None:
+                with stage("extractive", retriever=q.retriever):
+                    extractive = answer_with_citations(q.question, filtered_hits, max_sentences=3,
+                                                       sentence_store=sentence_store)
+            answer_text = extractive["answer"]
+            citations = extractive.get("citations", [])
+            answered_by = "extractive"
+        elif isinstance(llm_out, dict):
             answer_text = llm_out.get("answer", "")
             citations = llm_out.get("citations", [h["chunk_id"] for h in llm_hits])
+            cached = bool(llm_out.get("cached", False))
         else:
             answer_text = str(llm_out)
             citations = [h["chunk_id"] for h in llm_hits]
 
-    else:
-        out = answer_with_citations(q.question, filtered_hits, max_sentences=3)
+    elif answered_by == "sentence":
+        if q.sentence_scope not in ("hits", "corpus"):
+            raise HTTPException(status_code=400, detail="sentence_scope must be 'hits' or 'corpus'")
+        index = get_sentence_index(q.retriever)
+        with stage("sentence", retriever=q.retriever):
+            out = answer_from_sentence_index(q.question, filtered_hits, index, scope=q.sentence_scope)
         answer_text = out["answer"]
         citations = out.get("citations", [])
 
+    elif mode != "hybrid":
+        with stage("extractive", retriever=q.retriever):
+            out = answer_with_citations(q.question, filtered_hits, max_sentences=3, sentence_store=sentence_store)
+        answer_text = out["answer"]
+        citations = out.get("citations", [])
+        confidence = out.get("confidence")
+        answered_by = "extractive"
+
     return {
         "question": q.question,
         "answer": answer_text,
         "citations": citations,
+        "cached": cached,
+        "answered_by": answered_by,
+        "confidence": confidence,
+        "spec": None,
+        "degraded": degraded is not None,
+        "degrade_reason": degraded["reason"] if degraded else None,
+        "expected_wait_s": degraded["expected_wait_s"] if degraded else None,
         "top_k": hits,
         "top_k_filtered": filtered_hits,
     }
 
-    
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Prometheus text exposition format.
+    """
+    return PlainTextResponse(render_latest(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/debug/cache")
+def debug_cache():
+    retrievers = []
+    for r in LOADED_RETRIEVERS.values():
+        if isinstance(r, CachedRetriever):
+            retrievers.append(r.stats())
+    answer_cache = get_answer_cache()
+    return {
+        "retrieval": retrievers,
+        "answer": answer_cache.stats() if answer_cache is not None else None,
+    }
+
+
+@app.get("/debug/memory")
+def debug_memory():
+    return {"pid": os.getpid(), **memory_breakdown()}
+
 
 @app.get("/debug/env")
 def debug_env():
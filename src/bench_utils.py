@@ -0,0 +1,32 @@
+#Shared helpers for the benchmark / load-test scripts, so their reports are comparable
+import subprocess
+from pathlib import Path
+from typing import List, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def git_rev() -> str:
+    """
+    Short HEAD hash of the repo, "-dirty" when tracked files have changes ("unknown" without git).
+    """
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True)
+        return rev.stdout.strip() + ("-dirty" if dirty.stdout.strip() else "")
+    except OSError:
+        return "unknown"
+
+
+def pct(values: List[float], p: float) -> Optional[float]:
+    """
+    p-th quantile (0..1) of `values`, linearly interpolated between the closest ranks; None if empty.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * p
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
@@ -1,18 +1,50 @@
 #BM25 retriever
+import copy
 import json
-import math
+import os
 import re
+from array import array
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, Any, Optional, Tuple
-from collections import Counter, defaultdict
-from .query_utils import normalize_and_expand_query
+from typing import Dict, Iterable, List, Any, Optional, Tuple
+from collections import Counter
+
+import numpy as np
+
+from .query_utils import expand_query
+from .retrieval_cache import index_version
+from .metrics import QUERY_POSTINGS, stage
+from .tracing import current_trace
+from .junk import classify_chunks
+from .dedup import collapse_chunks
+from .answer import STOPWORDS, SentenceStore, build_sentence_store
+from .chunk_table import ChunkTable, GroupTable, StringTable
 
 TOKEN_RE = re.compile(r"[A-Za-zΑ-Ωα-ω0-9]+", re.UNICODE)
 
+# query planning: stopwords and terms in more than this share of the documents are not scored.
+# Both change scores and are off by default (a ratio of 1.0 keeps every term).
+PRUNE_STOPWORDS = os.getenv("RAG_BM25_PRUNE_STOPWORDS", "0").lower() in ("1", "true", "yes")
+MAX_DF_RATIO = float(os.getenv("RAG_BM25_MAX_DF", "1.0"))
+
 def tokenize(text: str) -> List[str]:
     return [t.lower() for t in TOKEN_RE.findall(text)]
 
+
+def query_terms(query: str) -> Tuple[List[str], List[float]]:
+    """
+    Tokens of the normalized query (weight 1.0), then the tokens of its expansions
+    (weighted by their rule), as parallel lists for BM25Index.score_terms.
+    """
+    eq = expand_query(query)
+    terms = tokenize(eq.text)
+    weights = [1.0] * len(terms)
+    for phrase, weight in eq.expansions:
+        tokens = tokenize(phrase)
+        terms.extend(tokens)
+        weights.extend([weight] * len(tokens))
+    return terms, weights
+
 @dataclass
 class Chunk:
     doc_id: str
@@ -20,44 +52,201 @@ class Chunk:
     text: str
     source: Optional[str] = None
 
-class BM25Retriever:
+@dataclass
+class QueryPlan:
+    terms: List[str]       # distinct terms to score, shortest posting list first
+    weights: List[float]   # per term: query-term frequency x expansion weight
+    dropped: List[str]     # stopwords / terms over the df cutoff
+    postings: int          # postings the plan walks
+    postings_saved: int    # vs. walking one posting list per query token (< 0 after a fallback)
+    fallback: bool = False  # the kept terms matched < top_k docs, so every term was scored
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"terms": self.terms, "dropped": self.dropped, "postings": self.postings,
+                "postings_saved": self.postings_saved, "fallback": self.fallback}
+
+
+class BM25Index:
     """
-    Pure-Python BM25 (Okapi) retriever over chunks.jsonl.
-    Good baseline for manuals/procedures.
+    BM25 (Okapi) scoring over any sequence of token lists.
+
+    The inverted index is stored as flat numpy arrays (CSR layout: term -> slice of
+    doc indexes / term frequencies) instead of per-term lists of tuples, so it is
+    a handful of large buffers that stay shared between forked workers. The vocab
+    (term -> id) is a StringTable for the same reason; pass one in to share it with another
+    index over the same texts (terms it lacks get new ids in a copy).
     """
 
-    def __init__(self, chunks: List[Chunk], k1: float = 1.5, b: float = 0.75):
-        self.chunks = chunks
+    # plan_query defaults (see PRUNE_STOPWORDS / MAX_DF_RATIO)
+    prune_stopwords = PRUNE_STOPWORDS
+    max_df_ratio = MAX_DF_RATIO
+
+    def __init__(self, docs_tokens: Iterable[List[str]], k1: float = 1.5, b: float = 0.75,
+                 vocab: Optional[StringTable] = None):
         self.k1 = k1
         self.b = b
 
-        # per-doc term frequencies + doc lengths
-        self.doc_tf: List[Counter] = []
-        self.doc_len: List[int] = []
+        # term -> term id while building; frozen into a StringTable below
+        ids: Dict[str, int] = {} if vocab is None else dict(zip(vocab, range(len(vocab))))
+        doc_len = array("i")
 
-        # document frequency
-        self.df: Counter = Counter()
+        # (term id, doc idx, tf) triples, collected compactly
+        t_ids = array("i")
+        d_ids = array("i")
+        tfs = array("i")
 
-        # inverted index: term -> list of (doc_idx, tf)
-        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
-
-        for i, ch in enumerate(chunks):
-            terms = tokenize(ch.text)
+        for i, terms in enumerate(docs_tokens):
             tf = Counter(terms)
-            self.doc_tf.append(tf)
-            dl = sum(tf.values())
-            self.doc_len.append(dl)
+            doc_len.append(sum(tf.values()))
+            for term, f in tf.items():
+                t_ids.append(ids.setdefault(term, len(ids)))
+                d_ids.append(i)
+                tfs.append(f)
 
-            for term in tf.keys():
-                self.df[term] += 1
+        self.vocab = vocab if vocab is not None and len(ids) == len(vocab) else StringTable(ids)
+        self.N = len(doc_len)
+        t_ids = np.frombuffer(t_ids, dtype=np.int32)
+        # stable sort keeps doc order inside each posting list
+        order = np.argsort(t_ids, kind="stable")
+        self.post_docs = np.frombuffer(d_ids, dtype=np.int32)[order]
+        self.post_tfs = np.frombuffer(tfs, dtype=np.int32)[order].astype(np.float32)
 
-        self.N = len(chunks)
-        self.avgdl = sum(self.doc_len) / max(self.N, 1)
+        # document frequency per term id + CSR offsets into post_docs/post_tfs
+        self.df = np.bincount(t_ids, minlength=len(self.vocab)).astype(np.int32)
+        self.term_offsets = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(self.df, out=self.term_offsets[1:])
 
-        # build postings
-        for i, tf in enumerate(self.doc_tf):
-            for term, f in tf.items():
-                self.postings[term].append((i, f))
+        self.doc_len = np.frombuffer(doc_len, dtype=np.int32).copy()
+        self.avgdl = float(self.doc_len.sum()) / max(self.N, 1)
+
+        # BM25 idf per term id (+1 smoothed, the only idf definition), and the per-doc length
+        # normalization k1 * (1 - b + b * dl / avgdl)
+        self.idf = np.log(1 + (self.N - self.df + 0.5) / (self.df + 0.5))
+        self.doc_norm = self._doc_norm()
+
+    def _doc_norm(self) -> np.ndarray:
+        return self.k1 * (1 - self.b + self.b * (self.doc_len / max(self.avgdl, 1e-9)))
+
+    def with_params(self, k1: float, b: float) -> "BM25Index":
+        """
+        Shallow copy scored with other k1/b. Postings and idf don't depend on them and are shared.
+        """
+        other = copy.copy(self)
+        other.k1, other.b = k1, b
+        other.doc_norm = other._doc_norm()
+        return other
+
+    def plan_query(self, q_terms: List[str], weights: Optional[List[float]] = None,
+                   prune_stopwords: Optional[bool] = None, max_df_ratio: Optional[float] = None) -> QueryPlan:
+        """
+        Collapse repeated terms into one weighted term (same scores, one posting-list walk),
+        optionally drop terms with df > max_df_ratio * N and stopwords, then order the rest by
+        posting-list length. Dropping changes scores: at df = N/2 the idf is still log 2 ~ 0.69
+        (it only nears zero as df -> N), but those posting lists are the longest.
+        If nothing would be left, nothing is dropped.
+        """
+        prune_stopwords = self.prune_stopwords if prune_stopwords is None else prune_stopwords
+        max_df_ratio = self.max_df_ratio if max_df_ratio is None else max_df_ratio
+        qtf: Dict[str, float] = {}
+        for i, term in enumerate(q_terms):
+            qtf[term] = qtf.get(term, 0.0) + (1.0 if weights is None else weights[i])
+        # one vocab lookup per distinct term
+        df = {t: self.df_of(t) for t in qtf}
+        walked = sum(df[t] for t in q_terms)
+
+        seen = [t for t in qtf if df[t]]
+        max_df = max_df_ratio * self.N
+        kept = [t for t in seen if df[t] <= max_df and not (prune_stopwords and t in STOPWORDS)] or seen
+        kept.sort(key=df.get)
+        postings = sum(df[t] for t in kept)
+        return QueryPlan(
+            terms=kept,
+            weights=[qtf[t] for t in kept],
+            dropped=[t for t in seen if t not in kept],
+            postings=postings,
+            postings_saved=walked - postings,
+        )
+
+    def df_of(self, term: str) -> int:
+        tid = self.vocab.get(term)
+        return 0 if tid is None else int(self.df[tid])
+
+    def score_terms(self, q_terms: List[str], allowed: Optional[np.ndarray] = None,
+                    weights: Optional[List[float]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (candidate doc indexes, their scores), unsorted. Only docs containing at least one
+        query term are candidates; `allowed` is an optional boolean mask over docs.
+        `weights` (parallel to `q_terms`) scales each term's contribution, e.g. for expansions.
+        """
+        # accumulate scores only for docs that contain at least one query term
+        scores = np.zeros(self.N, dtype=np.float64)
+        touched = np.zeros(self.N, dtype=bool)
+
+        # one vectorized pass per query term
+        for i, term in enumerate(q_terms):
+            tid = self.vocab.get(term)
+            if tid is None:
+                continue
+            lo, hi = self.term_offsets[tid], self.term_offsets[tid + 1]
+            docs = self.post_docs[lo:hi]
+            tf = self.post_tfs[lo:hi]
+            w = self.idf[tid] if weights is None else self.idf[tid] * weights[i]
+            scores[docs] += w * (tf * (self.k1 + 1)) / (tf + self.doc_norm[docs])
+            touched[docs] = True
+
+        if allowed is not None:
+            touched &= allowed
+        cand = np.flatnonzero(touched)
+        return cand, scores[cand]
+
+    @staticmethod
+    def top_k(cand: np.ndarray, cand_scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Highest `k` candidates, best first (ties by doc order).
+        """
+        k = min(max(k, 1), cand.size)
+        if cand.size > k:
+            part = np.argpartition(-cand_scores, k - 1)[:k]
+            cand, cand_scores = cand[part], cand_scores[part]
+        order = np.lexsort((cand, -cand_scores))
+        return cand[order], cand_scores[order]
+
+
+class BM25Retriever(BM25Index):
+    """
+    BM25 (Okapi) retriever over chunks.jsonl.
+    Good baseline for manuals/procedures.
+    """
+
+    # label in metrics / traces; the API sets the registry name ("bm25_sql", ...)
+    name = "bm25"
+
+    def __init__(self, chunks: List[Chunk], k1: float = 1.5, b: float = 0.75, exclude_junk: bool = False,
+                 duplicates: Optional[Dict[str, List[str]]] = None,
+                 junk: Optional[Tuple[np.ndarray, Dict[int, Tuple[str, ...]]]] = None,
+                 sentences: Optional[SentenceStore] = None):
+        # texts and ids in flat buffers (chunks[i] still gives a Chunk); pass a ChunkTable to share one
+        self.chunks = chunks = ChunkTable.of(chunks)
+        # representative chunk_id -> near-duplicate chunk_ids collapsed into it (see dedup.py)
+        self.duplicates = GroupTable.of(duplicates)
+
+        # junk (TOC/index) bitmap computed once; skipped during top-k when exclude_junk
+        self.exclude_junk = exclude_junk
+        # `junk` / `sentences`: classify_chunks / build_sentence_store output for these chunks,
+        # passed in when several retrievers are built over one corpus (see eval.run_grid)
+        self.junk, self.junk_signals = junk if junk is not None else classify_chunks(chunks)
+        self._allowed = ~self.junk if exclude_junk else None
+        # sentence split / token ids / fact signals for the extractive answerer; its vocab is this index's
+        self.sentences = sentences if sentences is not None else build_sentence_store(chunks)
+
+        super().__init__((tokenize(text) for text in chunks.texts), k1=k1, b=b, vocab=self.sentences.vocab)
+
+        self.index_version = index_version(chunks, "bm25", k1, b, exclude_junk)
+
+    def with_params(self, k1: float, b: float) -> "BM25Retriever":
+        other = super().with_params(k1, b)
+        other.index_version = index_version(self.chunks, "bm25", k1, b, self.exclude_junk)
+        return other
 
     @staticmethod
     def load_chunks_jsonl(path: Path) -> List[Chunk]:
@@ -102,40 +291,70 @@ class BM25Retriever:
             raise RuntimeError("No valid chunks loaded from SQL.")
         return chunks
 
-    def _idf(self, term: str) -> float:
+    def query_key(self, query: str) -> Tuple[Tuple[str, int], ...]:
         """
-        BM25 idf with +1 smoothing.
+        BM25 is order-independent, so the multiset of (token, weight) fully determines the result.
         """
-        df = self.df.get(term, 0)
-        # classic BM25 idf:
-        return math.log(1 + (self.N - df + 0.5) / (df + 0.5))
+        return tuple(sorted(Counter(zip(*query_terms(query))).items()))
 
     def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        query = normalize_and_expand_query(query)
-        q_terms = tokenize(query)
-        if not q_terms:
-            return []
+        idxs, scores = self.search_ids(query, top_k=top_k)
+        return self.hits_from_ids(idxs, scores)
 
-        # accumulate scores only for docs that contain at least one query term
-        scores = defaultdict(float)
-
-        # BM25 scoring
-        for term in q_terms:
-            idf = self._idf(term)
-            for doc_idx, tf in self.postings.get(term, []):
-                dl = self.doc_len[doc_idx]
-                denom = tf + self.k1 * (1 - self.b + self.b * (dl / self.avgdl))
-                score = idf * (tf * (self.k1 + 1)) / (denom if denom != 0 else 1.0)
-                scores[doc_idx] += score
-
-        if not scores:
-            return []
-
-        # top-k
-        ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:max(top_k, 1)]
+    def search_ids(self, query: str, top_k: int = 5) -> Tuple[List[int], List[float]]:
+        """
+        Ranked (doc indexes, scores) without building hit dicts.
+        """
+        idxs, scores, stats = self.search_ids_stats(query, top_k=top_k)
+        self.record_search_stats(stats)
+        return idxs, scores
+
+    def search_ids_stats(self, query: str, top_k: int = 5) -> Tuple[List[int], List[float], Dict[str, Any]]:
+        """
+        search_ids plus the query's plan stats (query_plan, candidates_scored), not yet recorded:
+        a pool worker returns them and the parent passes them to record_search_stats.
+        """
+        with stage("query_expansion", retriever=self.name):
+            q_terms, weights = query_terms(query)
+            plan = self.plan_query(q_terms, weights)
+        if not plan.terms:
+            return [], [], {}
+
+        with stage("scoring", retriever=self.name):
+            cand, cand_scores = self.score_terms(plan.terms, allowed=self._allowed, weights=plan.weights)
+            if cand.size < top_k and plan.dropped:
+                # the rare terms can't fill top_k: score everything, as an unplanned query would
+                full = self.plan_query(q_terms, weights, prune_stopwords=False, max_df_ratio=float("inf"))
+                cand, cand_scores = self.score_terms(full.terms, allowed=self._allowed, weights=full.weights)
+                walked = plan.postings + plan.postings_saved
+                plan = QueryPlan(full.terms, full.weights, [], plan.postings + full.postings,
+                                 walked - plan.postings - full.postings, fallback=True)
+            stats = {"query_plan": plan.to_dict(), "candidates_scored": int(cand.size)}
+            if cand.size == 0:
+                return [], [], stats
+
+            cand, cand_scores = self.top_k(cand, cand_scores, top_k)
+        return cand.tolist(), cand_scores.tolist(), stats
+
+    def record_search_stats(self, stats: Dict[str, Any]) -> None:
+        """
+        rag_query_postings_total and the trace's posting_lengths / query_plan / candidates_scored.
+        """
+        plan = stats.get("query_plan")
+        if plan is None:
+            return
+        QUERY_POSTINGS.inc(plan["postings"], retriever=self.name, kind="scored")
+        QUERY_POSTINGS.inc(max(plan["postings_saved"], 0), retriever=self.name, kind="saved")
+        trace = current_trace()
+        if trace is not None:
+            trace.set("posting_lengths", {t: self.df_of(t) for t in plan["terms"]})
+            trace.set("query_plan", plan)
+            trace.set("candidates_scored", stats["candidates_scored"])
+
+    def hits_from_ids(self, idxs, scores) -> List[Dict[str, Any]]:
         results = []
-        for doc_idx, score in ranked:
-            ch = self.chunks[doc_idx]
+        for doc_idx, score in zip(idxs, scores):
+            ch = self.chunks[int(doc_idx)]
             results.append(
                 {
                     "doc_id": ch.doc_id,
@@ -143,12 +362,16 @@ class BM25Retriever:
                     "score": float(score),
                     "text": ch.text,
                     "source": ch.source,
+                    "junk": bool(self.junk[doc_idx]),
                 }
             )
+            if self.duplicates and ch.chunk_id in self.duplicates:
+                results[-1]["duplicate_chunk_ids"] = self.duplicates[ch.chunk_id]
         return results
 
 
-def build_bm25_retriever_from_records(records, k1: float = 1.5, b: float = 0.75):
+def build_bm25_retriever_from_records(records, k1: float = 1.5, b: float = 0.75, exclude_junk: bool = False,
+                                      dedup: bool = False):
     """
     Build BM25 retriever from SQL-loaded records.
     Each record must contain: doc_id, chunk_id, source, text
@@ -171,11 +394,19 @@ def build_bm25_retriever_from_records(records, k1: float = 1.5, b: float = 0.75)
     if not chunks:
         raise RuntimeError("No valid chunks loaded from SQL records for BM25.")
 
-    return BM25Retriever(chunks, k1=k1, b=b)
+    return _bm25_from_chunks(chunks, k1, b, exclude_junk, dedup)
 
-def build_bm25_retriever(chunks_path: str, k1: float = 1.5, b: float = 0.75) -> BM25Retriever:
+def build_bm25_retriever(chunks_path: str, k1: float = 1.5, b: float = 0.75, exclude_junk: bool = False,
+                         dedup: bool = False) -> BM25Retriever:
     path = Path(chunks_path)
     if not path.exists():
         raise FileNotFoundError(f"chunks.jsonl not found: {path}")
     chunks = BM25Retriever.load_chunks_jsonl(path)
-    return BM25Retriever(chunks, k1=k1, b=b)
+    return _bm25_from_chunks(chunks, k1, b, exclude_junk, dedup)
+
+def _bm25_from_chunks(chunks, k1, b, exclude_junk, dedup) -> BM25Retriever:
+    duplicates = None
+    if dedup:
+        # index one representative per near-duplicate group
+        chunks, duplicates = collapse_chunks(chunks)
+    return BM25Retriever(chunks, k1=k1, b=b, exclude_junk=exclude_junk, duplicates=duplicates)
@@ -0,0 +1,143 @@
+#Chunk texts/ids, vocabularies and duplicate groups in contiguous buffers
+import zlib
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping, Sequence
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+
+def _frozen(values: array, dtype) -> np.ndarray:
+    return np.frombuffer(values, dtype=dtype) if len(values) else np.zeros(0, dtype=dtype)
+
+
+class StringTable(Mapping):
+    """
+    Strings in one UTF-8 buffer: string i is buf[offsets[i]:offsets[i+1]].
+
+    Also a read-only mapping string -> position (crc32 of each string, sorted, for a
+    binary search), so it stands in for a term -> id dict. Forked workers read the
+    buffers without touching per-string refcounts, so the pages stay shared.
+    Offsets / hashes are `array`s: indexing them yields plain ints (numpy scalars would
+    make a lookup several times slower).
+    """
+
+    def __init__(self, strings: Iterable[str]):
+        buf = bytearray()
+        self.offsets = array("q", [0])
+        hashes = array("I")
+        for s in strings:
+            b = s.encode("utf-8")
+            buf += b
+            self.offsets.append(len(buf))
+            hashes.append(zlib.crc32(b))
+        self.buf = bytes(buf)
+        # position of the k-th smallest hash; equal hashes keep insertion order
+        order = np.argsort(_frozen(hashes, np.uint32), kind="stable").astype(np.int32)
+        self._order = array("i", order.tobytes())
+        self._hashes = array("I", _frozen(hashes, np.uint32)[order].tobytes())
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def string(self, i: int) -> str:
+        return self.buf[self.offsets[i]:self.offsets[i + 1]].decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        off = self.offsets
+        for a, b in zip(off, off[1:]):
+            yield self.buf[a:b].decode("utf-8")
+
+    def __getitem__(self, s: str) -> int:
+        if not isinstance(s, str):
+            raise KeyError(s)
+        b = s.encode("utf-8")
+        h = zlib.crc32(b)
+        hashes, off = self._hashes, self.offsets
+        k = bisect_left(hashes, h)
+        while k < len(hashes) and hashes[k] == h:
+            i = self._order[k]
+            if self.buf[off[i]:off[i + 1]] == b:
+                return i
+            k += 1
+        raise KeyError(s)
+
+
+class ChunkTable(Sequence):
+    """
+    A chunk list as StringTables (doc ids, chunk ids, texts, sources). chunks[i] builds
+    the chunk object on access; text(i) / chunk_id(i) / index_of(chunk_id) skip that.
+    """
+
+    def __init__(self, chunks):
+        chunks = list(chunks)
+        # chunks[i] returns the caller's chunk type (bm25.Chunk, retrieve.Chunk, ...)
+        self.record = type(chunks[0]) if chunks else None
+        self.doc_ids = StringTable(c.doc_id for c in chunks)
+        self.chunk_ids = StringTable(c.chunk_id for c in chunks)
+        self.texts = StringTable(c.text for c in chunks)
+        sources = [getattr(c, "source", None) for c in chunks]
+        self.sources = StringTable("" if s is None else str(s) for s in sources)
+        self.has_source = np.array([s is not None for s in sources], dtype=bool)
+
+    @classmethod
+    def of(cls, chunks) -> "ChunkTable":
+        return chunks if isinstance(chunks, cls) else cls(chunks)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.record(doc_id=self.doc_id(i), chunk_id=self.chunk_id(i), text=self.text(i),
+                           source=self.sources.string(i) if self.has_source[i] else None)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def text(self, i: int) -> str:
+        return self.texts.string(i)
+
+    def chunk_id(self, i: int) -> str:
+        return self.chunk_ids.string(i)
+
+    def doc_id(self, i: int) -> str:
+        return self.doc_ids.string(i)
+
+    def index_of(self, chunk_id: str) -> Optional[int]:
+        return self.chunk_ids.get(chunk_id)
+
+
+class GroupTable(Mapping):
+    """
+    Read-only {key: [member, ...]} (dedup's representative chunk_id -> duplicate chunk_ids)
+    as two StringTables and an offset array.
+    """
+
+    def __init__(self, groups: Dict[str, List[str]]):
+        self.keys_table = StringTable(groups)
+        self.members = StringTable(m for ms in groups.values() for m in ms)
+        sizes = np.array([len(ms) for ms in groups.values()], dtype=np.int64)
+        self.offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=self.offsets[1:])
+
+    @classmethod
+    def of(cls, groups: Optional[Dict[str, List[str]]]) -> "GroupTable":
+        return groups if isinstance(groups, cls) else cls(groups or {})
+
+    def __len__(self) -> int:
+        return len(self.keys_table)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys_table)
+
+    def __getitem__(self, key: str) -> List[str]:
+        i = self.keys_table[key]
+        return [self.members.string(j) for j in range(self.offsets[i], self.offsets[i + 1])]
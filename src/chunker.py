@@ -0,0 +1,189 @@
+#Structure-aware streaming chunker: split at headings/bullets/paragraphs under a token budget
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .answer import BULLET_RE, HEADINGISH_RE
+from .tracing import approx_tokens
+
+CHUNK_TOKENS = 600       # budget per chunk (~2400 chars; the old windows were 2200 chars + 250 overlap)
+MIN_CHUNK_TOKENS = 300   # a heading / paragraph break only ends a chunk once it has this much
+MAX_TAIL_RATIO = 1.25    # a short last chunk is merged into the previous one up to this x budget
+
+PAGE_SEP = "\n\n"
+
+# one line of the document: (1-based page, text, offset of the line in the document text,
+# exact document text between the previous line's end and this line's start)
+Line = Tuple[int, str, int, str]
+
+
+def clean_page(s: str) -> str:
+    s = s.replace("\r\n", "\n").replace("\r", "\n")
+    s = re.sub(r"\n{3,}", "\n\n", s)
+    s = re.sub(r"[ \t]{2,}", " ", s)
+    return s.strip()
+
+
+def document_text(pages: Iterable[str]) -> str:
+    """
+    The text that chunk offsets refer to: cleaned non-empty pages joined by a blank line.
+    """
+    return PAGE_SEP.join(t for t in (clean_page(p or "") for p in pages) if t)
+
+
+def iter_lines(pages: Iterable[str]) -> Iterator[Line]:
+    base = 0
+    first = True
+    for page_no, raw in enumerate(pages, start=1):
+        text = clean_page(raw or "")
+        if not text:
+            continue
+        if not first:
+            base += len(PAGE_SEP)
+        sep = "" if first else PAGE_SEP
+        first = False
+        pos = 0
+        for line in text.split("\n"):
+            yield page_no, line, base + pos, sep
+            sep = "\n"
+            pos += len(line) + 1
+        base += len(text)
+
+
+def _split_long(line: Line, max_chars: int) -> Iterator[Line]:
+    # a single line over the budget (extraction without line breaks): cut at whitespace
+    page, text, off, sep = line
+    while len(text) > max_chars:
+        cut = text.rfind(" ", 0, max_chars)
+        if cut <= 0:
+            cut = max_chars
+        head = text[:cut].rstrip()
+        yield page, head, off, sep
+        rest = text[cut:]
+        stripped = rest.lstrip()
+        gap = len(rest) - len(stripped)
+        sep = text[len(head):cut + gap]
+        off += cut + gap
+        text = stripped
+    if text:
+        yield page, text, off, sep
+
+
+class _Chunk:
+    def __init__(self, raw: List[Line], section: str):
+        # raw keeps the whitespace-only lines around the chunk so a merged tail stays contiguous
+        self.raw = raw
+        self.lines = _trim(raw)
+        self.section = section
+
+    @property
+    def chars(self) -> int:
+        return _chars(self.lines)
+
+    def text(self) -> str:
+        # rebuild the exact document slice from each line's own separator
+        out = [self.lines[0][1]]
+        for _, t, _, sep in self.lines[1:]:
+            out.append(sep)
+            out.append(t)
+        return "".join(out)
+
+
+def _chars(lines: List[Line]) -> int:
+    return sum(len(line[1]) + 1 for line in lines)
+
+
+def _trim(lines: List[Line]) -> List[Line]:
+    i, j = 0, len(lines)
+    while i < j and not lines[i][1].strip():
+        i += 1
+    while j > i and not lines[j - 1][1].strip():
+        j -= 1
+    return lines[i:j]
+
+
+def chunk_pages(pages: Iterable[str], token_budget: int = CHUNK_TOKENS,
+                min_tokens: int = MIN_CHUNK_TOKENS) -> Iterator[Dict[str, Any]]:
+    """
+    Chunks of one document as {"text", "start_char", "end_char", "page_start", "page_end", "section"}.
+
+    Lines accumulate until the budget; a heading (HEADINGISH_RE) closes the current chunk,
+    otherwise the cut goes at the last paragraph/bullet boundary, else at a line boundary.
+    No overlap. Memory is bounded by one page plus one chunk.
+    """
+    # budgets in characters, at approx_tokens' ~4 chars per token
+    max_chars = token_budget * 4
+    min_chars = min_tokens * 4
+    buf: List[Line] = []
+    buf_chars = 0
+    soft = 0            # index in buf of the last paragraph/bullet boundary (0 = none)
+    section = ""        # last heading seen
+    buf_section = ""    # heading in effect where the buffered chunk starts
+    pending: Optional[_Chunk] = None  # held back one step so a short tail can be merged into it
+
+    def emit(lines: List[Line], sec: str) -> Iterator[Dict[str, Any]]:
+        nonlocal pending
+        if not _trim(lines):
+            if pending is not None:
+                pending.raw.extend(lines)
+            return
+        if pending is not None:
+            yield _row(pending)
+        pending = _Chunk(lines, sec)
+
+    for line in iter_lines(pages):
+        for piece in _split_long(line, max_chars) if len(line[1]) > max_chars else (line,):
+            text = piece[1]
+            stripped = text.strip()
+            if stripped and HEADINGISH_RE.match(stripped):
+                if buf_chars >= min_chars:
+                    yield from emit(buf, buf_section)
+                    buf, buf_chars, soft = [], 0, 0
+                section = stripped[:120]
+            if buf and buf_chars + len(text) + 1 > max_chars:
+                if soft and _chars(buf[:soft]) >= min_chars:
+                    head, buf = buf[:soft], buf[soft:]
+                else:
+                    head, buf = buf, []
+                yield from emit(head, buf_section)
+                buf_chars = _chars(buf)
+                soft = 0
+            if not _trim(buf):
+                buf_section = section
+            if buf and (not stripped or BULLET_RE.match(text)):
+                soft = len(buf)
+            buf.append(piece)
+            buf_chars += len(text) + 1
+
+    if _trim(buf):
+        last = _Chunk(buf, buf_section)
+        if pending is not None and last.chars < min_chars and pending.chars + last.chars <= max_chars * MAX_TAIL_RATIO:
+            pending = _Chunk(pending.raw + buf, pending.section)
+        else:
+            if pending is not None:
+                yield _row(pending)
+            pending = last
+    if pending is not None:
+        yield _row(pending)
+
+
+def _row(chunk: _Chunk) -> Dict[str, Any]:
+    first, last = chunk.lines[0], chunk.lines[-1]
+    text = chunk.text()
+    return {
+        "text": text,
+        "start_char": first[2],
+        "end_char": last[2] + len(last[1]),
+        "page_start": first[0],
+        "page_end": last[0],
+        "section": chunk.section,
+        "tokens": approx_tokens(text),
+    }
+
+
+def chunk_document_structured(doc_id: str, source: str, pages: Iterable[str],
+                              token_budget: int = CHUNK_TOKENS) -> Iterator[Dict[str, Any]]:
+    """
+    chunks.jsonl rows; chunk_id = "<doc_id>_<n:05d>" in document order.
+    """
+    for j, c in enumerate(chunk_pages(pages, token_budget=token_budget)):
+        yield {"doc_id": doc_id, "source": source, "chunk_id": f"{doc_id}_{j:05d}", **c}
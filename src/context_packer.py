@@ -0,0 +1,143 @@
+#Token-budgeted LLM context packing
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from .answer import SentenceStore, is_fact_question, sentences_for, tokens
+from .tracing import approx_tokens
+
+# default prompt context budget, in approximate tokens (build_context's 3500-char cap is ~875)
+CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "400"))
+GAP = " ... "
+
+
+@dataclass
+class PackedContext:
+    text: str
+    spans: List[Dict] = field(default_factory=list)  # one per cited chunk, in hit order
+    tokens: int = 0          # approx tokens of `text`
+    source_tokens: int = 0   # approx tokens of the full hit texts
+
+    @property
+    def chunk_ids(self) -> List[str]:
+        return [s["chunk_id"] for s in self.spans]
+
+    @property
+    def compression_ratio(self) -> float:
+        """
+        source tokens / packed tokens (1.0 = nothing dropped).
+        """
+        return self.source_tokens / self.tokens if self.tokens else 0.0
+
+    def stats(self) -> Dict:
+        return {
+            "context_tokens": self.tokens,
+            "source_tokens": self.source_tokens,
+            "compression_ratio": round(self.compression_ratio, 3),
+            "spans": [{"chunk_id": s["chunk_id"], "sentences": len(s["sentences"])} for s in self.spans],
+        }
+
+
+def _header(chunk_id: str) -> str:
+    return f"[{chunk_id}]\n"
+
+
+def _lead(text: str, max_chars: int) -> str:
+    """
+    Leading text with whitespace collapsed, cut at a word boundary to at most `max_chars`.
+    """
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    return cut.rsplit(" ", 1)[0] if " " in cut else cut
+
+
+def pack_context(
+    question: str,
+    hits: List[Dict],
+    token_budget: int = CONTEXT_TOKENS,
+    sentence_store: Optional[SentenceStore] = None,
+) -> PackedContext:
+    """
+    Keep the most question-relevant sentences of `hits` within `token_budget`.
+
+    Sentences are ranked by query-term overlap (plus the fact-signal score for fact
+    questions), ties broken by hit rank and position. The remaining budget is then
+    spent on the neighbours of selected sentences. Each chunk's kept sentences are
+    emitted in document order under its `[chunk_id]` anchor, chunks in hit order.
+    If no sentence can be kept, the leading text of the top hit is sent instead.
+    """
+    q_tokens = set(tokens(question))
+    fact_mode = is_fact_question(question)
+
+    per_hit: List[Tuple[Dict, List[str]]] = []
+    candidates = []  # (score, hit index, sentence position)
+    source_tokens = 0
+    for h in hits:
+        text = (h.get("text") or "").strip()
+        if not text:
+            continue
+        source_tokens += approx_tokens(_header(h.get("chunk_id", "chunk")) + text)
+        store, ci = sentences_for(h, sentence_store)
+        sentences = store.sentence_range(ci)
+        per_hit.append((h, [store.text(si) for si in sentences]))
+        overlaps = store.overlaps(ci, store.query_ids(q_tokens)).tolist()
+        for pos, (si, overlap) in enumerate(zip(sentences, overlaps)):
+            if overlap:
+                candidates.append((overlap + (int(store.fact[si]) if fact_mode else 0), len(per_hit) - 1, pos))
+
+    candidates.sort(key=lambda c: (-c[0], c[1], c[2]))
+    if not candidates and per_hit:
+        # nothing matches: lead of the top hit
+        candidates = [(0, 0, pos) for pos in range(len(per_hit[0][1]))]
+
+    chosen: Dict[int, set] = {}
+    used = 0
+
+    def take(hi: int, pos: int) -> bool:
+        nonlocal used
+        cost = approx_tokens(per_hit[hi][1][pos] + " ")
+        if hi not in chosen:
+            cost += approx_tokens(_header(per_hit[hi][0].get("chunk_id", "chunk")) + "\n")
+        if used + cost > token_budget:
+            return False
+        chosen.setdefault(hi, set()).add(pos)
+        used += cost
+        return True
+
+    for _, hi, pos in candidates:
+        take(hi, pos)
+
+    # fill leftover budget with the sentences around what was selected
+    for _, hi, pos in candidates:
+        if hi not in chosen or pos not in chosen[hi]:
+            continue
+        for n in (pos + 1, pos - 1):
+            if 0 <= n < len(per_hit[hi][1]) and n not in chosen[hi]:
+                take(hi, n)
+
+    blocks = []
+    spans = []
+    for hi in sorted(chosen):
+        h, sents = per_hit[hi]
+        positions = sorted(chosen[hi])
+        body = sents[positions[0]]
+        for prev, pos in zip(positions, positions[1:]):
+            body += (" " if pos == prev + 1 else GAP) + sents[pos]
+        cid = h.get("chunk_id", "chunk")
+        blocks.append(_header(cid) + body)
+        spans.append({"chunk_id": cid, "doc_id": h.get("doc_id"), "sentences": positions})
+
+    if not blocks and per_hit:
+        # no sentence fits (noise chunk, or one sentence over budget): raw lead of the top hit
+        h = per_hit[0][0]
+        cid = h.get("chunk_id", "chunk")
+        header = _header(cid)
+        body = _lead(h["text"], (token_budget - approx_tokens(header)) * 4)
+        if body:
+            blocks.append(header + body)
+            spans.append({"chunk_id": cid, "doc_id": h.get("doc_id"), "sentences": []})
+
+    text = "\n\n".join(blocks)
+    return PackedContext(text=text, spans=spans, tokens=approx_tokens(text), source_tokens=source_tokens)
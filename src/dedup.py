@@ -0,0 +1,158 @@
+#Near-duplicate chunk detection (MinHash + LSH banding)
+import re
+import zlib
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+_PRIME = np.uint64((1 << 31) - 1)
+_MAX = np.uint64((1 << 32) - 1)
+
+
+def shingles(text: str, size: int = 5) -> np.ndarray:
+    """
+    Hashed word `size`-grams of `text` (uint64, deterministic across processes).
+    """
+    words = WORD_RE.findall((text or "").lower())
+    if len(words) < size:
+        grams = [" ".join(words)] if words else []
+    else:
+        grams = [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return np.unique(np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams)))
+
+
+def _permutations(num_perm: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, (1 << 31) - 1, size=num_perm).astype(np.uint64)
+    b = rng.randint(0, (1 << 31) - 1, size=num_perm).astype(np.uint64)
+    return a, b
+
+
+def minhash(text: str, num_perm: int = 128, seed: int = 1) -> np.ndarray:
+    sh = shingles(text)
+    if sh.size == 0:
+        return np.full(num_perm, _MAX, dtype=np.uint64)
+    a, b = _permutations(num_perm, seed)
+    # (a*x + b) mod p for every permutation x shingle, then min per permutation
+    hashed = (a[:, None] * (sh[None, :] % _PRIME) + b[:, None]) % _PRIME
+    return hashed.min(axis=1)
+
+
+def _minhash_batch(args) -> np.ndarray:
+    texts, num_perm, seed = args
+    return np.stack([minhash(t, num_perm, seed) for t in texts]) if texts else np.zeros((0, num_perm), np.uint64)
+
+
+def minhash_signatures(texts: Sequence[str], num_perm: int = 128, seed: int = 1, workers: int = 1,
+                       batch_size: int = 2000) -> np.ndarray:
+    """
+    (len(texts), num_perm) signature matrix; computed in a process pool when workers > 1.
+    """
+    texts = list(texts)
+    if workers <= 1 or len(texts) <= batch_size:
+        return _minhash_batch((texts, num_perm, seed))
+    batches = [(texts[i:i + batch_size], num_perm, seed) for i in range(0, len(texts), batch_size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return np.concatenate(list(pool.map(_minhash_batch, batches)))
+
+
+def _find(parent: List[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def find_near_duplicates(texts: Sequence[str], threshold: float = 0.8, num_perm: int = 128,
+                         bands: int = 16, workers: int = 1) -> List[List[int]]:
+    """
+    Groups (lists of indexes, size >= 2, sorted) of texts whose estimated Jaccard
+    similarity over word 5-gram shingles is >= threshold.
+
+    LSH banding only compares texts that share at least one band bucket, so the
+    cost grows with the number of near-duplicates, not with len(texts)**2.
+    """
+    if num_perm % bands:
+        raise ValueError("num_perm must be a multiple of bands")
+    sigs = minhash_signatures(texts, num_perm=num_perm, workers=workers)
+    rows = num_perm // bands
+
+    parent = list(range(len(texts)))
+    checked = set()
+    valid = np.flatnonzero(sigs[:, 0] != _MAX)  # empty texts match nothing
+    # a band's rows hash to one uint64 (odd multipliers, wrapping sum); a collision only puts
+    # two buckets in one candidate list, the signature check below still decides
+    mix = np.random.RandomState(0).randint(1, 1 << 62, size=rows).astype(np.uint64) | np.uint64(1)
+    for band in range(bands):
+        keys = (sigs[valid, band * rows:(band + 1) * rows] * mix).sum(axis=1)
+        # texts grouped by key, ascending index inside a bucket
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        start = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1], [True])))
+        shared = np.flatnonzero(np.diff(start) > 1)
+        # only buckets with 2+ members, in order of first appearance (as a dict of buckets would)
+        for j in shared[np.argsort(order[start[shared]])].tolist():
+            members = valid[order[start[j]:start[j + 1]]].tolist()
+            # compare each member with the bucket's first member, and with its predecessor
+            # if that fails; union-find takes care of transitivity
+            for k in range(1, len(members)):
+                for a in (members[0], members[k - 1]):
+                    b = members[k]
+                    if (a, b) in checked or _find(parent, a) == _find(parent, b):
+                        continue
+                    checked.add((a, b))
+                    if float(np.mean(sigs[a] == sigs[b])) >= threshold:
+                        ra, rb = _find(parent, a), _find(parent, b)
+                        parent[max(ra, rb)] = min(ra, rb)
+                        break
+
+    groups: Dict[int, List[int]] = defaultdict(list)
+    for i in range(len(texts)):
+        groups[_find(parent, i)].append(i)
+    return [g for g in groups.values() if len(g) > 1]
+
+
+def collapse_chunks(chunks, threshold: float = 0.8, workers: int = 1):
+    """
+    Index-time collapse: keep the first chunk of each near-duplicate group.
+    Returns (representative chunks, {representative chunk_id: [duplicate chunk_ids]}).
+    """
+    groups = find_near_duplicates([c.text for c in chunks], threshold=threshold, workers=workers)
+    dropped = set()
+    duplicates: Dict[str, List[str]] = {}
+    for g in groups:
+        rep = g[0]
+        duplicates[chunks[rep].chunk_id] = [chunks[i].chunk_id for i in g[1:]]
+        dropped.update(g[1:])
+    kept = [c for i, c in enumerate(chunks) if i not in dropped]
+    return kept, duplicates
+
+
+def collapse_near_duplicates(hits: List[Dict], threshold: float = 0.8) -> List[Dict]:
+    """
+    Query-time collapse: keep the best-ranked hit of each near-duplicate group and
+    list the others under "duplicate_chunk_ids".
+    """
+    if len(hits) < 2:
+        return hits
+    groups = find_near_duplicates([h.get("text") or "" for h in hits], threshold=threshold)
+    dup_of = {}
+    for g in groups:
+        for i in g[1:]:
+            dup_of[i] = g[0]
+    out = []
+    extra: Dict[int, List[str]] = defaultdict(list)
+    for i, h in enumerate(hits):
+        if i in dup_of:
+            extra[dup_of[i]].append(h["chunk_id"])
+    for i, h in enumerate(hits):
+        if i in dup_of:
+            continue
+        if extra.get(i):
+            h = dict(h)
+            h["duplicate_chunk_ids"] = list(h.get("duplicate_chunk_ids", [])) + extra[i]
+        out.append(h)
+    return out
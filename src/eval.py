@@ -1,11 +1,22 @@
 import csv
+import gc
 import json
+import math
+import multiprocessing as mp
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
+from itertools import product
 from pathlib import Path
 from typing import List, Dict, Any, Tuple
 import argparse
-from .bm25 import build_bm25_retriever
-from .retrieve import build_retriever
+from .answer import build_sentence_store
+from .bm25 import BM25Retriever, build_bm25_retriever
+from .junk import classify_chunks
+from .retrieve import TfidfRetriever, build_retriever, stem_analyzer
+from .retrieval_pool import fork_available
 
 
 @dataclass
@@ -51,6 +62,41 @@ def hit_at_k(retrieved: List[str], gold: List[str], k: int) -> int:
     return 1 if any(cid in gold_set for cid in topk) else 0
 
 
+def recall_at_k(retrieved: List[str], gold: List[str], k: int) -> float:
+    gold_set = set(gold)
+    if not gold_set:
+        return 0.0
+    return len(gold_set.intersection(retrieved[:k])) / float(len(gold_set))
+
+
+def reciprocal_rank(retrieved: List[str], gold: List[str], k: int = 10) -> float:
+    gold_set = set(gold)
+    for rank, cid in enumerate(retrieved[:k], start=1):
+        if cid in gold_set:
+            return 1.0 / rank
+    return 0.0
+
+
+def ndcg_at_k(retrieved: List[str], gold: List[str], k: int) -> float:
+    """
+    Binary-relevance nDCG: every gold chunk has gain 1.
+    """
+    gold_set = set(gold)
+    dcg = sum(1.0 / math.log2(i + 2) for i, cid in enumerate(retrieved[:k]) if cid in gold_set)
+    idcg = sum(1.0 / math.log2(i + 2) for i in range(min(len(gold_set), k)))
+    return dcg / idcg if idcg else 0.0
+
+
+def ranking_metrics(retrieved: List[str], gold: List[str], k: int) -> Dict[str, float]:
+    return {
+        f"hit@{k}": float(hit_at_k(retrieved, gold, k)),
+        f"precision@{k}": precision_at_k(retrieved, gold, k),
+        f"recall@{k}": recall_at_k(retrieved, gold, k),
+        f"mrr@{k}": reciprocal_rank(retrieved, gold, k),
+        f"ndcg@{k}": ndcg_at_k(retrieved, gold, k),
+    }
+
+
 def classify_failure(retrieved: List[str], gold: List[str]) -> Tuple[str, List[str]]:
     """
     Simple failure taxonomy based on retrieval only.
@@ -88,29 +134,106 @@ def classify_failure(retrieved: List[str], gold: List[str]) -> Tuple[str, List[s
     return ("OK", [])
 
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--retriever", choices=["tfidf", "bm25"], default="bm25")
-    args = parser.parse_args()
+# Grid-search state. Built once in the parent; forked workers inherit it copy-on-write.
+_GRID: Dict[str, Any] = {}
 
-    root = Path(".")
-    chunks_path = root / "data_processed" / "chunks.jsonl"
-    eval_path = root / "eval" / "eval_questions.jsonl"
-    report_csv = root / "eval" / f"report_{args.retriever}.csv"
-    failures_jsonl = root / "eval" / f"failures_{args.retriever}.jsonl"
 
-    if args.retriever == "bm25":
-        retriever = build_bm25_retriever(str(chunks_path))
+def _grid_retriever(config: Dict[str, Any]):
+    if config["retriever"] == "bm25":
+        # same postings for every k1/b, only the length normalization is recomputed
+        return _GRID["bm25"].with_params(config["k1"], config["b"])
+    return TfidfRetriever(_GRID["chunks"], ngram_range=tuple(config["ngram_range"]),
+                          junk=_GRID["junk"], sentences=_GRID["sentences"])
+
+
+def _run_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    retriever = _grid_retriever(config)
+    build_s = time.perf_counter() - t0
+    retrieved, latency = [], []
+    for item in _GRID["items"]:
+        t = time.perf_counter()
+        idxs, _ = retriever.search_ids(item.question, top_k=_GRID["depth"])
+        latency.append((time.perf_counter() - t) * 1000)
+        retrieved.append([retriever.chunks[i].chunk_id for i in idxs])
+    return {"config": config, "build_s": build_s, "retrieved": retrieved, "latency_ms": latency}
+
+
+def grid_configs(retrievers: List[str], k1s: List[float], bs: List[float],
+                 ngram_ranges: List[Tuple[int, int]]) -> List[Dict[str, Any]]:
+    configs: List[Dict[str, Any]] = []
+    if "bm25" in retrievers:
+        configs += [{"retriever": "bm25", "k1": k1, "b": b} for k1, b in product(k1s, bs)]
+    if "tfidf" in retrievers:
+        configs += [{"retriever": "tfidf", "ngram_range": list(ng)} for ng in ngram_ranges]
+    return configs
+
+
+def prepare_grid(chunks_path: Path, items: List[EvalItem], configs: List[Dict[str, Any]], ks: List[int]) -> None:
+    """
+    Load the corpus and build the state shared by every config (forked workers inherit it).
+    Chunk classification and the sentence store are built once for all configs.
+    """
+    chunks = BM25Retriever.load_chunks_jsonl(chunks_path)
+    _GRID.clear()
+    _GRID.update(items=items, chunks=chunks, depth=max(ks),
+                 junk=classify_chunks(chunks), sentences=build_sentence_store(chunks))
+    if any(c["retriever"] == "bm25" for c in configs):
+        _GRID["bm25"] = BM25Retriever(chunks, junk=_GRID["junk"], sentences=_GRID["sentences"])
+    if any(c["retriever"] == "tfidf" for c in configs):
+        # fill the stemmer cache before forking, so each TF-IDF build only re-counts n-grams
+        for c in chunks:
+            stem_analyzer(c.text)
+
+
+def run_grid(chunks_path: Path, items: List[EvalItem], configs: List[Dict[str, Any]], ks: List[int],
+             workers: int = 1, prepared: bool = False) -> List[Dict[str, Any]]:
+    """
+    Evaluate every config at every cutoff in `ks`; one summary row per (config, k).
+    Retrieval runs once per config at depth max(ks) and is truncated for smaller k.
+    `prepared`: prepare_grid was already called with the same arguments.
+    """
+    if not prepared:
+        prepare_grid(chunks_path, items, configs, ks)
+
+    if workers > 1 and fork_available():
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("fork")) as pool:
+            runs = list(pool.map(_run_config, configs))
     else:
-        retriever = build_retriever(str(chunks_path))
-    
-    items = load_eval_jsonl(eval_path)
+        runs = [_run_config(c) for c in configs]
+
+    rows: List[Dict[str, Any]] = []
+    for run in runs:
+        lat = sorted(run["latency_ms"])
+        for k in ks:
+            per_query = [ranking_metrics(r, it.gold_chunk_ids, k) for r, it in zip(run["retrieved"], items)]
+            row: Dict[str, Any] = {
+                "retriever": run["config"]["retriever"],
+                "k1": run["config"].get("k1", ""),
+                "b": run["config"].get("b", ""),
+                "ngram_range": ",".join(str(n) for n in run["config"].get("ngram_range", [])),
+                "top_k": k,
+            }
+            for name in per_query[0]:
+                row[name.split("@")[0]] = round(statistics.fmean(m[name] for m in per_query), 4)
+            row["build_s"] = round(run["build_s"], 3)
+            row["latency_p50_ms"] = round(statistics.median(lat), 3)
+            row["latency_p95_ms"] = round(lat[min(len(lat) - 1, int(round(0.95 * (len(lat) - 1))))], 3)
+            rows.append(row)
+    return rows
+
 
+def evaluate(retriever, items: List[EvalItem], top_k: int = 10) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Per-question report rows and failure rows for one retriever.
+    """
     report_rows: List[Dict[str, Any]] = []
     failure_rows: List[Dict[str, Any]] = []
 
     for item in items:
-        hits = retriever.search(item.question, top_k=10)
+        t0 = time.perf_counter()
+        hits = retriever.search(item.question, top_k=top_k)
+        latency_ms = (time.perf_counter() - t0) * 1000
         retrieved_ids = [h["chunk_id"] for h in hits]
 
         p3 = precision_at_k(retrieved_ids, item.gold_chunk_ids, 3)
@@ -124,6 +247,11 @@ def main():
                 "precision@3": f"{p3:.4f}",
                 "precision@5": f"{p5:.4f}",
                 "hit@5": str(h5),
+                f"mrr@{top_k}": f"{reciprocal_rank(retrieved_ids, item.gold_chunk_ids, top_k):.4f}",
+                f"ndcg@{top_k}": f"{ndcg_at_k(retrieved_ids, item.gold_chunk_ids, top_k):.4f}",
+                "recall@5": f"{recall_at_k(retrieved_ids, item.gold_chunk_ids, 5):.4f}",
+                f"recall@{top_k}": f"{recall_at_k(retrieved_ids, item.gold_chunk_ids, top_k):.4f}",
+                "latency_ms": f"{latency_ms:.3f}",
                 "gold_chunk_ids": "|".join(item.gold_chunk_ids),
                 "top5_chunk_ids": "|".join(retrieved_ids[:5]),
             }
@@ -141,6 +269,87 @@ def main():
                     "suggested_fixes": suggested_fixes,
                 }
             )
+    return report_rows, failure_rows
+
+
+def _parse_ngram(s: str) -> Tuple[int, int]:
+    lo, hi = s.split(",")
+    return int(lo), int(hi)
+
+
+def main_grid(args, root: Path) -> None:
+    retrievers = ["bm25", "tfidf"] if args.retriever == "all" else [args.retriever]
+    configs = grid_configs(retrievers, args.k1, args.b, [_parse_ngram(n) for n in args.ngram])
+    items = load_eval_jsonl(root / "eval" / "eval_questions.jsonl")
+    workers = args.workers or os.cpu_count() or 1
+
+    ks = sorted(set(args.ks))
+    chunks_path = root / "data_processed" / "chunks.jsonl"
+
+    t0 = time.perf_counter()
+    prepare_grid(chunks_path, items, configs, ks)
+    if workers > 1:
+        # the grid state is only read from here on: keep the GC from touching (and un-sharing)
+        # the forked workers' copy-on-write pages. The process exits after the grid.
+        gc.collect()
+        gc.freeze()
+    rows = run_grid(chunks_path, items, configs, ks, workers, prepared=True)
+    wall = time.perf_counter() - t0
+
+    objective, _, at = args.objective.partition("@")
+    ranked = [r for r in rows if not at or r["top_k"] == int(at)]
+    ranked.sort(key=lambda r: (-r[objective], r["latency_p50_ms"]))
+
+    out_csv = root / "eval" / f"grid_{args.retriever}.csv"
+    with open(out_csv, "w", encoding="utf-8", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        w.writeheader()
+        w.writerows(rows)
+
+    print("✅ Wrote:", out_csv)
+    print(f"{len(configs)} configs x {len(set(args.ks))} cutoffs, {len(items)} questions, "
+          f"{workers} workers: {wall:.1f}s")
+    print(f"Best by {args.objective}:")
+    for r in ranked[:args.show]:
+        params = f"k1={r['k1']} b={r['b']}" if r["retriever"] == "bm25" else f"ngram=({r['ngram_range']})"
+        print(f"  {r['retriever']:<6} {params:<18} k={r['top_k']:<3} mrr={r['mrr']:.4f} ndcg={r['ndcg']:.4f} "
+              f"recall={r['recall']:.4f} hit={r['hit']:.4f} p50={r['latency_p50_ms']:.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--retriever", choices=["tfidf", "bm25", "all"], default="bm25",
+                        help="'all' is only valid with --grid")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--grid", action="store_true", help="Sweep parameters instead of one evaluation")
+    parser.add_argument("--k1", type=float, nargs="+", default=[0.9, 1.2, 1.5, 2.0])
+    parser.add_argument("--b", type=float, nargs="+", default=[0.3, 0.5, 0.75, 0.9])
+    parser.add_argument("--ngram", nargs="+", default=["1,1", "1,2", "1,3"], help="TF-IDF ngram ranges, e.g. 1,2")
+    parser.add_argument("--ks", type=int, nargs="+", default=[3, 5, 10, 20], help="Cutoffs for @k metrics")
+    parser.add_argument("--workers", type=int, default=0, help="Grid worker processes (default: CPU count)")
+    parser.add_argument("--objective", default="mrr@10", help="Metric used to rank grid configs")
+    parser.add_argument("--show", type=int, default=10)
+    args = parser.parse_args()
+
+    root = Path(".")
+    if args.grid:
+        main_grid(args, root)
+        return
+    if args.retriever == "all":
+        parser.error("--retriever all needs --grid")
+
+    chunks_path = root / "data_processed" / "chunks.jsonl"
+    eval_path = root / "eval" / "eval_questions.jsonl"
+    report_csv = root / "eval" / f"report_{args.retriever}.csv"
+    failures_jsonl = root / "eval" / f"failures_{args.retriever}.jsonl"
+
+    if args.retriever == "bm25":
+        retriever = build_bm25_retriever(str(chunks_path))
+    else:
+        retriever = build_retriever(str(chunks_path))
+    
+    items = load_eval_jsonl(eval_path)
+    report_rows, failure_rows = evaluate(retriever, items, top_k=args.top_k)
 
     # write report.csv
     report_csv.parent.mkdir(parents=True, exist_ok=True)
@@ -155,15 +364,18 @@ def main():
             f.write(json.dumps(row, ensure_ascii=False) + "\n")
 
     # summary
-    avg_p3 = sum(float(r["precision@3"]) for r in report_rows) / len(report_rows)
-    avg_p5 = sum(float(r["precision@5"]) for r in report_rows) / len(report_rows)
-    hit5_rate = sum(int(r["hit@5"]) for r in report_rows) / len(report_rows)
+    def avg(key: str) -> float:
+        return sum(float(r[key]) for r in report_rows) / len(report_rows)
 
     print("✅ Wrote:", report_csv)
     print("✅ Wrote:", failures_jsonl)
-    print(f"Avg precision@3 = {avg_p3:.4f}")
-    print(f"Avg precision@5 = {avg_p5:.4f}")
-    print(f"Hit@5 rate      = {hit5_rate:.4f}")
+    print(f"Avg precision@3 = {avg('precision@3'):.4f}")
+    print(f"Avg precision@5 = {avg('precision@5'):.4f}")
+    print(f"Hit@5 rate      = {avg('hit@5'):.4f}")
+    for name in ("mrr", "ndcg", "recall"):
+        key = f"{name}@{args.top_k}"
+        print(f"{key:<15} = {avg(key):.4f}")
+    print(f"Latency p50     = {statistics.median(float(r['latency_ms']) for r in report_rows):.2f} ms")
 
 
 if __name__ == "__main__":
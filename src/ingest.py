@@ -0,0 +1,389 @@
+#PDF ingestion: parallel page extraction, content-hash manifest, page-text cache, chunks.jsonl
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .chunker import chunk_document_structured
+from .pdf_audit import AUDIT_MANIFEST, audit_entry, load_audit
+
+CHUNK_SIZE = 2200
+OVERLAP = 250
+MIN_CHUNK_CHARS = 200
+
+PDF_DIR = Path("data_raw")
+OUT_JSONL = Path("data_processed") / "chunks.jsonl"
+CACHE_DIR = Path("data_processed") / "page_cache"
+MANIFEST = Path("data_processed") / "ingest_manifest.json"
+
+# called once per added / changed / removed document with its new rows ([] when removed)
+DocumentSink = Callable[[str, List[Dict[str, Any]]], None]
+
+
+def file_sha256(path: Path, block: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for buf in iter(lambda: f.read(block), b""):
+            h.update(buf)
+    return h.hexdigest()
+
+
+def load_manifest(path: Path) -> Dict[str, Dict[str, Any]]:
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: Dict[str, Dict[str, Any]], path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def page_count(pdf_path: Path) -> int:
+    import pdfplumber
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+
+def extract_pages(pdf_path: str, start: int, end: int) -> Tuple[str, int, List[str]]:
+    """
+    Text of pages [start, end) of one PDF (runs in a worker process).
+    """
+    import pdfplumber
+    out = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for i in range(start, min(end, len(pdf.pages))):
+            page = pdf.pages[i]
+            out.append(page.extract_text() or "")
+            page.close()  # drop the page's parsed layout objects; pdfplumber keeps them otherwise
+    return pdf_path, start, out
+
+
+def extract_pdfs(jobs: Dict[Path, int], workers: int = 0, pages_per_task: int = 25) -> Dict[Path, List[str]]:
+    """
+    Page texts of every PDF in `jobs` (path -> page count), split into page ranges
+    so one large manual is spread over several processes.
+    """
+    tasks = [(str(p), s, s + pages_per_task) for p, n in jobs.items() for s in range(0, max(n, 1), pages_per_task)]
+    pages: Dict[Path, List[Optional[str]]] = {p: [None] * n for p, n in jobs.items()}
+    if not tasks:
+        return {}
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            results = list(pool.map(extract_pages, *zip(*tasks)))
+    else:
+        results = [extract_pages(*t) for t in tasks]
+    for path, start, texts in results:
+        pages[Path(path)][start:start + len(texts)] = texts
+    return {p: [t or "" for t in texts] for p, texts in pages.items()}
+
+
+def _cache_path(cache_dir: Path, sha: str) -> Path:
+    return cache_dir / f"{sha}.json"
+
+
+def load_cached_pages(cache_dir: Path, sha: str) -> Optional[List[str]]:
+    p = _cache_path(cache_dir, sha)
+    if not p.exists():
+        return None
+    with open(p, "r", encoding="utf-8") as f:
+        return json.load(f)["pages"]
+
+
+def save_cached_pages(cache_dir: Path, sha: str, pages: List[str]) -> None:
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    with open(_cache_path(cache_dir, sha), "w", encoding="utf-8") as f:
+        json.dump({"pages": pages}, f, ensure_ascii=False)
+
+
+def clean_text(s: str) -> str:
+    s = s.replace("\r\n", "\n").replace("\r", "\n")
+    s = re.sub(r"\n{3,}", "\n\n", s)
+    s = re.sub(r"[ \t]{2,}", " ", s)
+    return s.strip()
+
+
+def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = OVERLAP) -> Iterator[Tuple[int, int, str]]:
+    """
+    Fixed character windows with overlap: (start_char, end_char, text).
+    """
+    if overlap >= chunk_size:
+        raise ValueError("overlap must be smaller than chunk_size")
+    start = 0
+    n = len(text)
+    while start < n:
+        end = min(start + chunk_size, n)
+        chunk = text[start:end].strip()
+        if len(chunk) >= MIN_CHUNK_CHARS:
+            yield start, end, chunk
+        start = max(end - overlap, 0)
+        if end == n:
+            break
+
+
+def chunk_document(doc_id: str, source: str, pages: List[str]) -> Iterator[Dict[str, Any]]:
+    """
+    chunks.jsonl rows of one document; chunk_id = "<doc_id>_<n:05d>", stable for unchanged text.
+    """
+    text = clean_text("\n\n".join(t for t in pages if t))
+    for j, (start_char, end_char, chunk) in enumerate(chunk_text(text)):
+        yield {
+            "doc_id": doc_id,
+            "source": source,
+            "chunk_id": f"{doc_id}_{j:05d}",
+            "text": chunk,
+            "start_char": start_char,
+            "end_char": end_char,
+        }
+
+
+CHUNKERS = {"window": chunk_document, "structured": chunk_document_structured}
+
+
+@dataclass
+class IngestResult:
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    # skipped: audited NEEDS_OCR / ERROR (see scripts/audit_pdfs.py)
+    needs_ocr: List[str] = field(default_factory=list)
+    # documents already in out_path that no PDF here produces (e.g. the notebook's data_text/*.txt),
+    # copied through unchanged unless prune=True
+    carried: List[str] = field(default_factory=list)
+    pages_extracted: int = 0
+    chunks_written: int = 0
+    # chunks re-created from page text (the rest were copied from the previous out_path)
+    chunks_rechunked: int = 0
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        return (f"added {len(self.added)}, changed {len(self.changed)}, unchanged {len(self.unchanged)}, "
+                f"removed {len(self.removed)}, needs OCR {len(self.needs_ocr)}, carried over {len(self.carried)} | "
+                f"pages extracted {self.pages_extracted}, chunks written {self.chunks_written} | {self.seconds:.2f}s")
+
+
+def _fingerprint(path: Path, previous: Optional[Dict[str, Any]]) -> str:
+    st = path.stat()
+    # unchanged size + mtime: trust the recorded hash instead of re-reading the file
+    if previous and previous.get("size") == st.st_size and previous.get("mtime_ns") == st.st_mtime_ns:
+        return previous["sha256"]
+    return file_sha256(path)
+
+
+def write_chunks(rows: Iterable[Dict[str, Any]], out_path: Path) -> int:
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_suffix(out_path.suffix + ".tmp")
+    n = 0
+    with open(tmp, "w", encoding="utf-8") as f:
+        for r in rows:
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+            n += 1
+    os.replace(tmp, out_path)
+    return n
+
+
+def index_documents(out_path: Path) -> Dict[str, List[List[int]]]:
+    """
+    doc_id -> [start, end, rows] byte spans of its rows in `out_path` (one span per contiguous run),
+    so a document can be copied into the next file without holding or re-parsing it.
+    """
+    spans: Dict[str, List[List[int]]] = {}
+    if not out_path.exists():
+        return spans
+    pos = 0
+    last = None
+    with open(out_path, "rb") as f:
+        for line in f:
+            start, pos = pos, pos + len(line)
+            if not line.strip():
+                continue
+            doc_id = json.loads(line).get("doc_id")
+            runs = spans.setdefault(doc_id, [])
+            if doc_id == last and runs[-1][1] == start:
+                runs[-1][1] = pos
+                runs[-1][2] += 1
+            else:
+                runs.append([start, pos, 1])
+            last = doc_id
+    return spans
+
+
+def _copy_spans(src: BinaryIO, dst: BinaryIO, runs: List[List[int]], block: int = 1 << 20) -> int:
+    for start, end, _ in runs:
+        src.seek(start)
+        left = end - start
+        buf = b""
+        while left > 0:
+            buf = src.read(min(block, left))
+            if not buf:
+                break
+            dst.write(buf)
+            left -= len(buf)
+        if not buf.endswith(b"\n"):
+            dst.write(b"\n")  # the old file's last row had no trailing newline
+    return sum(n for _, _, n in runs)
+
+
+def run_ingest(pdf_dir: Path = PDF_DIR, out_path: Path = OUT_JSONL, cache_dir: Path = CACHE_DIR,
+               manifest_path: Path = MANIFEST, workers: int = 0, pages_per_task: int = 25,
+               force: bool = False, chunker: str = "window",
+               audit_path: Optional[Path] = AUDIT_MANIFEST, prune: bool = False,
+               sink: Optional[DocumentSink] = None) -> IngestResult:
+    """
+    Bring `out_path` in line with the PDFs in `pdf_dir`. Only new or changed PDFs (by content
+    hash) are extracted and chunked; the rows of every other document are copied over from the
+    previous `out_path` (re-chunked from the page cache only if they are missing there or
+    were made by another chunker).
+    PDFs the audit manifest (`audit_path`) marks NEEDS_OCR / ERROR are skipped without being
+    opened, and its page counts are reused.
+    Only documents recorded in the manifest are ever removed: rows of any other document already
+    in `out_path` are copied through as they are, unless `prune` is set.
+    `chunker`: "window" (the notebook's 2200/250 windows) or "structured" (see chunker.py).
+    `sink(doc_id, rows)` gets each added / changed / removed document as soon as it is chunked
+    (e.g. ingest_mssql.document_replacer), so only one document's rows are held at a time.
+    """
+    chunk_fn = CHUNKERS[chunker]
+    t0 = time.perf_counter()
+    result = IngestResult()
+    old = load_manifest(manifest_path)
+    manifest: Dict[str, Dict[str, Any]] = {}
+    audit = load_audit(audit_path) if audit_path else {}
+    spans = index_documents(out_path)
+
+    pdfs: List[Path] = []
+    shas: Dict[Path, str] = {}
+    reuse: Dict[Path, Dict[str, Any]] = {}
+    jobs: Dict[Path, int] = {}
+    for p in sorted(pdf_dir.glob("*.pdf")):
+        prev = old.get(p.name)
+        sha = _fingerprint(p, prev)
+        checked = audit_entry(audit, p, sha)
+        if checked and checked["status"] != "OK":
+            result.needs_ocr.append(p.stem)
+            continue
+        pdfs.append(p)
+        shas[p] = sha
+        if prev is None:
+            result.added.append(p.stem)
+        elif prev["sha256"] != sha or force:
+            result.changed.append(p.stem)
+        else:
+            result.unchanged.append(p.stem)
+            # manifests written before "chunker" was recorded: re-chunk once from the cache
+            if (prev.get("chunker") == chunker
+                    and sum(n for _, _, n in spans.get(p.stem, [])) == prev.get("chunks")):
+                reuse[p] = prev
+                continue
+        if force or not _cache_path(cache_dir, sha).exists():
+            if prev and prev["sha256"] == sha and prev.get("pages"):
+                jobs[p] = prev["pages"]
+            elif checked and checked.get("pages"):
+                jobs[p] = checked["pages"]
+            else:
+                jobs[p] = page_count(p)
+    kept = {p.name for p in pdfs}
+    result.removed = sorted(Path(name).stem for name in old if name not in kept)
+    # a PDF's own rows are always rewritten; a removed PDF's rows always dropped
+    managed = {p.stem for p in pdfs} | {Path(name).stem for name in old}
+    other = sorted(doc_id for doc_id in spans if doc_id not in managed)
+    if prune:
+        result.removed = sorted(set(result.removed) | set(other))
+        other = []
+    result.carried = other
+
+    for p, pages in extract_pdfs(jobs, workers=workers, pages_per_task=pages_per_task).items():
+        save_cached_pages(cache_dir, shas[p], pages)
+        result.pages_extracted += len(pages)
+
+    touched = set(result.added) | set(result.changed)
+    if sink is not None:
+        for doc_id in result.removed:
+            sink(doc_id, [])
+
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_suffix(out_path.suffix + ".tmp")
+    src = open(out_path, "rb") if spans else None
+    try:
+        with open(tmp, "wb") as f:
+            for p in pdfs:
+                st = p.stat()
+                if p in reuse:
+                    result.chunks_written += _copy_spans(src, f, spans[p.stem])
+                    manifest[p.name] = {**reuse[p], "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+                    continue
+                pages = load_cached_pages(cache_dir, shas[p]) or []
+                send = sink is not None and p.stem in touched
+                rows = []
+                n = 0
+                for row in chunk_fn(p.stem, str(p), pages):
+                    f.write((json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8"))
+                    if send:
+                        rows.append(row)
+                    n += 1
+                if send:
+                    sink(p.stem, rows)
+                result.chunks_rechunked += n
+                result.chunks_written += n
+                manifest[p.name] = {"sha256": shas[p], "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                                    "pages": len(pages), "doc_id": p.stem, "chunks": n, "chunker": chunker}
+            for doc_id in result.carried:
+                result.chunks_written += _copy_spans(src, f, spans[doc_id])
+    finally:
+        if src is not None:
+            src.close()
+    os.replace(tmp, out_path)
+    save_manifest(manifest, manifest_path)
+    result.seconds = time.perf_counter() - t0
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental PDF -> chunks.jsonl ingestion.")
+    parser.add_argument("--pdf-dir", default=str(PDF_DIR))
+    parser.add_argument("--out", default=str(OUT_JSONL))
+    parser.add_argument("--cache-dir", default=str(CACHE_DIR))
+    parser.add_argument("--manifest", default=str(MANIFEST))
+    parser.add_argument("--workers", type=int, default=0, help="Extraction processes (default: CPU count)")
+    parser.add_argument("--pages-per-task", type=int, default=25)
+    parser.add_argument("--force", action="store_true", help="Re-extract every PDF")
+    parser.add_argument("--chunker", choices=sorted(CHUNKERS), default="window",
+                        help="structured: split at headings/bullets under a token budget, with page numbers")
+    parser.add_argument("--audit", default=str(AUDIT_MANIFEST),
+                        help="Audit manifest from scripts/audit_pdfs.py ('' to ignore)")
+    parser.add_argument("--prune", action="store_true",
+                        help="Drop documents in --out that no PDF in --pdf-dir produces (kept by default)")
+    parser.add_argument("--mssql", action="store_true", help="Also upsert changed documents into MSSQL")
+    args = parser.parse_args()
+
+    with ExitStack() as stack:
+        sink = None
+        if args.mssql:
+            from .ingest_mssql import document_replacer
+            sink = stack.enter_context(document_replacer())
+        result = run_ingest(Path(args.pdf_dir), Path(args.out), Path(args.cache_dir), Path(args.manifest),
+                            workers=args.workers, pages_per_task=args.pages_per_task, force=args.force,
+                            chunker=args.chunker, audit_path=Path(args.audit) if args.audit else None,
+                            prune=args.prune, sink=sink)
+    print("✅ Wrote:", args.out)
+    print(result.summary())
+    for doc_id in result.needs_ocr:
+        print("  needs OCR (skipped):", doc_id)
+    for doc_id in result.carried:
+        print("  no PDF, kept as is (--prune to drop):", doc_id)
+
+
+if __name__ == "__main__":
+    main()
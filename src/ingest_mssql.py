@@ -1,6 +1,7 @@
 import os
 import json
 import argparse
+from contextlib import contextmanager
 from pathlib import Path
 
 import pyodbc
@@ -95,6 +96,44 @@ def ingest_jsonl_to_mssql(jsonl_path: str, *, upsert: bool = True, batch_size: i
     print(f"Mode: {mode} | Processed: {processed} | Skipped (too short): {skipped_short}")
 
 
+@contextmanager
+def document_replacer(*, batch_size: int = 500):
+    """Yield replace(doc_id, rows): swap every chunk of one document for `rows`.
+
+    Used by incremental ingestion, which calls it as each document is chunked:
+    changed documents may now have fewer chunks, and removed documents have none
+    (rows=[]), so their old rows are deleted first. Everything runs in one
+    transaction, committed when the block exits and rolled back if it raises.
+    """
+    conn = pyodbc.connect(os.environ["MSSQL_CONN_STR"])
+    cur = conn.cursor()
+    cur.fast_executemany = True
+    replaced = []
+
+    def replace(doc_id, rows) -> None:
+        cur.execute("DELETE FROM dbo.rag_chunks WHERE doc_id = ?", doc_id)
+        batch = []
+        for r in rows:
+            batch.append((r["doc_id"], r["chunk_id"], r.get("source") or r["doc_id"], r["text"]))
+            if len(batch) >= batch_size:
+                cur.executemany(MERGE_UPSERT_SQL, batch)
+                batch.clear()
+        if batch:
+            cur.executemany(MERGE_UPSERT_SQL, batch)
+        replaced.append(doc_id)
+
+    try:
+        yield replace
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+    print(f"Replaced chunks of {len(replaced)} documents")
+
+
 def _build_argparser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(description="Ingest chunks.jsonl into MSSQL (idempotent upsert by chunk_id).")
     p.add_argument("jsonl_path", nargs="?", default="data_processed/chunks.jsonl", help="Path to chunks.jsonl")
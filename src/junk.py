@@ -0,0 +1,67 @@
+#Junk-chunk classifier (TOC / index / cross-reference pages)
+import re
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+SECTION_REF_RE = re.compile(r"\b[A-Z]?\d+\-\d+\b")
+
+
+def junk_signals(text: str) -> List[str]:
+    """
+    Names of the junk heuristics that fire for `text` (empty list = clean chunk).
+    """
+    t = (text or "").lower()
+    head = t[:600]  # only look at the start of the chunk
+    signals = []
+
+    # obvious index/contents markers
+    if "contents" in head or "index" in head:
+        signals.append("contents_or_index")
+
+    # "Summary of ..." / appendix index pages
+    if "summary of" in head and "guidelines" in head:
+        signals.append("guidelines_summary")
+
+    # looks like index: tons of commas in a long block
+    if t.count(",") > 25 and len(t) > 800:
+        signals.append("comma_dense")
+
+    # lots of page/section artifacts: many "A-5", "2-21", etc.
+    # (on the original text: the pattern's capital prefix never matches the lowercased head)
+    if len(SECTION_REF_RE.findall((text or "")[:600])) >= 8:
+        signals.append("section_refs")
+
+    # typical TOC dot leaders
+    if "....." in t:
+        signals.append("dot_leaders")
+
+    return signals
+
+
+def is_junk_text(text: str) -> bool:
+    return bool(junk_signals(text))
+
+
+def is_junk_chunk(h) -> bool:
+    """
+    Hit-level check. Uses the flag computed at index time when the retriever provides one.
+    """
+    if "junk" in h:
+        return bool(h["junk"])
+    return is_junk_text(h.get("text") or "")
+
+
+def classify_chunks(chunks) -> Tuple[np.ndarray, Dict[int, Tuple[str, ...]]]:
+    """
+    Index-time pass: boolean junk bitmap aligned with `chunks`, plus the signals
+    recorded for each flagged chunk index.
+    """
+    flags = np.zeros(len(chunks), dtype=bool)
+    signals: Dict[int, Tuple[str, ...]] = {}
+    for i, ch in enumerate(chunks):
+        s = junk_signals(ch.text)
+        if s:
+            flags[i] = True
+            signals[i] = tuple(s)
+    return flags, signals
@@ -1,29 +1,31 @@
 # prompt building helpers and Ollama API calls
-import os
-import requests
-from typing import List, Dict
+from typing import List, Dict, Optional
 
-OLLAMA_URL = os.getenv("OLLAMA_URL", "http://127.0.0.1:11434")
-OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1:8b")
+from .context_packer import CONTEXT_TOKENS, pack_context
+from .llm_client import get_llm_client
 
 
-def build_rag_prompt(question: str, hits: List[Dict]) -> str:
+def build_rag_prompt(question: str, hits: List[Dict], token_budget: Optional[int] = CONTEXT_TOKENS) -> str:
     """
     Build a prompt for the LLM using retrieved chunks.
     `hits` are dicts like: {doc_id, chunk_id, score, text, source}
+    With a `token_budget`, only the most relevant sentences are kept (see context_packer).
     """
-    context_blocks = []
-    for h in hits:
-        chunk_id = h.get("chunk_id", "unknown_chunk")
-        doc_id = h.get("doc_id", "unknown_doc")
-        text = (h.get("text") or "").strip()
-        if not text:
-            continue
-        context_blocks.append(
-            f"[{chunk_id} | {doc_id}]\n{text}"
-        )
-
-    context = "\n\n---\n\n".join(context_blocks)
+    if token_budget is not None:
+        context = pack_context(question, hits, token_budget=token_budget).text
+    else:
+        context_blocks = []
+        for h in hits:
+            chunk_id = h.get("chunk_id", "unknown_chunk")
+            doc_id = h.get("doc_id", "unknown_doc")
+            text = (h.get("text") or "").strip()
+            if not text:
+                continue
+            context_blocks.append(
+                f"[{chunk_id} | {doc_id}]\n{text}"
+            )
+
+        context = "\n\n---\n\n".join(context_blocks)
 
     return f"""
         You are a technical assistant.
@@ -53,14 +55,7 @@ def build_rag_prompt(question: str, hits: List[Dict]) -> str:
 
 
 def ask_ollama(prompt: str, model: str = None, timeout: int = 120) -> str:
-    model = model or OLLAMA_MODEL
-    r = requests.post(
-        f"{OLLAMA_URL}/api/generate",
-        json={"model": model, "prompt": prompt, "stream": False},
-        timeout=timeout,
-    )
-    r.raise_for_status()
-    return r.json().get("response", "").strip()
+    return get_llm_client().generate_text(prompt, model=model, timeout_s=timeout)
 
 
 def answer_with_llm(question: str, hits: List[Dict]) -> str:
@@ -0,0 +1,147 @@
+#Shared Ollama client: pooled HTTP session, keep_alive, bounded retries
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .metrics import REGISTRY, Counter
+
+LLM_RETRIES = REGISTRY.register(Counter(
+    "rag_llm_retries_total", "LLM HTTP calls retried, by reason."))
+
+# connection failures and these statuses are retried; timeouts are not (the model is busy, not gone)
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+class LLMClient:
+    """
+    Ollama /api/generate client. One pooled keep-alive HTTP session per process;
+    `keep_alive` asks Ollama to keep the model loaded between requests.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "http://127.0.0.1:11434",
+        model: str = "llama3.1:8b",
+        options: Optional[Dict[str, Any]] = None,
+        keep_alive: Optional[str] = "30m",
+        timeout_s: float = 120.0,
+        connect_timeout_s: float = 3.0,
+        retries: int = 2,
+        backoff_s: float = 0.5,
+        pool_size: int = 8,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.options = dict(options or {})
+        self.keep_alive = keep_alive
+        self.timeout_s = timeout_s
+        self.connect_timeout_s = connect_timeout_s
+        self.retries = max(0, retries)
+        self.backoff_s = backoff_s
+        self.pool_size = pool_size
+        self._pid = os.getpid()
+        self.session = self._new_session()
+
+    def _new_session(self) -> requests.Session:
+        s = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+        s.mount("http://", adapter)
+        s.mount("https://", adapter)
+        return s
+
+    def _session(self) -> requests.Session:
+        # pooled sockets must not be shared with a forked child (see src/serve.py)
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self.session = self._new_session()
+        return self.session
+
+    def generate(self, prompt: str, model: Optional[str] = None, options: Optional[Dict[str, Any]] = None,
+                 timeout_s: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Non-streaming generation; returns Ollama's JSON (response text + timing fields).
+        Retries connection errors and 429/5xx up to `retries` times with exponential backoff.
+        """
+        payload: Dict[str, Any] = {
+            "model": model or self.model,
+            "prompt": prompt,
+            "stream": False,
+            "options": {**self.options, **(options or {})},
+        }
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        timeout = (self.connect_timeout_s, timeout_s if timeout_s is not None else self.timeout_s)
+
+        attempt = 0
+        while True:
+            try:
+                r = self._session().post(f"{self.base_url}/api/generate", json=payload, timeout=timeout)
+                if r.status_code in RETRY_STATUSES and attempt < self.retries:
+                    reason = str(r.status_code)
+                else:
+                    r.raise_for_status()
+                    return r.json()
+            except requests.ConnectionError:
+                if attempt >= self.retries:
+                    raise
+                reason = "connection"
+            LLM_RETRIES.inc(reason=reason)
+            time.sleep(self.backoff_s * (2 ** attempt))
+            attempt += 1
+
+    def generate_text(self, prompt: str, **kw) -> str:
+        return (self.generate(prompt, **kw).get("response") or "").strip()
+
+    def generate_batch(self, prompts: List[str], max_workers: int = 4, **kw) -> List[Dict[str, Any]]:
+        """
+        Generate for several prompts concurrently over the pooled session (results in input order).
+        Ollama serializes them unless OLLAMA_NUM_PARALLEL > 1, but connection setup and queueing overlap.
+        """
+        if not prompts:
+            return []
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, self.pool_size, len(prompts)))) as pool:
+            return list(pool.map(lambda p: self.generate(p, **kw), prompts))
+
+
+_CLIENT: Optional[LLMClient] = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def client_from_env() -> LLMClient:
+    """
+    OLLAMA_URL, OLLAMA_MODEL, RAG_LLM_KEEP_ALIVE, RAG_LLM_TIMEOUT, RAG_LLM_RETRIES,
+    RAG_LLM_TEMPERATURE, RAG_LLM_NUM_PREDICT.
+    """
+    return LLMClient(
+        base_url=os.getenv("OLLAMA_URL", "http://127.0.0.1:11434"),
+        model=os.getenv("OLLAMA_MODEL", "llama3.1:8b"),
+        options={
+            "temperature": float(os.getenv("RAG_LLM_TEMPERATURE", "0.1")),
+            "num_predict": int(os.getenv("RAG_LLM_NUM_PREDICT", "200")),
+        },
+        keep_alive=os.getenv("RAG_LLM_KEEP_ALIVE", "30m") or None,
+        timeout_s=float(os.getenv("RAG_LLM_TIMEOUT", "120")),
+        retries=int(os.getenv("RAG_LLM_RETRIES", "2")),
+    )
+
+
+def get_llm_client() -> LLMClient:
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = client_from_env()
+        return _CLIENT
+
+
+def set_llm_client(client: Optional[LLMClient]) -> None:
+    """
+    Replace the process-wide client (tests, benchmarks against the mock server).
+    """
+    global _CLIENT
+    with _CLIENT_LOCK:
+        _CLIENT = client
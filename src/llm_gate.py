@@ -0,0 +1,164 @@
+#Admission control for LLM generation (bounded concurrency + queue)
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from .metrics import REGISTRY, Counter, Gauge, stage
+
+# service-time guess used for wait estimates until a generation has been timed
+DEFAULT_SERVICE_S = 10.0
+
+
+class LLMBusy(RuntimeError):
+    """
+    Raised when a generation request is not admitted.
+    `reason` is one of "queue_full", "queue_timeout", "expected_wait".
+    """
+
+    def __init__(self, reason: str, expected_wait_s: float, retry_after_s: float):
+        super().__init__(f"LLM busy ({reason}), expected wait {expected_wait_s:.1f}s")
+        self.reason = reason
+        self.expected_wait_s = expected_wait_s
+        self.retry_after_s = retry_after_s
+
+
+class LLMGate:
+    """
+    At most `max_concurrency` generations run at once; at most `max_queue` wait behind them.
+    Service time is tracked as an EWMA so the expected wait of a new request can be
+    estimated up front and compared to the caller's latency budget. Requests are only
+    rejected on that estimate once it is known: seeded with `initial_service_s`
+    (RAG_LLM_SERVICE_S) or learned from at least one completed generation.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 1,
+        max_queue: int = 8,
+        queue_timeout_s: float = 30.0,
+        initial_service_s: Optional[float] = None,
+        ewma_alpha: float = 0.2,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout_s = queue_timeout_s
+        self.avg_service_s = DEFAULT_SERVICE_S if initial_service_s is None else initial_service_s
+        self.ewma_alpha = ewma_alpha
+        self.seeded = initial_service_s is not None
+        self.samples = 0
+
+        self._sem = threading.Semaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+
+    def expected_wait_s(self) -> float:
+        """
+        Estimated queueing delay (excluding own service time) for a request arriving now.
+        """
+        with self._lock:
+            ahead = self.in_flight + self.waiting - self.max_concurrency + 1
+        if ahead <= 0:
+            return 0.0
+        return ahead * self.avg_service_s / self.max_concurrency
+
+    @contextmanager
+    def slot(self, latency_budget_s: Optional[float] = None) -> Iterator[float]:
+        """
+        Hold one generation slot for the duration of the block; yields the time spent queued.
+        Raises LLMBusy instead of queueing when the request cannot finish within its budget.
+        """
+        expected = self.expected_wait_s()
+        known = self.seeded or self.samples > 0
+        if latency_budget_s is not None and known and expected + self.avg_service_s > latency_budget_s:
+            raise LLMBusy("expected_wait", expected, expected)
+
+        with self._lock:
+            if self.in_flight >= self.max_concurrency and self.waiting >= self.max_queue:
+                raise LLMBusy("queue_full", expected, expected)
+            self.waiting += 1
+
+        timeout = self.queue_timeout_s
+        if latency_budget_s is not None:
+            timeout = min(timeout, max(latency_budget_s - (self.avg_service_s if known else 0.0), 0.0))
+
+        t0 = time.perf_counter()
+        with stage("llm_queue"):
+            acquired = self._sem.acquire(timeout=timeout)
+        queued_s = time.perf_counter() - t0
+
+        with self._lock:
+            self.waiting -= 1
+            if acquired:
+                self.in_flight += 1
+        if not acquired:
+            raise LLMBusy("queue_timeout", self.expected_wait_s(), self.avg_service_s)
+
+        t1 = time.perf_counter()
+        ok = False
+        try:
+            yield queued_s
+            ok = True
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                if ok:
+                    took = time.perf_counter() - t1
+                    if self.seeded or self.samples:
+                        self.avg_service_s += self.ewma_alpha * (took - self.avg_service_s)
+                    else:
+                        # the first real measurement replaces the guess outright
+                        self.avg_service_s = took
+                    self.samples += 1
+            self._sem.release()
+
+
+_GATE: Optional[LLMGate] = None
+_GATE_LOCK = threading.Lock()
+
+
+def get_llm_gate() -> LLMGate:
+    """
+    Process-wide gate configured from RAG_LLM_CONCURRENCY, RAG_LLM_MAX_QUEUE,
+    RAG_LLM_QUEUE_TIMEOUT and RAG_LLM_SERVICE_S (seconds).
+
+    Under src.serve (RAG_PREFORKED), the concurrency and queue limits are for the whole
+    server: each of its RAG_PREFORKED_WORKERS workers gets an equal share, rounded down
+    (but at least one generation slot).
+    """
+    global _GATE
+    with _GATE_LOCK:
+        if _GATE is None:
+            service_s = os.getenv("RAG_LLM_SERVICE_S")
+            concurrency = int(os.getenv("RAG_LLM_CONCURRENCY", "1"))
+            max_queue = int(os.getenv("RAG_LLM_MAX_QUEUE", "8"))
+            if os.getenv("RAG_PREFORKED", "0") == "1":
+                workers = max(1, int(os.getenv("RAG_PREFORKED_WORKERS", "1")))
+                concurrency = max(1, concurrency // workers)
+                max_queue //= workers
+            _GATE = LLMGate(
+                max_concurrency=concurrency,
+                max_queue=max_queue,
+                queue_timeout_s=float(os.getenv("RAG_LLM_QUEUE_TIMEOUT", "30")),
+                initial_service_s=float(service_s) if service_s else None,
+            )
+        return _GATE
+
+
+LLM_REJECTED = REGISTRY.register(Counter(
+    "rag_llm_rejected_total", "LLM requests not admitted, by reason and outcome (degraded/429)."))
+
+
+def _gate_gauges():
+    if _GATE is None:
+        return {}
+    return {
+        (("state", "in_flight"),): float(_GATE.in_flight),
+        (("state", "waiting"),): float(_GATE.waiting),
+    }
+
+
+LLM_QUEUE = REGISTRY.register(Gauge(
+    "rag_llm_queue", "LLM generations in flight / waiting for a slot.", fn=_gate_gauges))
@@ -1,8 +1,24 @@
 #calls Ollama
-import requests
+from contextlib import nullcontext
 
-OLLAMA_URL = "http://127.0.0.1:11434/api/generate"
-MODEL = "llama3.1:8b"
+from .answer_cache import context_fingerprint, get_answer_cache, make_key, template_hash
+from .context_packer import CONTEXT_TOKENS, pack_context
+from .llm_client import get_llm_client
+from .metrics import CONTEXT_COMPRESSION
+from .tracing import approx_tokens, current_trace
+
+PROMPT_TEMPLATE = """You are a technical assistant.
+    Answer the question using ONLY the information in the context.
+    If the answer is not in the context, say: I don't know.
+
+    Context:
+    {context}
+
+    Question: {question}
+
+    Answer (be concise and factual):"""
+
+PROMPT_HASH = template_hash(PROMPT_TEMPLATE)
 
 def build_context(hits, max_chars=3500):
     parts = []
@@ -20,40 +36,77 @@ def build_context(hits, max_chars=3500):
     return "\n\n".join(parts)
 
 def rag_prompt(question: str, context: str) -> str:
-    return f"""You are a technical assistant.
-    Answer the question using ONLY the information in the context.
-    If the answer is not in the context, say: I don't know.
+    return PROMPT_TEMPLATE.format(context=context, question=question)
 
-    Context:
-    {context}
+def ask_ollama(prompt: str, model: str = None) -> str:
+    data = get_llm_client().generate(prompt, model=model)
+    trace = current_trace()
+    if trace is not None:
+        trace.set("llm", generation_stats(data))
+    return data["response"].strip()
 
-    Question: {question}
+def generation_stats(data) -> dict:
+    """
+    Timing fields from a non-streaming Ollama /api/generate response (durations are in ns).
+    Time-to-first-token is approximated as model load + prompt evaluation.
+    """
+    ns = 1e9
+    eval_count = data.get("eval_count") or 0
+    eval_s = (data.get("eval_duration") or 0) / ns
+    return {
+        "prompt_tokens": data.get("prompt_eval_count"),
+        "output_tokens": eval_count,
+        "time_to_first_token_s": ((data.get("load_duration") or 0) + (data.get("prompt_eval_duration") or 0)) / ns,
+        "tokens_per_s": (eval_count / eval_s) if eval_s > 0 else None,
+        "total_s": (data.get("total_duration") or 0) / ns,
+    }
 
-    Answer (be concise and factual):"""
+def answer_with_llm(question: str, hits, model: str = None, use_cache: bool = True,
+                    gate=None, latency_budget_s=None, context_tokens=CONTEXT_TOKENS, sentence_store=None):
+    """
+    `gate` (an LLMGate) bounds concurrent generations; it is only entered on a cache miss
+    and raises LLMBusy when the request cannot be admitted within `latency_budget_s`.
 
-def ask_ollama(prompt: str, model: str = MODEL) -> str:
-    r = requests.post(
-        OLLAMA_URL,
-        json={"model": model,
-                "prompt": prompt, 
-                "stream": False,
-                "options": {
-                    "temperature": 0.1,
-                    "num_predict": 200}},
-        timeout=120,
-    )
-    r.raise_for_status()
-    return r.json()["response"].strip()
-
-def answer_with_llm(question: str, hits):
-    context = build_context(hits)
-    prompt = rag_prompt(question, context)
-    answer = ask_ollama(prompt)
+    The prompt context keeps only the most relevant sentences of `hits` within
+    `context_tokens` (approx. tokens, see context_packer); None sends whole chunks
+    as before (build_context). Citations are the chunks that made it into the prompt.
+    `model` defaults to the current LLM client's (set_llm_client), read per call.
+    """
+    model = model or get_llm_client().model
+    # same question + same ordered context + same prompt/model/budget -> same answer
+    cache = get_answer_cache() if use_cache else None
+    if cache is not None:
+        key = make_key(question, [h.get("chunk_id", "") for h in hits], f"{PROMPT_HASH}:{context_tokens}", model)
+        fingerprint = context_fingerprint(hits)
+        cached = cache.get(key, fingerprint)
+        if cached is not None:
+            cached["cached"] = True
+            return cached
 
-    citations = []
-    for h in hits:
-        cid = h.get("chunk_id")
-        if cid and cid not in citations:
-            citations.append(cid)
+    trace = current_trace()
+    if context_tokens is None:
+        context = build_context(hits)
+        citations = []
+        for h in hits:
+            cid = h.get("chunk_id")
+            if cid and cid not in citations:
+                citations.append(cid)
+    else:
+        packed = pack_context(question, hits, token_budget=context_tokens, sentence_store=sentence_store)
+        context = packed.text
+        citations = packed.chunk_ids
+        CONTEXT_COMPRESSION.observe(packed.compression_ratio)
+        if trace is not None:
+            trace.set("context", packed.stats())
+    prompt = rag_prompt(question, context)
+    if trace is not None:
+        trace.set("prompt_chars", len(prompt))
+        trace.set("prompt_tokens_approx", approx_tokens(prompt))
+    with (gate.slot(latency_budget_s) if gate is not None else nullcontext()):
+        answer = ask_ollama(prompt, model=model)
 
-    return {"answer": answer, "citations": citations}
+    out = {"answer": answer, "citations": citations}
+    if cache is not None:
+        cache.put(key, fingerprint, out, chunk_ids=citations)
+    out["cached"] = False
+    return out
@@ -0,0 +1,255 @@
+#Prometheus-style metrics (no external dependency)
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from .tracing import current_trace
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+# every metric, so a forked child can re-create their locks (see _after_fork_in_child)
+_METRICS = weakref.WeakSet()
+
+
+def _new_lock(metric) -> threading.Lock:
+    _METRICS.add(metric)
+    return threading.Lock()
+
+
+def _after_fork_in_child() -> None:
+    # Retrieval pools fork from /index/update while request threads keep observing metrics;
+    # a lock one of them held at fork time would stay locked forever in the child.
+    for m in list(_METRICS):
+        m._lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = _new_lock(self)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, v in sorted(self._values.items()):
+                lines.append(f"{self.name}{_fmt_labels(key)} {_fmt_value(v)}")
+        return lines
+
+
+class Gauge:
+    """
+    Gauge set explicitly, or computed at scrape time from `fn` (returns {labels_tuple: value}).
+    """
+
+    def __init__(self, name: str, help: str, fn: Optional[Callable[[], Dict[LabelKey, float]]] = None):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = _new_lock(self)
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = float(value)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            values = dict(self._values)
+        if self.fn is not None:
+            values.update(self.fn())
+        for key, v in sorted(values.items()):
+            lines.append(f"{self.name}{_fmt_labels(key)} {_fmt_value(v)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, List[float]] = {}  # bucket counts..., sum, count
+        self._lock = _new_lock(self)
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, le in enumerate(self.buckets):
+                if value <= le:
+                    s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def count(self, **labels) -> float:
+        s = self._series.get(_label_key(labels))
+        return s[-1] if s else 0.0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, s in sorted(self._series.items()):
+                for i, le in enumerate(self.buckets):
+                    lines.append(f"{self.name}_bucket{_fmt_labels(key, ('le', _fmt_value(le)))} {_fmt_value(s[i])}")
+                lines.append(f"{self.name}_bucket{_fmt_labels(key, ('le', '+Inf'))} {_fmt_value(s[-1])}")
+                lines.append(f"{self.name}_sum{_fmt_labels(key)} {_fmt_value(s[-2])}")
+                lines.append(f"{self.name}_count{_fmt_labels(key)} {_fmt_value(s[-1])}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in self.metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+def process_rss_bytes() -> float:
+    """
+    Resident set size of this process (Linux /proc, falls back to peak RSS elsewhere).
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return float(pages * os.sysconf("SC_PAGE_SIZE"))
+    except (OSError, ValueError, AttributeError):
+        try:
+            import resource
+            return float(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+        except ImportError:
+            return 0.0
+
+
+def memory_breakdown(pid="self") -> Dict[str, int]:
+    """
+    Shared vs private memory of a process in bytes, from /proc/<pid>/smaps_rollup (Linux only).
+    Pages inherited from a forking parent and not yet written to count as shared.
+    """
+    out: Dict[str, int] = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 3 and parts[2] == "kB":
+                    out[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    except OSError:
+        return {}
+    return {
+        "rss": out.get("Rss", 0),
+        "pss": out.get("Pss", 0),
+        "shared": out.get("Shared_Clean", 0) + out.get("Shared_Dirty", 0),
+        "private": out.get("Private_Clean", 0) + out.get("Private_Dirty", 0),
+    }
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "rag_stage_seconds", "Latency of each RAG pipeline stage, by stage and retriever."))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "rag_request_seconds", "End-to-end /query latency, by retriever and mode."))
+REQUESTS_TOTAL = REGISTRY.register(Counter(
+    "rag_requests_total", "Handled /query requests, by retriever, mode and status."))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "rag_cache_requests_total", "Cache lookups, by cache and result (hit/miss)."))
+LLM_TIMEOUTS = REGISTRY.register(Counter(
+    "rag_llm_timeouts_total", "LLM calls that timed out."))
+LLM_ERRORS = REGISTRY.register(Counter(
+    "rag_llm_errors_total", "LLM calls that failed for any other reason."))
+CONTEXT_COMPRESSION = REGISTRY.register(Histogram(
+    "rag_context_compression_ratio", "Hit tokens / packed LLM context tokens.",
+    buckets=(1.0, 1.5, 2.0, 3.0, 4.0, 6.0, 8.0, 12.0, 16.0)))
+HYBRID_DECISIONS = REGISTRY.register(Counter(
+    "rag_hybrid_decisions_total", "mode=hybrid requests, by who answered (extractive/llm)."))
+EXTRACTIVE_CONFIDENCE = REGISTRY.register(Histogram(
+    "rag_extractive_confidence", "Confidence of the extractive answer in mode=hybrid.",
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.75, 0.8, 0.9, 1.0)))
+QUERY_POSTINGS = REGISTRY.register(Counter(
+    "rag_query_postings_total", "BM25 posting entries per query, by retriever and kind (scored / saved by planning)."))
+INDEX_CHUNKS = REGISTRY.register(Gauge(
+    "rag_index_chunks", "Chunks indexed, by retriever."))
+INDEX_TERMS = REGISTRY.register(Gauge(
+    "rag_index_terms", "Vocabulary size, by retriever."))
+INDEX_UPDATES = REGISTRY.register(Counter(
+    "rag_index_updates_total", "Live index swaps (POST /index/update), by retriever."))
+INDEX_FRESHNESS = REGISTRY.register(Histogram(
+    "rag_index_freshness_seconds", "PDF change detected -> new index serving queries."))
+PROCESS_RSS = REGISTRY.register(Gauge(
+    "process_resident_memory_bytes", "Resident memory size in bytes.",
+    fn=lambda: {(): process_rss_bytes()}))
+PROCESS_MEMORY = REGISTRY.register(Gauge(
+    "rag_process_memory_bytes", "Shared vs private memory of this worker (Linux).",
+    fn=lambda: {(("kind", k),): float(v) for k, v in memory_breakdown().items()}))
+
+
+@contextmanager
+def stage(name: str, **labels) -> Iterator[None]:
+    """
+    Time a pipeline stage into rag_stage_seconds{stage=name, ...}
+    (and into the request trace, if one is active).
+    """
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        STAGE_SECONDS.observe(elapsed, stage=name, **labels)
+        trace = current_trace()
+        if trace is not None:
+            trace.record_stage(name, elapsed, **labels)
+
+
+def render_latest() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,129 @@
+#Mine query expansion rules from the corpus: acronyms defined next to their long form
+import argparse
+import json
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+
+from .query_utils import EXPANSIONS_PATH
+
+# mined rules count less than hand-written ones (default_weight in the rules file)
+MINED_WEIGHT = 0.5
+# a single parenthetical is too weak a signal: "(CUTS)", "(FAB)" turn up once and collide with words
+MIN_COUNT = 2
+
+# "... logical storage manager (LSM)"
+_DEF_RE = re.compile(r"((?:[A-Za-z][\w/-]*[\s-]+){1,8})\(([A-Z][A-Za-z0-9]{1,7})\)")
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z0-9]*")
+# allowed inside a long form without contributing a letter
+_SKIP_WORDS = {"a", "an", "and", "for", "in", "of", "on", "the", "to"}
+
+
+def _acronym_key(acronym: str) -> str:
+    # plural "PCs" -> "pc"
+    if acronym.endswith("s") and acronym[:-1].isupper():
+        acronym = acronym[:-1]
+    return acronym.lower()
+
+
+def _long_form(words: List[str], acronym: str) -> str:
+    """
+    Shortest tail of `words` whose initials spell `acronym` ("" if none does).
+    """
+    letters = [c for c in _acronym_key(acronym) if c.isalpha()]
+    if len(letters) < 2:
+        return ""
+    for k in range(len(letters), min(len(words), 2 * len(letters)) + 1):
+        tail = words[-k:]
+        initials = [w[0].lower() for w in tail if w.lower() not in _SKIP_WORDS]
+        if initials == letters and tail[0].lower() not in _SKIP_WORDS:
+            return " ".join(w.lower() for w in tail)
+    return ""
+
+
+def mine_acronyms(texts: Iterable[str], min_count: int = MIN_COUNT) -> Dict[str, Counter]:
+    """
+    acronym (lowercase) -> Counter of long forms it was defined with. Acronyms that are also
+    written as ordinary lowercase words ("via", "cuts") are dropped.
+    """
+    found: Dict[str, Counter] = defaultdict(Counter)
+    words = set()
+    for text in texts:
+        words.update(w for w in _WORD_RE.findall(text) if w.islower())
+        for m in _DEF_RE.finditer(text):
+            acronym = m.group(2)
+            long_form = _long_form(_WORD_RE.findall(m.group(1)), acronym)
+            if long_form:
+                found[_acronym_key(acronym)][long_form] += 1
+    return {a: c for a, c in found.items() if sum(c.values()) >= min_count and a not in words}
+
+
+def acronym_rules(acronyms: Dict[str, Counter], weight: float = MINED_WEIGHT,
+                  exclude: Iterable[str] = ()) -> List[Dict[str, Any]]:
+    """
+    long form -> acronym always; acronym -> long form only when the corpus defines it one way.
+    Acronyms in `exclude` (the rules file's "mined_exclude", checked by hand) get no rules.
+    """
+    exclude = {a.lower() for a in exclude}
+    rules: List[Dict[str, Any]] = []
+    for acronym, forms in sorted(acronyms.items()):
+        if acronym in exclude:
+            continue
+        for long_form in sorted(forms):
+            rules.append({"match": long_form, "expand": [acronym], "weight": weight, "source": "mined"})
+        if len(forms) == 1:
+            rules.append({"match": acronym, "expand": list(forms), "weight": weight, "source": "mined"})
+    return rules
+
+
+def merge_rules(existing: Dict[str, Any], mined: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], int]:
+    """
+    Replace the previously mined rules; hand-written rules win on the same phrase.
+    """
+    manual = [r for r in existing.get("rules", []) if r.get("source") != "mined"]
+    taken = {r["match"].lower() for r in manual}
+    new = [r for r in mined if r["match"] not in taken]
+    return {**existing, "rules": manual + new}, len(new)
+
+
+def dump_rules(data: Dict[str, Any]) -> str:
+    # one rule per line keeps the file readable and its diffs small
+    head = [f"  {json.dumps(k)}: {json.dumps(v, ensure_ascii=False)}" for k, v in data.items() if k != "rules"]
+    rules = ",\n".join("    " + json.dumps(r, ensure_ascii=False) for r in data.get("rules", []))
+    return "{\n" + ",\n".join(head + [f'  "rules": [\n{rules}\n  ]']) + "\n}\n"
+
+
+def _load_texts(chunks_path: Path) -> Iterable[str]:
+    with open(chunks_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line).get("text") or ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add acronym expansions mined from chunks.jsonl to the rules file.")
+    parser.add_argument("--chunks", default=str(Path("data_processed") / "chunks.jsonl"))
+    parser.add_argument("--rules", default=str(EXPANSIONS_PATH))
+    parser.add_argument("--min-count", type=int, default=MIN_COUNT, help="Definitions needed per acronym")
+    parser.add_argument("--weight", type=float, default=MINED_WEIGHT)
+    parser.add_argument("--dry-run", action="store_true", help="Print the mined rules instead of writing them")
+    args = parser.parse_args()
+
+    path = Path(args.rules)
+    existing = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+    acronyms = mine_acronyms(_load_texts(Path(args.chunks)), min_count=args.min_count)
+    mined = acronym_rules(acronyms, weight=args.weight, exclude=existing.get("mined_exclude", ()))
+    if args.dry_run:
+        for r in mined:
+            print(f"{r['match']:<40} -> {', '.join(r['expand'])}")
+        return
+
+    merged, n = merge_rules(existing, mined)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(dump_rules(merged), encoding="utf-8")
+    print(f"✅ Wrote: {path} ({len(acronyms)} acronyms, {n} mined rules, {len(merged['rules'])} total)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#Local mock of the Ollama HTTP API (for load tests / benchmarks without a model)
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+
+from .tracing import approx_tokens
+
+CITATION_RE = re.compile(r"\[([^\]\n]+)\]")
+
+
+class MockConfig:
+    """
+    Simulated model timings. A generation costs
+    load (first request, or after `keep_alive` expires) + prompt_tokens / prompt_tps + output_tokens / tps.
+    `parallel` generations run at once (Ollama's OLLAMA_NUM_PARALLEL); the rest wait.
+    """
+
+    def __init__(self, tps: float = 20.0, prompt_tps: float = 300.0, load_s: float = 2.0,
+                 num_predict: int = 60, jitter: float = 0.1, parallel: int = 1,
+                 fail_rate: float = 0.0, fail_first: int = 0, time_scale: float = 1.0):
+        self.tps = tps
+        self.prompt_tps = prompt_tps
+        self.load_s = load_s
+        self.num_predict = num_predict
+        self.jitter = jitter
+        self.parallel = max(1, parallel)
+        self.fail_rate = fail_rate      # fraction of requests answered with 503
+        self.fail_first = fail_first    # the first N requests get 503 (retry tests)
+        self.time_scale = time_scale    # multiply all sleeps (0 = instant, timings still reported)
+
+
+class MockState:
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.slots = threading.Semaphore(config.parallel)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.loaded_until = 0.0
+
+
+def _mock_answer(prompt: str, n_tokens: int) -> str:
+    # cite the first context anchor so downstream citation handling sees something realistic
+    m = CITATION_RE.search(prompt)
+    out = [f"[{m.group(1)}]"] if m else []
+    words = "This is a mock answer generated for load testing only.".split()
+    while len(out) < max(n_tokens, 1):
+        out.extend(words)
+    return " ".join(out[:max(n_tokens, 1)])
+
+
+def _keep_alive_s(value) -> float:
+    if value is None:
+        return 300.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    m = re.fullmatch(r"(-?\d+(?:\.\d+)?)\s*([smh]?)", str(value).strip())
+    if not m:
+        return 300.0
+    return float(m.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600}[m.group(2)]
+
+
+def generate(state: MockState, body: dict) -> Tuple[int, dict]:
+    cfg = state.config
+    with state.lock:
+        state.requests += 1
+        n = state.requests
+    if n <= cfg.fail_first or (cfg.fail_rate and random.random() < cfg.fail_rate):
+        return 503, {"error": "mock overloaded"}
+
+    prompt = body.get("prompt") or ""
+    options = body.get("options") or {}
+    prompt_tokens = approx_tokens(prompt)
+    out_tokens = int(options.get("num_predict") or cfg.num_predict)
+
+    with state.slots:
+        t_start = time.perf_counter()
+        now = time.monotonic()
+        with state.lock:
+            load_s = cfg.load_s if now > state.loaded_until else 0.0
+        prompt_s = prompt_tokens / cfg.prompt_tps
+        eval_s = out_tokens / cfg.tps
+        j = 1.0 + random.uniform(-cfg.jitter, cfg.jitter) if cfg.jitter else 1.0
+        load_s, prompt_s, eval_s = load_s * j, prompt_s * j, eval_s * j
+        if cfg.time_scale > 0:
+            time.sleep((load_s + prompt_s + eval_s) * cfg.time_scale)
+        with state.lock:
+            keep = _keep_alive_s(body.get("keep_alive"))
+            state.loaded_until = time.monotonic() + keep if keep >= 0 else float("inf")
+    total_s = time.perf_counter() - t_start if cfg.time_scale > 0 else load_s + prompt_s + eval_s
+
+    ns = 1_000_000_000
+    return 200, {
+        "model": body.get("model", "mock"),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "response": _mock_answer(prompt, out_tokens),
+        "done": True,
+        "total_duration": int(total_s * ns),
+        "load_duration": int(load_s * ns),
+        "prompt_eval_count": prompt_tokens,
+        "prompt_eval_duration": int(prompt_s * ns),
+        "eval_count": out_tokens,
+        "eval_duration": int(eval_s * ns),
+    }
+
+
+def make_handler(state: MockState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real server
+
+        def _send(self, status: int, obj: dict) -> None:
+            data = json.dumps(obj).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/api/tags":
+                self._send(200, {"models": [{"name": "mock", "model": "mock"}]})
+            elif self.path == "/api/version":
+                self._send(200, {"version": "mock"})
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._send(400, {"error": "invalid JSON"})
+                return
+            if self.path != "/api/generate":
+                self._send(404, {"error": "not found"})
+                return
+            self._send(*generate(state, body))
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+def start_mock_server(host: str = "127.0.0.1", port: int = 0,
+                      config: Optional[MockConfig] = None) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Serve in a daemon thread; returns (server, base_url). Call server.shutdown() then server.server_close() to stop.
+    """
+    state = MockState(config or MockConfig())
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Ollama server with configurable latency and token rate.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--tps", type=float, default=20.0, help="Generated tokens per second")
+    parser.add_argument("--prompt-tps", type=float, default=300.0, help="Prompt tokens evaluated per second")
+    parser.add_argument("--load-s", type=float, default=2.0, help="Model load time when not kept alive")
+    parser.add_argument("--num-predict", type=int, default=60, help="Output tokens when the request sets none")
+    parser.add_argument("--parallel", type=int, default=1, help="Concurrent generations (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = MockConfig(tps=args.tps, prompt_tps=args.prompt_tps, load_s=args.load_s,
+                        num_predict=args.num_predict, jitter=args.jitter, parallel=args.parallel,
+                        fail_rate=args.fail_rate)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(MockState(config)))
+    server.daemon_threads = True
+    print(f"mock Ollama on http://{args.host}:{args.port} (set OLLAMA_URL to use it)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#PDF text-layer audit: parallel, stops reading a PDF once it has enough text
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+PAGES_TO_CHECK = 10
+MIN_CHARS_THRESHOLD = 200
+
+AUDIT_MANIFEST = Path("data_processed") / "pdf_audit.json"
+
+
+def audit_pdf(pdf_path: str, pages_to_check: int = PAGES_TO_CHECK,
+              min_chars: int = MIN_CHARS_THRESHOLD) -> Dict[str, Any]:
+    """
+    Extract the first pages of one PDF until `min_chars` characters are found (or
+    `pages_to_check` pages were read). Scanned PDFs without a text layer come out NEEDS_OCR.
+    """
+    from .ingest import file_sha256
+
+    p = Path(pdf_path)
+    st = p.stat()
+    row: Dict[str, Any] = {
+        "pdf": p.name,
+        "sha256": file_sha256(p),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "pages": 0,
+        "pages_checked": 0,
+        "chars_checked": 0,
+        "chars_per_page": [],
+        "status": "ERROR",
+        "error": "",
+    }
+    t0 = time.perf_counter()
+    try:
+        import pdfplumber
+        with pdfplumber.open(p) as pdf:
+            row["pages"] = len(pdf.pages)
+            for page in pdf.pages[:pages_to_check]:
+                n = len(page.extract_text() or "")
+                page.close()
+                row["chars_per_page"].append(n)
+                row["chars_checked"] += n
+                if row["chars_checked"] >= min_chars:
+                    break
+        row["pages_checked"] = len(row["chars_per_page"])
+        row["status"] = "OK" if row["chars_checked"] >= min_chars else "NEEDS_OCR"
+    except Exception as e:
+        row["error"] = str(e)
+    row["seconds"] = round(time.perf_counter() - t0, 4)
+    return row
+
+
+def run_audit(pdfs: List[Path], workers: int = 0, pages_to_check: int = PAGES_TO_CHECK,
+              min_chars: int = MIN_CHARS_THRESHOLD, previous: Optional[Dict[str, Dict[str, Any]]] = None
+              ) -> List[Dict[str, Any]]:
+    """
+    Audit rows in `pdfs` order. PDFs whose size and mtime match `previous` are not re-opened.
+    """
+    previous = previous or {}
+    rows: Dict[str, Dict[str, Any]] = {}
+    todo: List[str] = []
+    for p in pdfs:
+        prev = previous.get(p.name)
+        st = p.stat()
+        if prev and prev.get("size") == st.st_size and prev.get("mtime_ns") == st.st_mtime_ns:
+            rows[p.name] = prev
+        else:
+            todo.append(str(p))
+
+    workers = workers or os.cpu_count() or 1
+    n = len(todo)
+    if workers > 1 and n > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, n)) as pool:
+            fresh = list(pool.map(audit_pdf, todo, [pages_to_check] * n, [min_chars] * n))
+    else:
+        fresh = [audit_pdf(p, pages_to_check, min_chars) for p in todo]
+    for r in fresh:
+        rows[r["pdf"]] = r
+    return [rows[p.name] for p in pdfs]
+
+
+def load_audit(path: Path) -> Dict[str, Dict[str, Any]]:
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_audit(rows: List[Dict[str, Any]], path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({r["pdf"]: r for r in rows}, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def audit_entry(audit: Dict[str, Dict[str, Any]], pdf: Path, sha256: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    The audit row for `pdf` if it still describes the file on disk (same hash, or same size + mtime).
+    """
+    row = audit.get(pdf.name)
+    if row is None:
+        return None
+    if sha256 is not None:
+        return row if row.get("sha256") == sha256 else None
+    st = pdf.stat()
+    return row if row.get("size") == st.st_size and row.get("mtime_ns") == st.st_mtime_ns else None
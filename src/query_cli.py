@@ -1,7 +1,7 @@
 import argparse
-import re
 from pathlib import Path
 from .answer import answer_with_citations
+from .junk import is_junk_chunk
 from .retrieve import build_retriever  # TF-IDF
 from .bm25 import build_bm25_retriever  # BM25
 
@@ -28,9 +28,9 @@ def main():
 
 # Choosing the retriever
     if args.retriever == "bm25":
-        r = build_bm25_retriever(args.chunks)
+        r = build_bm25_retriever(args.chunks, exclude_junk=True)
     else:
-        r = build_retriever(args.chunks)
+        r = build_retriever(args.chunks, exclude_junk=True)
 
     if args.query:
         q = args.query.strip() #Stripping the query
@@ -41,7 +41,7 @@ def main():
         filtered_hits = [h for h in hits if not is_junk_chunk(h)]
         print("DEBUG: filtered hits =", len(filtered_hits))
 
-        out = answer_with_citations(q, filtered_hits, max_sentences=3)
+        out = answer_with_citations(q, filtered_hits, max_sentences=3, sentence_store=r.sentences)
         print_result(q, hits, out)   
         return
 
@@ -63,31 +63,8 @@ def main():
         filtered_hits = [h for h in hits if not is_junk_chunk(h)]
         print("DEBUG: filtered hits =", len(filtered_hits))
 
-        out = answer_with_citations(q, filtered_hits, max_sentences=3)
+        out = answer_with_citations(q, filtered_hits, max_sentences=3, sentence_store=r.sentences)
         print_result(q, hits, out)   
  
-def is_junk_chunk(h) -> bool:
-    t = (h.get("text") or "").lower()
-    head = t[:600]  # κοιτάμε μόνο την αρχή
-
-    # obvious index/contents markers
-    if "contents" in head or "index" in head:
-        return True
-
-    # "Summary of ..." / appendix index pages
-    if "summary of" in head and "guidelines" in head:
-        return True
-
-    # looks like index: tons of commas in a long block
-    if t.count(",") > 25 and len(t) > 800:
-        return True
-
-    # lots of page/section artifacts: many "A-5", "2-21", etc.
-    # (simple proxy: many hyphen-digit patterns)
-    if len(re.findall(r"\b[A-Z]?\d+\-\d+\b", head)) >= 8:
-        return True
-
-    return False
-
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -2,64 +2,175 @@
 
 The goal is not "semantic" rewriting, but to reduce brittleness in technical
 manual queries (e.g., AC voltage vs input voltage, environmental conditions).
+
+Expansion rules live in a data file (see `EXPANSIONS_PATH`) and are compiled
+into one token-level Aho-Corasick automaton, so matching costs one pass over
+the query however many rules there are. Expansions carry a weight below 1.0
+that the retrievers apply when scoring.
 """
 
 from __future__ import annotations
 
+import json
+import os
 import re
-from typing import Dict, List, Tuple
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
 
 
 _WS_RE = re.compile(r"\s+")
+_TOKEN_RE = re.compile(r"[a-zα-ω0-9]+", re.UNICODE)
+
+# applied to the lowercased query in one pass (longest match first)
+_REPLACEMENTS: Dict[str, str] = {
+    "a/c": "ac",
+    "a.c.": "ac",
+    "a.c": "ac",
+    "v~": "vac",
+    "v⎓": "vdc",
+}
+_REPLACE_RE = re.compile("|".join(re.escape(k) for k in sorted(_REPLACEMENTS, key=len, reverse=True)))
+
+EXPANSIONS_PATH = Path(os.getenv(
+    "RAG_EXPANSIONS", str(Path(__file__).resolve().parents[1] / "data_processed" / "query_expansions.json")))
+# weight of an expansion term relative to a term the user typed (rules may override it)
+EXPANSION_WEIGHT = float(os.getenv("RAG_EXPANSION_WEIGHT", "0.7"))
 
 
 def _normalize_text(s: str) -> str:
-    s = (s or "").strip()
-    s = s.replace("a/c", "ac")
-    s = s.replace("a.c.", "ac")
-    s = s.replace("a.c", "ac")
-    s = s.replace("v~", "vac")
-    s = s.replace("v⎓", "vdc")
+    # retrievers lowercase anyway; doing it first also catches "A/C", "A.C."
+    s = (s or "").strip().lower()
+    s = _REPLACE_RE.sub(lambda m: _REPLACEMENTS[m.group(0)], s)
     # collapse whitespace
     s = _WS_RE.sub(" ", s)
     return s
 
 
-# Pairs of (pattern, expansions).
-# If pattern is found (case-insensitive) in the normalized query, append expansions.
-_EXPANSIONS: List[Tuple[re.Pattern, List[str]]] = [
-    (re.compile(r"\bac\s+voltage\b", re.I), ["input voltage", "vac"]),
-    (re.compile(r"\binput\s+voltage\b", re.I), ["ac voltage", "vac"]),
-    (re.compile(r"\bfrequency\b", re.I), ["hz", "operating frequency"]),
-    (re.compile(r"\benvironmental\s+conditions\b", re.I), ["temperature", "humidity", "operating environment"]),
-]
+class ExpansionMatcher:
+    """
+    Aho-Corasick automaton over query tokens: every rule phrase occurring in the
+    query is found in a single left-to-right pass, independent of the rule count.
+    """
 
+    def __init__(self, rules: Iterable[Tuple[str, List[str], float]]):
+        # node 0 is the root; goto[node][token] -> node
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # node -> rule ids ending there (own + inherited through fail links)
+        self._out: List[List[int]] = [[]]
+        self.phrases: List[str] = []
+        self.expansions: List[List[Tuple[str, float]]] = []
 
-def normalize_and_expand_query(query: str) -> str:
-    """Return a normalized query with a few safe expansions appended.
+        for phrase, expand, weight in rules:
+            tokens = _TOKEN_RE.findall(phrase.lower())
+            if not tokens:
+                continue
+            node = 0
+            for t in tokens:
+                nxt = self._goto[node].get(t)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][t] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append(len(self.phrases))
+            self.phrases.append(" ".join(tokens))
+            self.expansions.append([(e.lower(), weight) for e in expand])
 
-    This intentionally stays conservative so it doesn't drift away from
-    the user's intent.
+        # breadth-first fail links
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for t, child in self._goto[node].items():
+                f = self._fail[node]
+                while f and t not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[child] = self._goto[f].get(t, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+                queue.append(child)
+
+    def __len__(self) -> int:
+        return len(self.phrases)
+
+    def match(self, tokens: List[str]) -> List[int]:
+        """
+        Ids of the rules whose phrase occurs in `tokens`, in order of where they end.
+        """
+        found: List[int] = []
+        node = 0
+        for t in tokens:
+            while node and t not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(t, 0)
+            found.extend(self._out[node])
+        return found
+
+    def expand(self, text: str) -> List[Tuple[str, float]]:
+        """
+        (expansion phrase, weight) for normalized `text`, de-duplicated in match order.
+        Phrases that are themselves present in the query are not added again.
+        """
+        matched = self.match(_TOKEN_RE.findall(text))
+        present = {self.phrases[i] for i in matched}
+        seen = set()
+        out: List[Tuple[str, float]] = []
+        for i in matched:
+            for exp, weight in self.expansions[i]:
+                if exp in seen or exp in present:
+                    continue
+                seen.add(exp)
+                out.append((exp, weight))
+        return out
+
+
+def load_expansion_rules(path: Path = EXPANSIONS_PATH) -> List[Tuple[str, List[str], float]]:
+    """
+    (phrase, expansions, weight) rules from the JSON file:
+    {"rules": [{"match": "ac voltage", "expand": ["input voltage", "vac"], "weight": 0.7}, ...]}
+    A rule without "weight" gets the file's "default_weight", else EXPANSION_WEIGHT.
+    """
+    if not path.exists():
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    default = float(data.get("default_weight", EXPANSION_WEIGHT))
+    return [(r["match"], list(r["expand"]), float(r.get("weight", default))) for r in data.get("rules", [])]
+
+
+@lru_cache(maxsize=1)
+def get_matcher() -> ExpansionMatcher:
+    return ExpansionMatcher(load_expansion_rules())
+
+
+@dataclass(frozen=True)
+class ExpandedQuery:
+    text: str                                   # normalized query as typed
+    expansions: Tuple[Tuple[str, float], ...]   # (phrase, weight) added by the rules
+
+    def full_text(self) -> str:
+        return " ".join([self.text] + [e for e, _ in self.expansions]).strip()
+
+
+def expand_query(query: str, matcher: Optional[ExpansionMatcher] = None) -> ExpandedQuery:
+    """
+    Normalized query plus its weighted expansions.
     """
     q = _normalize_text(query)
     if not q:
-        return q
+        return ExpandedQuery(q, ())
+    matcher = matcher if matcher is not None else get_matcher()
+    return ExpandedQuery(q, tuple(matcher.expand(q)))
 
-    additions: List[str] = []
-    for pat, exps in _EXPANSIONS:
-        if pat.search(q):
-            additions.extend(exps)
 
-    if additions:
-        # de-dup while preserving order
-        seen = set()
-        deduped = []
-        for a in additions:
-            key = a.lower()
-            if key in seen:
-                continue
-            seen.add(key)
-            deduped.append(a)
-        q = f"{q} {' '.join(deduped)}"
+def normalize_and_expand_query(query: str) -> str:
+    """Return a normalized query with a few safe expansions appended.
 
-    return _WS_RE.sub(" ", q).strip()
+    This intentionally stays conservative so it doesn't drift away from
+    the user's intent. Use `expand_query` to keep the expansion weights.
+    """
+    return _WS_RE.sub(" ", expand_query(query).full_text()).strip()
@@ -0,0 +1,328 @@
+#CPU reranker: cheap lexical features over a larger candidate pool, within a time budget
+import time
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .answer import SentenceStore, is_fact_question, is_headingish, sentences_for, tokens
+from .bm25 import query_terms
+from .chunk_table import ChunkTable
+from .query_utils import expand_query
+from .retrieve import query_vector
+from .tracing import current_trace
+
+FEATURES = ("bm25", "tfidf", "coverage", "proximity", "phrase", "heading", "fact")
+
+# tuned on eval/eval_questions.jsonl (see scripts/bench_rerank.py)
+DEFAULT_WEIGHTS = {
+    "bm25": 1.0,
+    "tfidf": 0.5,
+    "coverage": 1.0,
+    "proximity": 1.0,
+    "phrase": 0.3,
+    "heading": 0.2,
+    "fact": 1.0,
+}
+
+
+def _heading_tokens(text: str) -> set:
+    head = set()
+    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+    for i, ln in enumerate(lines):
+        if i == 0 or is_headingish(ln):
+            head.update(tokens(ln))
+    return head
+
+
+class _DocView:
+    """
+    Token sequence and heading tokens of a hit the lexical index doesn't have, for one request.
+    """
+
+    __slots__ = ("words", "heading")
+
+    def __init__(self, text: str):
+        self.words = tokens(text)
+        self.heading = frozenset(_heading_tokens(text))
+
+
+def _csr(values: array, dtype) -> np.ndarray:
+    return np.frombuffer(values, dtype=dtype) if len(values) else np.zeros(0, dtype=dtype)
+
+
+def _row_counts(ptr: np.ndarray, ids: np.ndarray, rows: np.ndarray, q_ids: np.ndarray) -> np.ndarray:
+    """
+    For each of `rows`: how many of ids[ptr[row]:ptr[row+1]] are in `q_ids`.
+    """
+    lo = ptr[rows]
+    n = ptr[rows + 1] - lo
+    offs = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(n, out=offs[1:])
+    found = np.isin(ids[np.arange(offs[-1]) - np.repeat(offs[:-1] - lo, n)], q_ids)
+    hit = np.zeros(len(found) + 1, dtype=np.int64)
+    np.cumsum(found, out=hit[1:])
+    return hit[offs[1:]] - hit[offs[:-1]]
+
+
+def _bigram(a: int, b: int) -> int:
+    return (a << 32) | b
+
+
+class _LexicalIndex:
+    """
+    Per chunk, the sorted ids of its tokens, of its heading tokens and of its token bigrams
+    (CSR arrays, as in SentenceStore), so the coverage, heading and phrase features of a whole
+    candidate pool are a few array operations, plus its token ids in text order for proximity.
+    With a sentence store, its vocab and chunk term lists are reused.
+    """
+
+    def __init__(self, chunks, sentence_store: Optional[SentenceStore] = None):
+        store = sentence_store
+        self.chunks = store.chunks if store is not None else ChunkTable.of(chunks)
+        vocab: Dict[str, int] = {} if store is None else dict(zip(store.vocab, range(len(store.vocab))))
+        terms, term_ptr = array("i"), array("q", [0])
+        heads, head_ptr = array("i"), array("q", [0])
+        pairs, pair_ptr = array("q"), array("q", [0])
+        seq, seq_ptr = array("i"), array("q", [0])
+        for text in self.chunks.texts:
+            ids = [vocab.setdefault(w, len(vocab)) for w in tokens(text)]
+            seq.extend(ids)
+            seq_ptr.append(len(seq))
+            if store is None:
+                terms.extend(sorted(set(ids)))
+                term_ptr.append(len(terms))
+            heads.extend(sorted({vocab.setdefault(w, len(vocab)) for w in _heading_tokens(text)}))
+            head_ptr.append(len(heads))
+            pairs.extend(sorted({_bigram(a, b) for a, b in zip(ids, ids[1:])}))
+            pair_ptr.append(len(pairs))
+
+        self.vocab = vocab
+        if store is None:
+            self.term_ptr, self.term_ids = _csr(term_ptr, np.int64), _csr(terms, np.int32)
+        else:
+            self.term_ptr, self.term_ids = store.chunk_term, store.chunk_terms
+        self.head_ptr, self.head_ids = _csr(head_ptr, np.int64), _csr(heads, np.int32)
+        self.pair_ptr, self.pair_ids = _csr(pair_ptr, np.int64), _csr(pairs, np.int64)
+        self.seq_ptr, self.seq_ids = _csr(seq_ptr, np.int64), _csr(seq, np.int32)
+
+    def query_ids(self, q_words: List[str]) -> np.ndarray:
+        return np.array(sorted({self.vocab[w] for w in set(q_words) if w in self.vocab}), dtype=np.int32)
+
+    def matches(self, rows: np.ndarray, q_words: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        For chunks `rows`: how many distinct query tokens each contains, how many of them are
+        in its headings, and how many distinct query bigrams it contains.
+        """
+        q_ids = self.query_ids(q_words)
+        present = _row_counts(self.term_ptr, self.term_ids, rows, q_ids)
+        heading = _row_counts(self.head_ptr, self.head_ids, rows, q_ids)
+        known = {_bigram(self.vocab[a], self.vocab[b]) for a, b in zip(q_words, q_words[1:])
+                 if a in self.vocab and b in self.vocab}
+        phrase = np.zeros(len(rows), dtype=np.int64)
+        if known:
+            phrase = _row_counts(self.pair_ptr, self.pair_ids, rows, np.array(sorted(known), dtype=np.int64))
+        return present, heading, phrase
+
+    def min_cover(self, row: int, q_ids: np.ndarray) -> int:
+        """
+        _min_cover of chunk `row` over the query tokens it contains, from its token id sequence.
+        """
+        seq = self.seq_ids[self.seq_ptr[row]:self.seq_ptr[row + 1]]
+        where = np.flatnonzero(np.isin(seq, q_ids))
+        words = seq[where].tolist()
+        return _min_cover(words, set(words), where.tolist())
+
+
+def _min_cover(words: Sequence, terms: set, positions: Optional[List[int]] = None) -> int:
+    """
+    Length of the shortest window of `words` containing every term of `terms` (0 if impossible).
+    `positions` (when `words` only keeps some tokens of the text) are their places in the text.
+    """
+    need = len(terms)
+    if need == 0:
+        return 0
+    counts: Dict[str, int] = {}
+    have = 0
+    best = 0
+    lo = 0
+    for hi, w in enumerate(words):
+        if w not in terms:
+            continue
+        counts[w] = counts.get(w, 0) + 1
+        if counts[w] == 1:
+            have += 1
+        while have == need:
+            while words[lo] not in terms:
+                lo += 1
+            span = (positions[hi] - positions[lo] if positions is not None else hi - lo) + 1
+            if not best or span < best:
+                best = span
+            counts[words[lo]] -= 1
+            if counts[words[lo]] == 0:
+                have -= 1
+            lo += 1
+    return best
+
+
+def _positions(chunks, ids: Sequence[str]) -> np.ndarray:
+    # index of each chunk id in a retriever's ChunkTable, -1 when it isn't there
+    pos = (chunks.index_of(cid) for cid in ids)
+    return np.array([-1 if p is None else p for p in pos], dtype=np.int64)
+
+
+class Reranker:
+    """
+    Rescores a candidate pool with BM25 + TF-IDF scores and lexical features
+    (query-term coverage, proximity, bigram phrase matches, heading matches, fact signals),
+    combined linearly. `bm25` / `tfidf` are retrievers over the same chunks (either may be None).
+
+    Everything but proximity and fact signals is computed for the whole pool at once, from
+    per-chunk term lists built with the reranker. Those two are computed in rank order until
+    the deadline; candidates not reached keep their retrieval order after the rescored ones.
+    """
+
+    def __init__(self, bm25=None, tfidf=None, weights: Optional[Dict[str, float]] = None,
+                 sentence_store: Optional[SentenceStore] = None):
+        self.bm25 = bm25
+        self.tfidf = tfidf
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.w = np.array([self.weights[f] for f in FEATURES], dtype=np.float64)
+        self.sentence_store = sentence_store
+        source = bm25 if bm25 is not None else tfidf
+        self.lexical = None
+        if sentence_store is not None or source is not None:
+            self.lexical = _LexicalIndex(source.chunks if source is not None else None, sentence_store)
+
+    def _bm25_scores(self, query: str, ids: Sequence[str]) -> np.ndarray:
+        out = np.zeros(len(ids))
+        pos = _positions(self.bm25.chunks, ids)
+        ok = pos >= 0
+        q_terms, weights = query_terms(query)
+        if not ok.any() or not q_terms:
+            return out
+        allowed = np.zeros(self.bm25.N, dtype=bool)
+        allowed[pos[ok]] = True
+        cand, scores = self.bm25.score_terms(q_terms, allowed=allowed, weights=weights)
+        full = np.zeros(self.bm25.N)
+        full[cand] = scores
+        out[ok] = full[pos[ok]]
+        return out
+
+    def _tfidf_scores(self, query: str, ids: Sequence[str]) -> np.ndarray:
+        out = np.zeros(len(ids))
+        pos = _positions(self.tfidf.chunks, ids)
+        ok = pos >= 0
+        eq = expand_query(query)
+        if not ok.any() or not eq.text:
+            return out
+        qv = query_vector(self.tfidf.vectorizer, eq)
+        out[ok] = (self.tfidf.matrix[pos[ok]] @ qv.T).toarray().ravel()
+        return out
+
+    def features(self, query: str, hits: List[Dict], deadline: Optional[float] = None) -> Tuple[np.ndarray, int]:
+        """
+        (len(hits) x len(FEATURES) matrix, number of hits fully featurized before `deadline`).
+        """
+        n = len(hits)
+        X = np.zeros((n, len(FEATURES)))
+        if n == 0:
+            return X, 0
+        ids = [h["chunk_id"] for h in hits]
+
+        def late() -> bool:
+            return deadline is not None and time.perf_counter() > deadline
+
+        # retrieval scores: one vectorized pass each, max-normalized over the pool
+        if late():
+            return X, 0
+        if self.bm25 is not None:
+            X[:, 0] = self._bm25_scores(query, ids)
+        elif hits and "score" in hits[0]:
+            X[:, 0] = [h.get("score", 0.0) for h in hits]
+        if late():
+            return X, 0
+        if self.tfidf is not None:
+            X[:, 1] = self._tfidf_scores(query, ids)
+        for j in (0, 1):
+            m = X[:, j].max()
+            if m > 0:
+                X[:, j] /= m
+
+        q_words = tokens(query)
+        q_set = set(q_words)
+        bigrams = set(zip(q_words, q_words[1:]))
+        fact_mode = is_fact_question(query)
+        if not q_set:
+            return X, n
+
+        # query tokens present, heading and phrase matches for every indexed candidate at once
+        present = np.zeros(n, dtype=np.int64)
+        pos = _positions(self.lexical.chunks, ids) if self.lexical is not None else np.full(n, -1)
+        indexed = pos >= 0
+        if indexed.any():
+            if late():
+                return X, 0
+            q_ids = self.lexical.query_ids(q_words)
+            present[indexed], heading, phrase = self.lexical.matches(pos[indexed], q_words)
+            X[indexed, 5] = heading / len(q_set)
+            if bigrams:
+                X[indexed, 4] = phrase / len(bigrams)
+        X[:, 2] = present / len(q_set)
+
+        done = 0
+        for i, h in enumerate(hits):
+            if late():
+                break
+            d = None
+            if not indexed[i]:
+                # not in the index (another corpus): the lexical features from the hit's text
+                d = _DocView(h.get("text") or "")
+                present[i] = len(q_set.intersection(d.words))
+                X[i, 2] = present[i] / len(q_set)
+                if bigrams:
+                    X[i, 4] = len(bigrams.intersection(zip(d.words, d.words[1:]))) / len(bigrams)
+                X[i, 5] = len(q_set.intersection(d.heading)) / len(q_set)
+            if present[i] > 1:
+                if d is None:
+                    X[i, 3] = present[i] / self.lexical.min_cover(int(pos[i]), q_ids)
+                else:
+                    X[i, 3] = present[i] / _min_cover(d.words, q_set.intersection(d.words))
+            elif present[i]:
+                X[i, 3] = 1.0 / len(q_set)
+            if fact_mode:
+                store, ci = sentences_for(h, self.sentence_store)
+                overlaps = store.overlaps(ci, store.query_ids(q_set))
+                facts = store.fact[store.chunk_sent[ci]:store.chunk_sent[ci + 1]]
+                best = int(facts[overlaps > 0].max()) if overlaps.any() else 0
+                X[i, 6] = min(best, 9) / 9.0
+            done += 1
+        return X, done
+
+    def rerank(self, query: str, hits: List[Dict], top_k: int = 10,
+               budget_s: Optional[float] = None) -> List[Dict]:
+        """
+        Best `top_k` of `hits` by the combined score; each returned hit gets "rerank_score".
+        """
+        t0 = time.perf_counter()
+        deadline = t0 + budget_s if budget_s is not None else None
+        X, done = self.features(query, hits, deadline)
+        scores = X[:done] @ self.w
+
+        order = sorted(range(done), key=lambda i: -scores[i])  # stable: ties keep retrieval order
+        out = []
+        for i in order[:top_k]:
+            h = dict(hits[i])
+            h["rerank_score"] = float(scores[i])
+            out.append(h)
+        out.extend(hits[done:done + max(top_k - len(out), 0)])
+
+        trace = current_trace()
+        if trace is not None:
+            trace.set("rerank", {
+                "pool": len(hits),
+                "rescored": done,
+                "complete": done == len(hits),
+                "ms": round((time.perf_counter() - t0) * 1000, 3),
+            })
+        return out
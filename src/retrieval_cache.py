@@ -0,0 +1,105 @@
+#Retrieval result cache (bounded LRU in front of any retriever)
+import hashlib
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Tuple
+
+from .metrics import CACHE_REQUESTS
+from .tracing import current_trace
+
+
+def index_version(chunks, *params) -> str:
+    """
+    Content fingerprint of an index: chunk ids + texts + build parameters.
+    Any change to the indexed chunks produces a new version.
+    """
+    h = hashlib.sha1(repr(params).encode("utf-8"))
+    for ch in chunks:
+        h.update(ch.chunk_id.encode("utf-8"))
+        h.update(b"\x00")
+        h.update(ch.text.encode("utf-8"))
+        h.update(b"\x01")
+    return h.hexdigest()[:16]
+
+
+class CachedRetriever:
+    """
+    Wraps a retriever exposing `search_ids`, `hits_from_ids`, `query_key` and `index_version`.
+
+    Results are keyed by (retriever name, top_k, post-normalization query key),
+    so spacing/case/"a/c" variants of a query share one entry.
+    Entries are (doc indexes, scores) arrays; hit dicts are rebuilt from the index on
+    every lookup, so the cache holds no copies of chunk texts.
+    The whole cache is dropped as soon as the wrapped index version changes.
+    """
+
+    def __init__(self, retriever, name: str, max_entries: int = 1024):
+        self.retriever = retriever
+        self.name = name
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, int, Hashable], Tuple[array, array]]" = OrderedDict()
+        self._version = getattr(retriever, "index_version", None)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __getattr__(self, attr):
+        # delegate everything else (chunks, vectorizer, ...) to the wrapped retriever
+        return getattr(self.retriever, attr)
+
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        key = (self.name, top_k, self.retriever.query_key(query))
+        version = getattr(self.retriever, "index_version", None)
+        trace = current_trace()
+
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            cached = self._entries.get(key)
+            if cached is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if cached is not None:
+            CACHE_REQUESTS.inc(cache="retrieval", result="hit")
+            if trace is not None:
+                trace.set("retrieval_cache", "hit")
+            return self.retriever.hits_from_ids(*cached)
+        CACHE_REQUESTS.inc(cache="retrieval", result="miss")
+        if trace is not None:
+            trace.set("retrieval_cache", "miss")
+
+        idxs, scores = self.retriever.search_ids(query, top_k=top_k)
+
+        with self._lock:
+            if version == self._version:
+                self._entries[key] = (array("i", idxs), array("d", scores))
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return self.retriever.hits_from_ids(idxs, scores)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            # entries only hold index positions and scores; hit texts stay in the index's buffers
+            approx_bytes = sys.getsizeof(self._entries)
+            for key, (idxs, scores) in self._entries.items():
+                approx_bytes += sys.getsizeof(key) + sys.getsizeof(idxs) + sys.getsizeof(scores)
+            return {
+                "retriever": self.name,
+                "index_version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "entries": len(self._entries),
+                "approx_bytes": approx_bytes,
+            }
@@ -0,0 +1,145 @@
+#Process-pool retrieval workers sharing one fork-inherited index
+import multiprocessing as mp
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Tuple
+
+from .metrics import STAGE_SECONDS
+from .tracing import current_trace, start_trace
+
+# Indexes registered here before the pool forks are inherited copy-on-write by every worker.
+_SHARED: Dict[str, Any] = {}
+
+
+def fork_available() -> bool:
+    return "fork" in mp.get_all_start_methods()
+
+
+def _search_ids(name: str, query: str, top_k: int) -> Tuple[array, array, List[Dict[str, Any]], Dict[str, Any]]:
+    # runs in a worker process; ship back compact typed arrays instead of hit dicts, plus the
+    # stage timings and plan stats: metrics recorded here never reach the parent's /metrics
+    with start_trace() as trace:
+        idxs, scores, stats = _SHARED[name].search_ids_stats(query, top_k=top_k)
+    return array("i", idxs), array("d", scores), trace.stages, stats
+
+
+def _ping(name: str) -> int:
+    return len(_SHARED[name].chunks)
+
+
+class PooledRetriever:
+    """
+    Dispatches `search` to a pool of forked worker processes so concurrent queries
+    are not serialized on the GIL. Workers only compute (doc index, score) arrays;
+    hits (with text) are assembled in the parent from its own copy of the chunks.
+
+    Requires the "fork" start method (Linux/macOS). start() may run while other threads
+    hold locks (an index refresh forks from a request thread), so every lock a worker's
+    search takes must be re-created after fork (metrics does this with os.register_at_fork).
+    Callers that build several pools at startup can pass start=False, gc.freeze() once,
+    then start() each.
+    """
+
+    def __init__(self, retriever, name: str, workers: int = 2, start: bool = True):
+        if not fork_available():
+            raise RuntimeError("PooledRetriever needs the 'fork' start method (not available on this platform).")
+        self.retriever = retriever
+        self.name = name
+        self.workers = workers
+        self._pool = None
+        # searches currently in the pool; close() waits for them before shutting it down
+        self._active = 0
+        self._closing = False
+        self._lock = threading.Lock()
+        if start:
+            self.start()
+
+    def start(self) -> None:
+        _SHARED[self.name] = self.retriever
+        self._pool = self._new_pool()
+        # fork all workers now, while the index is the only thing being built
+        self._pool.submit(_ping, self.name).result()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=mp.get_context("fork"))
+
+    def __getattr__(self, attr):
+        # query_key, index_version, chunks, ... come from the wrapped retriever
+        return getattr(self.retriever, attr)
+
+    def search_ids(self, query: str, top_k: int = 5) -> Tuple[List[int], List[float]]:
+        idxs, scores = self._search_ids(query, top_k)
+        return list(idxs), list(scores)
+
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        idxs, scores = self._search_ids(query, top_k)
+        return self.retriever.hits_from_ids(idxs, scores)
+
+    def _search_ids(self, query: str, top_k: int):
+        with self._lock:
+            pool = self._pool if not self._closing else None
+            if pool is not None:
+                self._active += 1
+        if pool is None:
+            # replaced (or never started): the index is still here, search it in-process
+            return self.retriever.search_ids(query, top_k=top_k)
+        try:
+            idxs, scores, stages, stats = pool.submit(_search_ids, self.name, query, top_k).result()
+        except BrokenProcessPool:
+            # a worker died (OOM kill, segfault): later searches get a fresh pool, this one runs here
+            self._replace_broken(pool)
+            return self.retriever.search_ids(query, top_k=top_k)
+        finally:
+            self._done()
+        self._record(stages, stats)
+        return idxs, scores
+
+    def _replace_broken(self, broken: ProcessPoolExecutor) -> None:
+        with self._lock:
+            # the other searches that were in the broken pool find it already replaced; a pool
+            # that is being closed, or whose name now serves a newer index, is not restarted
+            if self._pool is not broken or self._closing or _SHARED.get(self.name) is not self.retriever:
+                return
+            # workers fork lazily, on the next submit
+            self._pool = self._new_pool()
+        print(f"retrieval pool {self.name}: a worker died, started a new pool")
+        broken.shutdown(wait=False)
+
+    def _record(self, stages: List[Dict[str, Any]], stats: Dict[str, Any]) -> None:
+        # a worker's query_expansion / scoring timings and plan stats, as an in-process search records them
+        trace = current_trace()
+        for st in stages:
+            labels = {k: v for k, v in st.items() if k not in ("stage", "ms")}
+            STAGE_SECONDS.observe(st["ms"] / 1000.0, stage=st["stage"], **labels)
+            if trace is not None:
+                trace.record_stage(st["stage"], st["ms"] / 1000.0, **labels)
+        self.retriever.record_search_stats(stats)
+
+    def _done(self) -> None:
+        with self._lock:
+            self._active -= 1
+            last = self._closing and self._active == 0
+        if last:
+            self._shutdown()
+
+    def close(self) -> None:
+        """
+        Stop the workers once the searches already in the pool have finished; later
+        searches on this object run in-process.
+        """
+        with self._lock:
+            if self._closing:
+                return
+            self._closing = True
+            idle = self._active == 0
+        if idle:
+            self._shutdown()
+
+    def _shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+        # a replacement pool under the same name may already be registered
+        if _SHARED.get(self.name) is self.retriever:
+            del _SHARED[self.name]
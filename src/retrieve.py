@@ -1,13 +1,22 @@
 #TF-IDF retriever 
 import json
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 import re
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import linear_kernel
+import numpy as np
 from nltk.stem import PorterStemmer
-from .query_utils import normalize_and_expand_query
+from sklearn.preprocessing import normalize
+from .query_utils import expand_query
+from .retrieval_cache import index_version
+from .metrics import stage
+from .tracing import current_trace
+from .junk import classify_chunks
+from .dedup import collapse_chunks
+from .answer import SentenceStore, build_sentence_store
+from .chunk_table import ChunkTable, GroupTable, StringTable
 
 stemmer = PorterStemmer()
 
@@ -21,8 +30,25 @@ class Chunk:
 
 
 class TfidfRetriever:
-    def __init__(self, chunks: List[Chunk], ngram_range=(1, 2), max_features: int = 200_000):
-        self.chunks = chunks
+    # label in metrics / traces; the API sets the registry name ("tfidf_sql", ...)
+    name = "tfidf"
+
+    def __init__(self, chunks: List[Chunk], ngram_range=(1, 2), max_features: int = 200_000,
+                 exclude_junk: bool = False, duplicates: Optional[Dict[str, List[str]]] = None,
+                 junk: Optional[Tuple[np.ndarray, Dict[int, Tuple[str, ...]]]] = None,
+                 sentences: Optional[SentenceStore] = None):
+        # texts and ids in flat buffers (chunks[i] still gives a Chunk); pass a ChunkTable to share one
+        self.chunks = chunks = ChunkTable.of(chunks)
+        # representative chunk_id -> near-duplicate chunk_ids collapsed into it (see dedup.py)
+        self.duplicates = GroupTable.of(duplicates)
+        # junk (TOC/index) bitmap computed once; skipped during top-k when exclude_junk
+        self.exclude_junk = exclude_junk
+        # `junk` / `sentences`: classify_chunks / build_sentence_store output for these chunks,
+        # passed in when several retrievers are built over one corpus (see eval.run_grid)
+        self.junk, self.junk_signals = junk if junk is not None else classify_chunks(chunks)
+        # sentence split / token sets / fact signals for the extractive answerer
+        self.sentences = sentences if sentences is not None else build_sentence_store(chunks)
+        self._clean_idx = np.flatnonzero(~self.junk)
         # Use tokenizer (not analyzer) so sklearn can apply ngram_range.
         self.vectorizer = TfidfVectorizer(
             tokenizer=stem_analyzer,
@@ -32,7 +58,12 @@ class TfidfRetriever:
             max_features=max_features,
         )
 
-        self.matrix = self.vectorizer.fit_transform([c.text for c in chunks])
+        self.matrix = self.vectorizer.fit_transform(chunks.texts)
+        # feature -> column as a StringTable instead of sklearn's dict (transform only looks terms up)
+        self.vocab = StringTable(self.vectorizer.get_feature_names_out().tolist())
+        self.vectorizer.vocabulary_ = self.vocab
+        self.index_version = index_version(chunks, "tfidf", tuple(ngram_range), max_features, exclude_junk)
+        self._feature_df = None  # per-feature posting length, computed on first traced query
 
     @staticmethod
     def load_chunks_jsonl(path: Path) -> List[Chunk]:
@@ -75,37 +106,113 @@ class TfidfRetriever:
             raise RuntimeError("No valid chunks loaded from SQL.")
         return out
 
+    def query_key(self, query: str) -> Tuple[str, ...]:
+        """
+        Stemmed token sequences of the query and of each weighted expansion; order is kept
+        because bigram features depend on it.
+        """
+        eq = expand_query(query)
+        return tuple(stem_analyzer(eq.text)), tuple((tuple(stem_analyzer(p)), w) for p, w in eq.expansions)
+
     def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        q = normalize_and_expand_query(query)
-        if not q:
-            return []
-        qv = self.vectorizer.transform([q])
-        scores = linear_kernel(qv, self.matrix).flatten()
-        idxs = scores.argsort()[::-1][:top_k]
+        idxs, scores = self.search_ids(query, top_k=top_k)
+        return self.hits_from_ids(idxs, scores)
+
+    def search_ids(self, query: str, top_k: int = 5) -> Tuple[List[int], List[float]]:
+        """
+        Ranked (doc indexes, scores) without building hit dicts.
+        """
+        idxs, scores, stats = self.search_ids_stats(query, top_k=top_k)
+        self.record_search_stats(stats)
+        return idxs, scores
+
+    def search_ids_stats(self, query: str, top_k: int = 5) -> Tuple[List[int], List[float], Dict[str, Any]]:
+        """
+        search_ids plus the query's stats (features, candidates_scored) for record_search_stats.
+        """
+        with stage("query_expansion", retriever=self.name):
+            eq = expand_query(query)
+        if not eq.text:
+            return [], [], {}
+        with stage("scoring", retriever=self.name):
+            qv = query_vector(self.vectorizer, eq)
+            # matrix @ q (not linear_kernel's q @ matrix.T): no per-query CSC copy of the whole matrix
+            scores = (self.matrix @ qv.T).toarray().ravel()
+            if self.exclude_junk:
+                clean = self._clean_idx
+                idxs = clean[scores[clean].argsort()[::-1][:top_k]]
+            else:
+                idxs = scores.argsort()[::-1][:top_k]
+
+        stats = {"features": qv.indices.tolist(), "candidates_scored": int((scores > 0).sum())}
+        return [int(i) for i in idxs], [float(scores[int(i)]) for i in idxs], stats
+
+    def record_search_stats(self, stats: Dict[str, Any]) -> None:
+        """
+        The trace's posting_lengths / candidates_scored (TF-IDF has no query counters).
+        """
+        trace = current_trace()
+        if trace is None or not stats:
+            return
+        if self._feature_df is None:
+            self._feature_df = self.matrix.getnnz(axis=0)
+        trace.set("posting_lengths", {self.vocab.string(j): int(self._feature_df[j]) for j in stats["features"]})
+        trace.set("candidates_scored", stats["candidates_scored"])
+
+    def hits_from_ids(self, idxs, scores) -> List[Dict[str, Any]]:
         results = []
-        for i in idxs:
+        for i, score in zip(idxs, scores):
             c = self.chunks[int(i)]
             results.append(
                 {
                     "doc_id": c.doc_id,
                     "chunk_id": c.chunk_id,
-                    "score": float(scores[int(i)]),
+                    "score": float(score),
                     "text": c.text,
                     "source": c.source,
+                    "junk": bool(self.junk[int(i)]),
                 }
             )
+            if self.duplicates and c.chunk_id in self.duplicates:
+                results[-1]["duplicate_chunk_ids"] = self.duplicates[c.chunk_id]
         return results
 
-def build_retriever_from_records(records) -> TfidfRetriever:
+def query_vector(vectorizer: TfidfVectorizer, eq):
+    """
+    Unit-length query vector: the typed query plus each expansion weight group scaled by its
+    weight. Groups are vectorized separately, so no bigrams span the query and an expansion.
+    """
+    qv = vectorizer.transform([eq.text])
+    groups: Dict[float, List[str]] = {}
+    for phrase, weight in eq.expansions:
+        groups.setdefault(weight, []).append(phrase)
+    for weight, phrases in groups.items():
+        qv = qv + weight * vectorizer.transform([" ".join(phrases)])
+    return normalize(qv)
+
+def build_retriever_from_records(records, exclude_junk: bool = False, dedup: bool = False) -> TfidfRetriever:
     chunks = TfidfRetriever.load_chunks_from_records(records)
-    return TfidfRetriever(chunks)
+    return _tfidf_from_chunks(chunks, exclude_junk, dedup)
 
-def build_retriever(chunks_path: str) -> TfidfRetriever:
+def build_retriever(chunks_path: str, exclude_junk: bool = False, dedup: bool = False) -> TfidfRetriever:
     path = Path(chunks_path)
     chunks = TfidfRetriever.load_chunks_jsonl(path)
-    return TfidfRetriever(chunks)
+    return _tfidf_from_chunks(chunks, exclude_junk, dedup)
+
+def _tfidf_from_chunks(chunks, exclude_junk, dedup) -> TfidfRetriever:
+    duplicates = None
+    if dedup:
+        # index one representative per near-duplicate group
+        chunks, duplicates = collapse_chunks(chunks)
+    return TfidfRetriever(chunks, exclude_junk=exclude_junk, duplicates=duplicates)
+
+
+@lru_cache(maxsize=200_000)
+def _stem(token: str) -> str:
+    # the Porter stemmer dominates TF-IDF build time; a corpus has few distinct tokens
+    return stemmer.stem(token)
 
 
 def stem_analyzer(text: str):
     tokens = re.findall(r"[A-Za-z0-9]+", text.lower())
-    return [stemmer.stem(t) for t in tokens]
+    return [_stem(t) for t in tokens]
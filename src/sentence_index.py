@@ -0,0 +1,103 @@
+#Sentence-level BM25 index for extractive answering
+from array import array
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .answer import (
+    SentenceStore, build_sentence_store, cap_words, extract_relevant_clause, is_fact_question,
+)
+from .bm25 import BM25Index, query_terms, tokenize
+from .chunk_table import ChunkTable
+
+NO_ANSWER = "No relevant information found in the retrieved documents."
+
+
+class SentenceIndex:
+    """
+    BM25 over every sentence of the corpus (same tokenizer as the chunk index).
+
+    Sentences of one chunk are stored contiguously, so a search can be restricted to
+    the sentences of a few retrieved chunks with a cheap range mask, or run corpus-wide.
+    """
+
+    def __init__(self, chunks, sentence_store: Optional[SentenceStore] = None,
+                 skip: Optional[np.ndarray] = None, k1: float = 1.2, b: float = 0.75):
+        self.store = sentence_store if sentence_store is not None else build_sentence_store(chunks)
+
+        self.chunks = ChunkTable.of(chunks)
+        # indexed sentence -> its id in the store
+        sent_ids = array("i")
+        # chunk idx -> [start, end) range of its sentences
+        self.chunk_start = np.zeros(len(chunks) + 1, dtype=np.int64)
+
+        for ci in range(len(chunks)):
+            self.chunk_start[ci] = len(sent_ids)
+            if skip is not None and skip[ci]:
+                continue
+            sent_ids.extend(self.store.sentence_range(ci))
+        self.chunk_start[len(chunks)] = len(sent_ids)
+
+        self.sent_ids = np.frombuffer(sent_ids, dtype=np.int32) if sent_ids else np.zeros(0, dtype=np.int32)
+        self.sent_chunk = self.store.sent_chunk[self.sent_ids]
+        self.fact = self.store.fact[self.sent_ids].astype(np.float64)
+        self.index = BM25Index((tokenize(self.store.text(si)) for si in self.sent_ids.tolist()), k1=k1, b=b,
+                               vocab=self.store.vocab)
+
+    def _mask_for(self, chunk_ids: List[str]) -> np.ndarray:
+        mask = np.zeros(self.index.N, dtype=bool)
+        for cid in chunk_ids:
+            ci = self.chunks.index_of(cid)
+            if ci is not None:
+                mask[self.chunk_start[ci]:self.chunk_start[ci + 1]] = True
+        return mask
+
+    def search(self, query: str, top_k: int = 5, chunk_ids: Optional[List[str]] = None,
+               fact_boost: float = 0.0) -> List[Dict[str, Any]]:
+        """
+        Best sentences for `query`; restricted to the sentences of `chunk_ids` when given.
+        `fact_boost` adds that weight times the sentence's fact-signal score.
+        """
+        q_terms, weights = query_terms(query)
+        if not q_terms:
+            return []
+        allowed = self._mask_for(chunk_ids) if chunk_ids is not None else None
+        cand, scores = self.index.score_terms(q_terms, allowed=allowed, weights=weights)
+        if cand.size == 0:
+            return []
+        if fact_boost:
+            scores = scores + fact_boost * self.fact[cand]
+        cand, scores = self.index.top_k(cand, scores, top_k)
+        out = []
+        for si, score in zip(cand.tolist(), scores.tolist()):
+            ci = int(self.sent_chunk[si])
+            sentence = self.store.text(int(self.sent_ids[si]))
+            out.append({"chunk_id": self.chunks.chunk_id(ci), "doc_id": self.chunks.doc_id(ci),
+                        "sentence": sentence, "score": score})
+        return out
+
+
+def answer_from_sentence_index(query: str, hits: List[Dict], index: SentenceIndex,
+                               scope: str = "hits", max_sentences: int = 3, top_n: int = 5):
+    """
+    Extractive answer from the best BM25-scored sentences.
+    scope="hits": only sentences of the top `top_n` retrieved chunks; scope="corpus": all sentences.
+    Same output shape as answer.answer_with_citations.
+    """
+    fact_mode = is_fact_question(query)
+    chunk_ids = [h["chunk_id"] for h in hits[:top_n]] if scope == "hits" else None
+
+    best = index.search(query, top_k=1 if fact_mode else max_sentences,
+                        chunk_ids=chunk_ids, fact_boost=0.5 if fact_mode else 0.0)
+    if not best:
+        return {"answer": NO_ANSWER, "citations": []}
+
+    parts = []
+    citations = []
+    for s in best:
+        text = extract_relevant_clause(query, s["sentence"]) if fact_mode else s["sentence"]
+        parts.append(f"{text} [{s['chunk_id']}]")
+        if s["chunk_id"] not in citations:
+            citations.append(s["chunk_id"])
+
+    return {"answer": cap_words(" ".join(parts), 80), "citations": citations}
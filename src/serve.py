@@ -0,0 +1,129 @@
+#Preforked multi-worker server: build indexes once, then fork uvicorn workers
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, List
+
+from .metrics import memory_breakdown
+
+
+def _mb(n: int) -> str:
+    return f"{n / (1024 * 1024):.1f}MB"
+
+
+def report_memory(pids: List[int]) -> None:
+    for pid in pids:
+        m = memory_breakdown(pid)
+        if m:
+            print(f"worker {pid}: rss={_mb(m['rss'])} shared={_mb(m['shared'])} private={_mb(m['private'])} pss={_mb(m['pss'])}")
+
+
+def _run_worker(sock: socket.socket, args) -> None:
+    import uvicorn
+    from . import api
+
+    config = uvicorn.Config(api.app, log_level=args.log_level)
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+
+def build_indexes() -> None:
+    """
+    Build the preloaded retrievers and, with RAG_RERANK, their rerankers and TF-IDF pairs,
+    so the forked workers' startup finds them all built instead of making private copies.
+    """
+    from . import api
+
+    t0 = time.perf_counter()
+    api.preload_retrievers()
+    for name in api.LOADED_RETRIEVERS:
+        print(f"built {name}")
+    if api.RERANK:
+        print(f"built rerankers for {', '.join(api.PRELOAD_RETRIEVERS)}")
+    print(f"indexes ready in {time.perf_counter() - t0:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve src.api with N forked workers that share indexes built once in the parent."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--retrievers", default="bm25", help="Comma-separated retrievers to build before forking (with RAG_RERANK, their rerankers too)")
+    parser.add_argument("--report-interval", type=float, default=60.0, help="Seconds between memory reports (0 = off)")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        sys.exit("src.serve needs os.fork (Linux/macOS). Use `uvicorn src.api:app` instead.")
+
+    # a retrieval process pool created in the parent can't be shared by forked workers
+    if os.environ.get("RAG_RETRIEVAL_WORKERS", "0") != "0":
+        print("RAG_RETRIEVAL_WORKERS is ignored in preforked mode")
+    os.environ["RAG_RETRIEVAL_WORKERS"] = "0"
+    # each worker would only refresh its own copy of the indexes on /index/update
+    os.environ["RAG_PREFORKED"] = "1"
+    # each worker has its own LLM gate; they split RAG_LLM_CONCURRENCY / RAG_LLM_MAX_QUEUE
+    os.environ["RAG_PREFORKED_WORKERS"] = str(args.workers)
+    if int(os.getenv("RAG_LLM_CONCURRENCY", "1")) < args.workers:
+        print(f"RAG_LLM_CONCURRENCY < --workers: each worker still runs one generation at a time, "
+              f"so up to {args.workers} can reach the LLM at once")
+    # the workers' startup preloads the same list, which is then already built
+    os.environ["RAG_PRELOAD_RETRIEVERS"] = args.retrievers
+
+    build_indexes()
+
+    # freeze everything built so far out of the cyclic GC so collections in the
+    # workers don't write to (and un-share) the index pages
+    gc.collect()
+    gc.freeze()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    children: Dict[int, int] = {}
+    for i in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _run_worker(sock, args)
+            finally:
+                os._exit(0)
+        children[pid] = i
+    print(f"Serving on http://{args.host}:{args.port} with {len(children)} workers: {sorted(children)}")
+
+    def _stop(signum, frame):
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    next_report = time.monotonic() + args.report_interval
+    while children:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid:
+            children.pop(pid, None)
+            continue
+        if args.report_interval > 0 and time.monotonic() >= next_report:
+            report_memory(sorted(children))
+            next_report = time.monotonic() + args.report_interval
+        time.sleep(0.5)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+#Spec-value index: (entity, section, quantity, value, unit, chunk_id) tuples extracted at index time
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+from nltk.stem import PorterStemmer
+
+from .answer import STOPWORDS, TOKEN_RE
+from .chunk_table import ChunkTable, StringTable
+
+_stemmer = PorterStemmer()
+
+NUM = r"\d+(?:[.,]\d+)?"
+# "100 to 240 VAC", "59-61 Hz", "100/240 VAC", "466 MHz", "256 MB"; bare "A"/"C"/"in" are too ambiguous
+VALUE_RE = re.compile(
+    rf"(?<![\w.])(?P<low>{NUM})[°%]?(?:\s*(?:to|-|–|—|/)\s*(?P<high>{NUM}))?\s*"
+    r"(?P<unit>VAC|VDC|Vac|Vdc|V|KHz|kHz|MHz|GHz|Hz|kW|W|Watts|watts|Amps|amps|mA|"
+    r"Kbytes|Mbytes|Gbytes|KB|MB|GB|TB|%|mm|cm|kg|lbs|lb|BTU/hr|BTU/Hr|°\s?[CF])(?!\w)"
+)
+
+UNIT_QUANTITY = {
+    "v": "voltage", "vac": "voltage", "vdc": "voltage",
+    "hz": "frequency", "khz": "frequency", "mhz": "frequency", "ghz": "frequency",
+    "w": "power", "kw": "power", "watts": "power",
+    "amps": "current", "ma": "current",
+    "kbytes": "capacity", "mbytes": "capacity", "gbytes": "capacity",
+    "kb": "capacity", "mb": "capacity", "gb": "capacity", "tb": "capacity",
+    "%": "percent",
+    "mm": "length", "cm": "length",
+    "kg": "weight", "lb": "weight", "lbs": "weight",
+    "btu/hr": "heat",
+    "°c": "temperature", "°f": "temperature",
+}
+
+# question words -> quantity; first match wins, so "power supply voltage" is a voltage question
+QUESTION_QUANTITY = [
+    (re.compile(r"\b(voltages?|volts?|vac|vdc)\b", re.I), "voltage"),
+    (re.compile(r"\b(frequency|frequencies|hz|mhz|ghz|clock|speed)\b", re.I), "frequency"),
+    (re.compile(r"\b(current|amps?|amperes?)\b", re.I), "current"),
+    (re.compile(r"\b(watts?|wattage|power consumption|power draw)\b", re.I), "power"),
+    (re.compile(r"\b(memory|capacity|cache|storage|mb|gb)\b", re.I), "capacity"),
+    (re.compile(r"\b(temperature)\b", re.I), "temperature"),
+    (re.compile(r"\b(humidity)\b", re.I), "percent"),
+    (re.compile(r"\b(weight|weigh|heavy)\b", re.I), "weight"),
+    (re.compile(r"\b(dimensions?|height|width|depth)\b", re.I), "length"),
+    (re.compile(r"\b(heat dissipation|btu)\b", re.I), "heat"),
+]
+
+
+# unit spellings that also name what they measure ("VAC" answers "AC voltage" questions)
+TERM_ALIASES = {"vac": "ac", "vdc": "dc"}
+
+
+FOOTNOTE_RE = re.compile(r"([a-z]{4,})\d")  # "Operating2" -> "operating"
+
+
+@lru_cache(maxsize=65536)
+def _stem(t: str) -> str:
+    m = FOOTNOTE_RE.fullmatch(t)
+    return _stemmer.stem(m.group(1) if m else t)
+
+
+def _terms(text: str) -> FrozenSet[str]:
+    out = set()
+    for t in TOKEN_RE.findall(text):
+        t = t.lower()
+        if t in STOPWORDS:
+            continue
+        out.add(_stem(t))
+        if t in TERM_ALIASES:
+            out.add(TERM_ALIASES[t])
+    return frozenset(out)
+
+
+@dataclass(frozen=True)
+class SpecFact:
+    doc_id: str
+    chunk_id: str
+    section: str    # nearest heading-like line above the value
+    label: str      # text before the value on its line, e.g. "Nominal Voltage (VAC)"
+    quantity: str   # voltage, frequency, ...
+    value: str      # as written, e.g. "100 to 120 VAC"
+    low: float
+    high: float
+    unit: str
+    line: int       # line number within the chunk
+
+
+def _num(s: str) -> float:
+    return float(s.replace(",", ""))
+
+
+def extract_specs(doc_id: str, chunk_id: str, text: str) -> List[SpecFact]:
+    """
+    Every number+unit value in `text`, with the label of its table row / sentence.
+    """
+    facts: List[SpecFact] = []
+    section = ""
+    prev_label = ""
+    for ln_no, raw in enumerate((text or "").splitlines()):
+        line = raw.strip()
+        if not line:
+            continue
+        matches = list(VALUE_RE.finditer(line))
+        if not matches:
+            if len(line.split()) <= 5:
+                section = line
+            prev_label = line
+            continue
+        label = prev_label
+        pos = 0
+        for m in matches:
+            # a run of words between two values starts a new label ("... 100/240 VAC) Nominal Voltage (Vac) 100 to 120Vac")
+            seg = line[pos:m.start()].strip(" :=-–,/\t").lstrip(") ")
+            if re.search(r"[A-Za-z]{3}", seg):
+                label = seg
+            pos = m.end()
+            unit = m.group("unit").replace(" ", "")
+            quantity = UNIT_QUANTITY.get(unit.lower())
+            if quantity is None:
+                continue
+            low = _num(m.group("low"))
+            high = _num(m.group("high")) if m.group("high") else low
+            facts.append(SpecFact(doc_id, chunk_id, section, label[:120], quantity,
+                                  m.group(0).strip(), low, high, unit, ln_no))
+        prev_label = label
+    return facts
+
+
+def question_quantity(question: str) -> Optional[str]:
+    for rx, quantity in QUESTION_QUANTITY:
+        if rx.search(question):
+            return quantity
+    return None
+
+
+def value_quantity(text: str) -> Optional[str]:
+    """
+    Quantity of the first number+unit value in `text` ("CPU, 466 MHz" -> frequency), or None.
+    """
+    m = VALUE_RE.search(text)
+    return UNIT_QUANTITY.get(m.group("unit").replace(" ", "").lower()) if m else None
+
+
+def question_quantity_words(question: str) -> List[str]:
+    """
+    The words of `question` that name its quantity (question_quantity's match).
+    """
+    for rx, _ in QUESTION_QUANTITY:
+        found = [m.group(0) for m in rx.finditer(question)]
+        if found:
+            return found
+    return []
+
+
+QUANTITIES = tuple(dict.fromkeys(UNIT_QUANTITY.values()))
+QUANTITY_ID = {q: i for i, q in enumerate(QUANTITIES)}
+
+
+class _Strings:
+    """
+    Interned strings (doc ids, labels, sections) and the sorted term ids of each, CSR style.
+    """
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.terms, self.ptr = array("i"), array("q", [0])
+
+    def add(self, s: str, vocab: Dict[str, int]) -> int:
+        i = self.ids.get(s)
+        if i is None:
+            i = self.ids[s] = len(self.ids)
+            self.terms.extend(sorted(vocab.setdefault(t, len(vocab)) for t in _terms(s)))
+            self.ptr.append(len(self.terms))
+        return i
+
+    def terms_of(self, i: int) -> array:
+        return self.terms[self.ptr[i]:self.ptr[i + 1]]
+
+
+class SpecIndex:
+    """
+    Spec facts of a chunk collection as typed columns (one array per SpecFact field), sorted
+    by quantity id then document. Facts are looked up by key: the facts of quantity q in
+    document d are rows group_start[g]:group_start[g+1], where group_key[g] == q * len(docs) + d.
+
+    Doc ids (the "entity": product/manual name) and labels / sections are interned in two
+    StringTables, each with a CSR list of its sorted term ids; doc_postings maps a term id to
+    the documents whose name contains it. Columns are `array`s, as in StringTable: lookups
+    touch a handful of facts, and indexing an array yields plain ints.
+    `skip` (the junk bitmap) leaves chunks out, as in SentenceIndex.
+    """
+
+    def __init__(self, chunks, skip=None):
+        self.chunks = chunks = ChunkTable.of(chunks)
+        vocab: Dict[str, int] = {}
+        docs, strings = _Strings(), _Strings()
+        units: Dict[str, int] = {}
+        quantity, doc, chunk, line = array("i"), array("i"), array("i"), array("i")
+        label, section, unit = array("i"), array("i"), array("i")
+        low, high = array("d"), array("d")
+        values: List[str] = []
+
+        for ci in range(len(chunks)):
+            if skip is not None and skip[ci]:
+                continue
+            doc_id = chunks.doc_id(ci)
+            for f in extract_specs(doc_id, chunks.chunk_id(ci), chunks.text(ci)):
+                quantity.append(QUANTITY_ID[f.quantity])
+                doc.append(docs.add(doc_id, vocab))
+                chunk.append(ci)
+                line.append(f.line)
+                label.append(strings.add(f.label, vocab))
+                section.append(strings.add(f.section, vocab))
+                unit.append(units.setdefault(f.unit, len(units)))
+                low.append(f.low)
+                high.append(f.high)
+                values.append(f.value)
+
+        # quantity-major, then document in first-seen order; chunk order is kept within a document
+        n_docs = max(len(docs.ids), 1)
+        key = np.array(quantity, dtype=np.int64) * n_docs + np.array(doc, dtype=np.int64)
+        order = np.argsort(key, kind="stable")
+        group_key, group_start = np.unique(key[order], return_index=True)
+        self.group_key = array("q", group_key.tolist())
+        self.group_start = array("q", group_start.tolist() + [len(order)])
+        order = order.tolist()
+        self.fact_doc = array("i", (doc[i] for i in order))
+        self.fact_chunk = array("i", (chunk[i] for i in order))
+        self.fact_line = array("i", (line[i] for i in order))
+        self.fact_label = array("i", (label[i] for i in order))
+        self.fact_section = array("i", (section[i] for i in order))
+        self.fact_unit = array("i", (unit[i] for i in order))
+        self.low = array("d", (low[i] for i in order))
+        self.high = array("d", (high[i] for i in order))
+        self.values = StringTable(values[i] for i in order)
+        self.units = StringTable(units)
+        self.terms = StringTable(vocab)
+        self.docs, self.doc_ptr, self.doc_terms = StringTable(docs.ids), docs.ptr, docs.terms
+        self.strings, self.string_ptr, self.string_terms = StringTable(strings.ids), strings.ptr, strings.terms
+
+        # term id -> documents whose name has it
+        postings: List[List[int]] = [[] for _ in range(len(vocab))]
+        for d in range(len(docs.ids)):
+            for t in docs.terms_of(d):
+                postings[t].append(d)
+        self.doc_postings = array("i", (d for p in postings for d in p))
+        self.doc_postings_ptr = array("q", [0])
+        for p in postings:
+            self.doc_postings_ptr.append(self.doc_postings_ptr[-1] + len(p))
+        self._non = vocab.get("non", -1)
+
+    def __len__(self) -> int:
+        return len(self.fact_doc)
+
+    def fact(self, i: int) -> SpecFact:
+        g = bisect_right(self.group_start, i) - 1
+        ci = self.fact_chunk[i]
+        return SpecFact(self.chunks.doc_id(ci), self.chunks.chunk_id(ci),
+                        self.strings.string(self.fact_section[i]), self.strings.string(self.fact_label[i]),
+                        QUANTITIES[self.group_key[g] // max(len(self.docs), 1)], self.values.string(i),
+                        self.low[i], self.high[i], self.units.string(self.fact_unit[i]), self.fact_line[i])
+
+    def _docs_with(self, t: int) -> array:
+        return self.doc_postings[self.doc_postings_ptr[t]:self.doc_postings_ptr[t + 1]]
+
+    def lookup(self, question: str) -> Optional[Tuple[SpecFact, List[SpecFact]]]:
+        """
+        Best-matching fact for a spec question, plus the other values with the same label on its line.
+        None when the question names no known quantity, or no fact matches its entity and label.
+
+        The quantity word itself ("frequency") doesn't count as a label match when the question names
+        anything else: some other question term has to be in the label or section, and question terms
+        found in neither count against the fact, so "frequency of the DS10 processor" doesn't answer
+        with the power supply's Hz.
+        """
+        quantity = question_quantity(question)
+        if quantity is None:
+            return None
+        q_terms = _terms(question)
+        q_ids = {self.terms.get(t) for t in q_terms}
+        q_ids.discard(None)
+        # model numbers / versions ("ds10", "gs80", "5.1") must be in the entity name
+        idents = [self.terms.get(t) for t in q_terms if any(ch.isdigit() for ch in t)]
+        if None in idents:
+            return None
+        quantity_terms = _terms(" ".join(question_quantity_words(question)))
+        quantity_ids = {self.terms.get(t) for t in quantity_terms}
+        # question terms in no doc name, label or section can't be matched by any fact
+        unknown = sum(1 for t in q_terms.difference(quantity_terms) if self.terms.get(t) is None)
+
+        # documents sharing a term with the question, and how many
+        entity: Dict[int, int] = {}
+        for t in q_ids:
+            for d in self._docs_with(t):
+                entity[d] = entity.get(d, 0) + 1
+        for t in idents:
+            docs_with = set(self._docs_with(t))
+            entity = {d: n for d, n in entity.items() if d in docs_with}
+
+        base = QUANTITY_ID[quantity] * len(self.docs)
+        labels, sections = self.fact_label, self.fact_section
+        string_terms, string_ptr = self.string_terms, self.string_ptr
+        best = None
+        best_score = 0.0
+        for d in sorted(entity):
+            g = bisect_left(self.group_key, base + d)
+            if g == len(self.group_key) or self.group_key[g] != base + d:
+                continue
+            # the label / section has to match the question beyond the entity name and the quantity;
+            # when those are all it names ("heat dissipation of the DS10"), the quantity words do
+            asked = q_ids.difference(self.doc_terms[self.doc_ptr[d]:self.doc_ptr[d + 1]])
+            rest = asked.difference(quantity_ids)
+            if not rest and not unknown:
+                rest = asked
+            if not rest:
+                continue
+            non_asked = self._non in rest
+            # string id -> (question terms in it, its term count, has "non"), for this document's `rest`
+            scored: Dict[int, Tuple[FrozenSet[int], int, bool]] = {}
+            for column in (labels, sections):
+                for i in range(self.group_start[g], self.group_start[g + 1]):
+                    sid = column[i]
+                    if sid not in scored:
+                        terms = string_terms[string_ptr[sid]:string_ptr[sid + 1]]
+                        scored[sid] = frozenset(rest.intersection(terms)), len(terms), self._non in terms
+            for i in range(self.group_start[g], self.group_start[g + 1]):
+                lab_hits, n_terms, lab_non = scored[labels[i]]
+                sec_hits = scored[sections[i]][0]
+                overlap = len(lab_hits)
+                if not non_asked and lab_non:
+                    overlap -= 1  # "Non-operating" rows don't answer "operating" questions
+                if overlap <= 0 and not sec_hits:
+                    continue
+                # section headings count half; shorter, more specific labels win ties;
+                # question terms in neither the label nor the section count against it
+                unmatched = len(rest) + unknown - len(lab_hits | sec_hits)
+                score = entity[d] + overlap + 0.5 * len(sec_hits) + 0.5 * max(overlap, 0) / n_terms - unmatched
+                if score > best_score:
+                    best, best_g, best_score = i, g, score
+        if best is None:
+            return None
+        # the other values on its line: within a group, the facts of one line are adjacent
+        chunk, line = self.fact_chunk, self.fact_line
+        lo = hi = best
+        while lo > self.group_start[best_g] and chunk[lo - 1] == chunk[best] and line[lo - 1] == line[best]:
+            lo -= 1
+        while hi + 1 < self.group_start[best_g + 1] and chunk[hi + 1] == chunk[best] and line[hi + 1] == line[best]:
+            hi += 1
+        return self.fact(best), [self.fact(j) for j in range(lo, hi + 1) if labels[j] == labels[best]]
+
+
+def answer_from_spec_index(question: str, index: SpecIndex) -> Optional[Dict]:
+    """
+    {"answer", "citations", "spec"} for spec questions the index can answer, else None.
+    """
+    found = index.lookup(question)
+    if found is None:
+        return None
+    best, row = found
+    values = ", ".join(f.value for f in row)
+    return {
+        "answer": f"{best.label}: {values} [{best.chunk_id}]" if best.label else f"{values} [{best.chunk_id}]",
+        "citations": [best.chunk_id],
+        "spec": {
+            "entity": best.doc_id,
+            "section": best.section,
+            "label": best.label,
+            "quantity": best.quantity,
+            "values": [{"value": f.value, "low": f.low, "high": f.high, "unit": f.unit} for f in row],
+        },
+    }
@@ -0,0 +1,153 @@
+#Synthetic chunk corpora with the word/length statistics of a real one (scaling benchmarks)
+import json
+import math
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List, Sequence
+
+import numpy as np
+
+from .bm25 import Chunk
+
+_LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+def _alpha(k: int) -> str:
+    out = ""
+    while True:
+        k, r = divmod(k, 26)
+        out = _LETTERS[r] + out
+        if k == 0:
+            return out
+
+
+@dataclass
+class CorpusProfile:
+    """
+    Whitespace-word unigram distribution, chunk/line/document length distributions and a
+    Heaps' law fit (vocabulary = K * tokens ** beta) of a chunk collection.
+    """
+
+    words: List[str]
+    probs: np.ndarray
+    chunk_lens: np.ndarray       # words per chunk
+    line_lens: np.ndarray        # words per line
+    doc_chunks: np.ndarray       # chunks per document
+    heaps_k: float
+    heaps_beta: float
+    n_chunks: int
+    n_tokens: int
+
+    @classmethod
+    def from_chunks(cls, chunks: Sequence) -> "CorpusProfile":
+        counts: Counter = Counter()
+        chunk_lens, line_lens = [], []
+        per_doc: Counter = Counter()
+        # vocabulary growth, sampled at ~50 points for the Heaps fit
+        growth = []
+        n = 0
+        step = max(1, len(chunks) // 50)
+        for i, c in enumerate(chunks):
+            per_doc[c.doc_id] += 1
+            words = c.text.split()
+            counts.update(words)
+            n += len(words)
+            chunk_lens.append(len(words))
+            line_lens.extend(len(ln.split()) for ln in c.text.splitlines() if ln.strip())
+            if i % step == step - 1:
+                growth.append((n, len(counts)))
+        if not counts:
+            raise RuntimeError("Cannot profile an empty corpus.")
+
+        if len(growth) >= 2:
+            x = np.log([g[0] for g in growth])
+            y = np.log([g[1] for g in growth])
+            beta, log_k = np.polyfit(x, y, 1)
+        else:
+            beta, log_k = 0.6, math.log(len(counts)) - 0.6 * math.log(n)
+
+        words, freq = zip(*counts.most_common())
+        freq = np.asarray(freq, dtype=np.float64)
+        return cls(
+            words=list(words),
+            probs=freq / freq.sum(),
+            chunk_lens=np.asarray(chunk_lens, dtype=np.int64),
+            line_lens=np.asarray(line_lens or [10], dtype=np.int64),
+            doc_chunks=np.asarray(list(per_doc.values()), dtype=np.int64),
+            heaps_k=float(math.exp(log_k)),
+            heaps_beta=float(beta),
+            n_chunks=len(chunks),
+            n_tokens=n,
+        )
+
+    def expected_vocab(self, n_tokens: int) -> int:
+        return int(self.heaps_k * max(n_tokens, 1) ** self.heaps_beta)
+
+
+def synthesize(profile: CorpusProfile, n_chunks: int, seed: int = 0) -> Iterator[Chunk]:
+    """
+    `n_chunks` synthetic chunks. Words are drawn from the profile's unigram distribution;
+    new words are mixed in so the vocabulary keeps growing along the fitted Heaps curve,
+    and re-used so they get realistic (short) posting lists instead of all being hapaxes.
+    """
+    rng = np.random.default_rng(seed)
+    words = np.asarray(profile.words, dtype=object)
+    alpha_words = [w for w in profile.words[:5000] if w.isalpha() and len(w) >= 3] or ["word"]
+    cdf = np.cumsum(profile.probs)
+    seen = np.zeros(len(words), dtype=bool)
+    vocab = 0
+    n_tokens = 0
+    tail: List[str] = []
+
+    doc = 0
+    left_in_doc = 0
+    pos_in_doc = 0
+    for _ in range(n_chunks):
+        if left_in_doc == 0:
+            doc += 1
+            left_in_doc = int(profile.doc_chunks[rng.integers(profile.doc_chunks.size)])
+            pos_in_doc = 0
+        doc_id = f"Synthetic Manual {doc:05d}"
+
+        n = int(profile.chunk_lens[rng.integers(profile.chunk_lens.size)])
+        ids = np.searchsorted(cdf, rng.random(n) * cdf[-1])
+        fresh = np.unique(ids[~seen[ids]])
+        seen[fresh] = True
+        vocab += fresh.size
+        n_tokens += n
+        toks = words[ids]
+
+        # top up to the Heaps curve with new words, and re-use about as many earlier ones
+        n_new = min(max(profile.expected_vocab(n_tokens) - vocab, 0), n // 4)
+        n_reuse = min(n_new, len(tail))
+        if n_new or n_reuse:
+            slots = rng.choice(n, size=n_new + n_reuse, replace=False)
+            for s in slots[:n_new]:
+                w = alpha_words[int(rng.integers(len(alpha_words)))][:3].lower() + _alpha(len(tail))
+                tail.append(w)
+                toks[s] = w
+            for s in slots[n_new:]:
+                toks[s] = tail[int(rng.integers(len(tail)))]
+            vocab += n_new
+
+        ends = np.cumsum(np.maximum(profile.line_lens[rng.integers(profile.line_lens.size, size=n)], 1))
+        ends = ends[ends < n].tolist() + [n]
+        toks = toks.tolist()
+        lines = [" ".join(toks[a:b]) for a, b in zip([0] + ends[:-1], ends)]
+
+        yield Chunk(doc_id=doc_id, chunk_id=f"{doc_id}_{pos_in_doc:05d}", text="\n".join(lines),
+                    source=f"synthetic/{doc_id}.txt")
+        left_in_doc -= 1
+        pos_in_doc += 1
+
+
+def write_chunks_jsonl(chunks, path: Path) -> int:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    n = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for c in chunks:
+            f.write(json.dumps({"doc_id": c.doc_id, "source": c.source, "chunk_id": c.chunk_id,
+                                "text": c.text}, ensure_ascii=False) + "\n")
+            n += 1
+    return n
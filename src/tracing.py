@@ -0,0 +1,96 @@
+#Opt-in per-request timing trace
+import cProfile
+import io
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class Trace:
+    """
+    Collects stage timings and per-request diagnostics for one /query call.
+    Only exists when the caller asked for it; instrumented code checks `current_trace()`.
+    """
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.stages: List[Dict[str, Any]] = []
+        self.info: Dict[str, Any] = {}
+
+    def record_stage(self, name: str, seconds: float, **labels) -> None:
+        self.stages.append({"stage": name, "ms": round(seconds * 1000.0, 3), **labels})
+
+    def set(self, key: str, value: Any) -> None:
+        self.info[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total_ms": round((time.perf_counter() - self.t0) * 1000.0, 3),
+            "stages": self.stages,
+            **self.info,
+        }
+
+
+_CURRENT: ContextVar[Optional[Trace]] = ContextVar("rag_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _CURRENT.get()
+
+
+@contextmanager
+def start_trace() -> Iterator[Trace]:
+    trace = Trace()
+    token = _CURRENT.set(trace)
+    try:
+        yield trace
+    finally:
+        _CURRENT.reset(token)
+
+
+# one cProfile at a time: Python 3.12+ refuses to enable a second one (sys.monitoring is process-wide)
+_PROFILE_LOCK = threading.Lock()
+
+
+@contextmanager
+def profiled(trace: Optional[Trace], key: str = "profile", limit: int = 15) -> Iterator[None]:
+    """
+    cProfile the wrapped block and store the top functions (by cumulative time) on the trace.
+    No-op when `trace` is None. While another block is being profiled, the request runs
+    unprofiled and `key` says so, instead of waiting for the lock.
+    """
+    if trace is None:
+        yield
+        return
+    if not _PROFILE_LOCK.acquire(blocking=False):
+        trace.set(key, "skipped: another request is being profiled")
+        yield
+        return
+    try:
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError as e:
+            # a profiler outside this module is active
+            prof = None
+            trace.set(key, f"skipped: {e}")
+        try:
+            yield
+        finally:
+            if prof is not None:
+                prof.disable()
+                buf = io.StringIO()
+                pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(limit)
+                trace.set(key, buf.getvalue())
+    finally:
+        _PROFILE_LOCK.release()
+
+
+def approx_tokens(text: str) -> int:
+    """
+    Rough LLM token count (~4 chars per token for English manuals).
+    """
+    return (len(text) + 3) // 4
@@ -0,0 +1,211 @@
+#Directory watch: ingest new/changed/removed PDFs and push them into the running API
+import argparse
+import json
+import os
+import time
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from .ingest import CACHE_DIR, CHUNKERS, MANIFEST, OUT_JSONL, PDF_DIR, load_manifest, run_ingest
+from .pdf_audit import AUDIT_MANIFEST, load_audit, run_audit, save_audit
+
+POLL_INTERVAL_S = float(os.getenv("RAG_WATCH_INTERVAL", "2"))
+API_URL = os.getenv("RAG_API_URL", "http://127.0.0.1:8000")
+WATCH_LOG = Path("data_processed") / "watch_log.jsonl"
+
+# name -> (size, mtime_ns)
+Snapshot = Dict[str, Tuple[int, int]]
+
+
+def snapshot(pdf_dir: Path) -> Snapshot:
+    out: Snapshot = {}
+    for p in pdf_dir.glob("*.pdf"):
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            continue
+        out[p.name] = (st.st_size, st.st_mtime_ns)
+    return out
+
+
+def manifest_snapshot(manifest_path: Path) -> Snapshot:
+    """
+    What the last ingest saw, so PDFs added or changed while nothing was watching count as changes.
+    """
+    return {name: (e.get("size"), e.get("mtime_ns")) for name, e in load_manifest(manifest_path).items()}
+
+
+def check_api(api_url: str) -> None:
+    """
+    Refuse to watch for a server whose /index/update can't reach every worker (src.serve).
+    An API that isn't up yet is fine: it loads the new chunks when it starts.
+    """
+    try:
+        resp = requests.get(f"{api_url.rstrip('/')}/index", timeout=10)
+    except requests.RequestException:
+        return
+    if resp.status_code == 200 and not resp.json().get("live_updates", True):
+        raise SystemExit(f"{api_url} is a preforked src.serve: /index/update would only reach one worker. "
+                         "Serve with `uvicorn src.api:app` to watch, or restart src.serve after ingesting.")
+
+
+def process_changes(pdf_dir: Path = PDF_DIR, out_path: Path = OUT_JSONL, cache_dir: Path = CACHE_DIR,
+                    manifest_path: Path = MANIFEST, audit_path: Optional[Path] = AUDIT_MANIFEST,
+                    workers: int = 0, chunker: str = "window", mssql: bool = False,
+                    api_url: Optional[str] = API_URL, retrievers: Optional[List[str]] = None,
+                    detected_at: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    One pass: audit -> incremental ingest -> (MSSQL) -> POST /index/update.
+    Returns a report with per-step seconds and the detect -> serving freshness,
+    or None when the chunks didn't change.
+    """
+    detected_at = time.time() if detected_at is None else detected_at
+    steps: Dict[str, float] = {}
+
+    t = time.perf_counter()
+    if audit_path is not None:
+        pdfs = sorted(pdf_dir.glob("*.pdf"))
+        save_audit(run_audit(pdfs, workers=workers, previous=load_audit(audit_path)), audit_path)
+    steps["audit_s"] = time.perf_counter() - t
+
+    with ExitStack() as stack:
+        sink = None
+        if mssql:
+            from .ingest_mssql import document_replacer
+
+            replace = stack.enter_context(document_replacer())
+            steps["mssql_s"] = 0.0
+
+            def sink(doc_id, rows):
+                # documents go to MSSQL as they are chunked; their share of the ingest is reported apart
+                t = time.perf_counter()
+                replace(doc_id, rows)
+                steps["mssql_s"] += time.perf_counter() - t
+
+        t = time.perf_counter()
+        result = run_ingest(pdf_dir, out_path, cache_dir, manifest_path, workers=workers, chunker=chunker,
+                            audit_path=audit_path, sink=sink)
+        steps["ingest_s"] = time.perf_counter() - t - steps.get("mssql_s", 0.0)
+
+    doc_ids = result.added + result.changed + result.removed
+    if not doc_ids:
+        return None
+
+    update = None
+    if api_url:
+        t = time.perf_counter()
+        try:
+            resp = requests.post(f"{api_url.rstrip('/')}/index/update",
+                                 json={"doc_ids": doc_ids, "retrievers": retrievers, "detected_at": detected_at},
+                                 timeout=600)
+            resp.raise_for_status()
+            update = resp.json()
+        except requests.RequestException as e:
+            # chunks are written either way; an API (re)started later loads them
+            update = {"error": str(e)}
+        steps["index_update_s"] = time.perf_counter() - t
+
+    return {
+        "detected_at": detected_at,
+        "added": result.added,
+        "changed": result.changed,
+        "removed": result.removed,
+        "needs_ocr": result.needs_ocr,
+        "pages_extracted": result.pages_extracted,
+        "chunks_written": result.chunks_written,
+        **{k: round(v, 3) for k, v in steps.items()},
+        "index_update": update,
+        # serving (or, without an API, written) this long after the change was noticed
+        "freshness_s": round(time.time() - detected_at, 3),
+    }
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    changes = ", ".join(f"{k} {len(report[k])}" for k in ("added", "changed", "removed", "needs_ocr") if report[k])
+    steps = " ".join(f"{k[:-2]}={report[k]:.2f}s" for k in ("audit_s", "ingest_s", "mssql_s", "index_update_s")
+                     if k in report)
+    line = f"{time.strftime('%H:%M:%S')} {changes} | {steps} | freshness {report['freshness_s']:.2f}s"
+    if report["index_update"] and "error" in report["index_update"]:
+        line += f" | API not updated: {report['index_update']['error']}"
+    print(line)
+
+
+def watch(pdf_dir: Path = PDF_DIR, interval_s: float = POLL_INTERVAL_S, log_path: Optional[Path] = WATCH_LOG,
+          once: bool = False, **kw) -> None:
+    """
+    Poll `pdf_dir` every `interval_s`. A change is processed once the directory looks the
+    same on two polls in a row (so half-copied PDFs aren't ingested); freshness is counted
+    from the poll that first saw it, so arrival -> detection adds up to one interval.
+    The baseline is the ingest manifest, so PDFs added, changed or removed while the watcher
+    was down are caught up on start; an up-to-date tree writes and sends nothing.
+    `once` runs a single catch-up pass instead (run `python -m src.ingest` for the same).
+    """
+    api_url = kw.get("api_url", API_URL)
+    if api_url:
+        check_api(api_url)
+
+    def run(detected_at: float) -> None:
+        try:
+            report = process_changes(pdf_dir, detected_at=detected_at, **kw)
+        except Exception as e:
+            # keep watching; the same files are retried on their next change
+            print(f"{time.strftime('%H:%M:%S')} update failed: {e!r}")
+            return
+        if report is None:
+            return
+        _print_report(report)
+        if log_path is not None:
+            log_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(report, ensure_ascii=False) + "\n")
+
+    if once:
+        run(time.time())
+        return
+
+    processed = manifest_snapshot(kw.get("manifest_path", MANIFEST))
+
+    pending: Optional[Tuple[float, Snapshot]] = None  # (first seen, latest snapshot) of a change
+    while True:
+        time.sleep(interval_s)
+        snap = snapshot(pdf_dir)
+        if snap == processed:
+            pending = None
+        elif pending is None or snap != pending[1]:
+            pending = (pending[0] if pending else time.time(), snap)
+        else:
+            run(pending[0])
+            processed, pending = snap, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch data_raw/ and keep chunks + the running API's indexes current.")
+    parser.add_argument("--pdf-dir", default=str(PDF_DIR))
+    parser.add_argument("--out", default=str(OUT_JSONL))
+    parser.add_argument("--cache-dir", default=str(CACHE_DIR))
+    parser.add_argument("--manifest", default=str(MANIFEST))
+    parser.add_argument("--audit", default=str(AUDIT_MANIFEST), help="PDF audit manifest ('' to skip the audit)")
+    parser.add_argument("--workers", type=int, default=0, help="Extraction processes (default: CPU count)")
+    parser.add_argument("--chunker", choices=sorted(CHUNKERS), default="window")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL_S, help="Seconds between directory polls")
+    parser.add_argument("--mssql", action="store_true", help="Also replace the changed documents in MSSQL")
+    parser.add_argument("--api", default=API_URL, help="API to notify ('' = only write chunks)")
+    parser.add_argument("--retrievers", default="", help="Comma-separated retrievers to rebuild (default: all loaded)")
+    parser.add_argument("--log", default=str(WATCH_LOG), help="JSONL log of every update with its timings")
+    parser.add_argument("--once", action="store_true", help="Run one catch-up ingest + update pass and exit")
+    args = parser.parse_args()
+
+    retrievers = [n.strip() for n in args.retrievers.split(",") if n.strip()] or None
+    print(f"Watching {args.pdf_dir} every {args.interval:g}s" + (f" -> {args.api}" if args.api else ""))
+    watch(Path(args.pdf_dir), interval_s=args.interval, log_path=Path(args.log) if args.log else None,
+          once=args.once, out_path=Path(args.out), cache_dir=Path(args.cache_dir),
+          manifest_path=Path(args.manifest), audit_path=Path(args.audit) if args.audit else None,
+          workers=args.workers, chunker=args.chunker, mssql=args.mssql, api_url=args.api or None,
+          retrievers=retrievers)
+
+
+if __name__ == "__main__":
+    main()
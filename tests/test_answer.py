@@ -0,0 +1,58 @@
+import numpy as np
+
+from src.answer import answer_with_citations, build_sentence_store
+from src.bm25 import Chunk
+
+CHUNKS = [
+    Chunk("Doc1", "c1", "Power requirements.\nThe nominal input voltage is 100 to 240 VAC at 50/60 Hz. The unit draws 2 A."),
+    Chunk("Doc2", "c2", "Environmental conditions: operating temperature 10 to 35 C, humidity 20 to 80 percent."),
+]
+
+def test_precomputed_sentences_give_same_answer():
+    hits = [{"chunk_id": c.chunk_id, "text": c.text} for c in CHUNKS]
+    store = build_sentence_store(CHUNKS)
+    for q in ("What is the input voltage range?", "environmental conditions humidity"):
+        assert answer_with_citations(q, hits, sentence_store=store) == answer_with_citations(q, hits)
+
+def test_fact_question_returns_single_cited_clause():
+    hits = [{"chunk_id": c.chunk_id, "text": c.text} for c in CHUNKS]
+    out = answer_with_citations("What is the input voltage range?", hits, sentence_store=build_sentence_store(CHUNKS))
+    assert out["citations"] == ["c1"]
+    assert "100 to 240 VAC" in out["answer"]
+
+def test_sentence_index_scopes():
+    from src.sentence_index import SentenceIndex, answer_from_sentence_index
+    index = SentenceIndex(CHUNKS)
+    hits = [{"chunk_id": "c2", "text": CHUNKS[1].text}]
+    # restricted to the retrieved chunk vs. the whole corpus
+    assert answer_from_sentence_index("nominal input voltage", hits, index)["citations"] == []
+    out = answer_from_sentence_index("nominal input voltage", hits, index, scope="corpus")
+    assert out["citations"] == ["c1"]
+    assert "240 VAC" in out["answer"]
+
+
+def test_sentence_store_keeps_flat_offsets_and_term_ids():
+    store = build_sentence_store(CHUNKS)
+    ci = store.index_of("c2")
+    (si,) = store.sentence_range(ci)
+    assert store.text(si) == CHUNKS[1].text
+    assert store.seg_start.dtype == np.int32 and store.fact.dtype == np.int8
+    assert store.overlaps(ci, store.query_ids({"humidity", "percent", "voltage"})).tolist() == [2]
+    assert store.relevant_clause({"humidity"}, si) == "operating temperature 10 to 35 C, humidity 20 to 80 percent."
+    assert store.context_tokens(ci, {"doc2", "35", "ds20", "humidity"}) == {"doc2", "35"}
+
+    # a prose sentence running over two lines is stored as two segments of the chunk text
+    multi = build_sentence_store([Chunk("D", "m", "The unit must be installed\nby a qualified technician only.")])
+    (si,) = multi.sentence_range(0)
+    assert multi.sent_seg[si + 1] - multi.sent_seg[si] == 2
+    assert multi.text(si) == "The unit must be installed by a qualified technician only."
+
+
+def test_bm25_and_tfidf_share_one_sentence_store():
+    from src.bm25 import BM25Retriever
+    from src.retrieve import TfidfRetriever
+    store = build_sentence_store(CHUNKS)
+    bm25 = BM25Retriever(CHUNKS, sentences=store)
+    tfidf = TfidfRetriever(CHUNKS, sentences=store)
+    assert bm25.sentences is tfidf.sentences is store
+    assert bm25.vocab is store.vocab and bm25.df_of("voltage") == 1
@@ -0,0 +1,62 @@
+from src.answer_cache import AnswerCache, context_fingerprint, make_key
+import src.llm_ollama as llm_ollama
+from src.llm_client import LLMClient, set_llm_client
+
+HITS = [
+    {"doc_id": "Doc1", "chunk_id": "c1", "text": "AC voltage range is 100-240V."},
+    {"doc_id": "Doc2", "chunk_id": "c2", "text": "Frequency is 50/60 Hz."},
+]
+
+def test_cache_survives_restart_and_normalizes_question(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    key = make_key("What is the AC voltage?", ["c1", "c2"], "p", "m")
+    fp = context_fingerprint(HITS)
+
+    AnswerCache(path).put(key, fp, {"answer": "100-240V", "citations": ["c1"]}, chunk_ids=["c1", "c2"])
+
+    cache = AnswerCache(path)  # fresh process: memory tier empty
+    same_key = make_key("  what is the ac   voltage ", ["c1", "c2"], "p", "m")
+    assert cache.get(same_key, fp)["answer"] == "100-240V"
+
+def test_cache_invalidates_on_chunk_change(tmp_path):
+    cache = AnswerCache(str(tmp_path / "cache.sqlite"))
+    key = make_key("q", ["c1", "c2"], "p", "m")
+    cache.put(key, context_fingerprint(HITS), {"answer": "a", "citations": ["c1", "c2"]}, chunk_ids=["c1", "c2"])
+
+    changed = [dict(HITS[0], text="AC voltage range is 200-240V."), HITS[1]]
+    assert cache.get(key, context_fingerprint(changed)) is None
+
+    cache.put(key, context_fingerprint(HITS), {"answer": "a", "citations": ["c1", "c2"]}, chunk_ids=["c1", "c2"])
+    assert cache.invalidate_chunks(["c2"]) == 1
+    assert cache.get(key, context_fingerprint(HITS)) is None
+
+def test_answer_with_llm_hits_cache(monkeypatch):
+    monkeypatch.setattr(llm_ollama, "get_answer_cache", lambda: cache)
+    cache = AnswerCache(path=None)
+    calls = []
+    monkeypatch.setattr(llm_ollama, "ask_ollama", lambda prompt, model=None: calls.append(prompt) or "100-240V")
+
+    first = llm_ollama.answer_with_llm("What is the AC voltage?", HITS)
+    second = llm_ollama.answer_with_llm("what is the AC voltage", HITS)
+
+    assert len(calls) == 1
+    assert first["cached"] is False and second["cached"] is True
+    assert second["answer"] == "100-240V"
+
+def test_answer_with_llm_uses_current_client_model(monkeypatch):
+    cache = AnswerCache(path=None)
+    monkeypatch.setattr(llm_ollama, "get_answer_cache", lambda: cache)
+    models = []
+    monkeypatch.setattr(llm_ollama, "ask_ollama", lambda prompt, model=None: models.append(model) or "100-240V")
+
+    set_llm_client(LLMClient(model="first"))
+    try:
+        llm_ollama.answer_with_llm("What is the AC voltage?", HITS)
+        # a client installed later is used for both the request and the cache key
+        set_llm_client(LLMClient(model="second"))
+        second = llm_ollama.answer_with_llm("What is the AC voltage?", HITS)
+    finally:
+        set_llm_client(None)
+
+    assert models == ["first", "second"]
+    assert second["cached"] is False
@@ -1,5 +1,8 @@
+import pytest
 from fastapi.testclient import TestClient
 import src.api as api
+from src import serve
+from src.tracing import Trace, profiled
 
 class DummyRetriever:
     def search(self, q: str, top_k: int = 5):
@@ -20,4 +23,107 @@ def test_query_endpoint_returns_200(monkeypatch):
     body = resp.json()
     assert "answer" in body
     assert "top_k" in body
-    assert len(body["top_k"]) > 0
\ No newline at end of file
+    assert len(body["top_k"]) > 0
+
+def test_metrics_endpoint_reports_stages(monkeypatch):
+    monkeypatch.setattr(api, "get_retriever", lambda name: DummyRetriever())
+
+    client = TestClient(api.app)
+    payload = {"question": "What AC voltage range is supported?", "top_k": 2, "retriever": "bm25", "mode": "extractive"}
+    client.post("/query", json=payload)
+    resp = client.get("/metrics")
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert 'rag_stage_seconds_count{retriever="bm25",stage="extractive"}' in resp.text
+    assert 'rag_requests_total{mode="extractive",retriever="bm25",status="ok"}' in resp.text
+    assert "process_resident_memory_bytes" in resp.text
+
+def test_query_trace_is_opt_in(monkeypatch):
+    monkeypatch.setattr(api, "get_retriever", lambda name: DummyRetriever())
+
+    client = TestClient(api.app)
+    payload = {"question": "What AC voltage range is supported?", "top_k": 2, "retriever": "bm25", "mode": "extractive"}
+    assert "trace" not in client.post("/query", json=payload).json()
+
+    traced = client.post("/query", json=payload, headers={"X-RAG-Trace": "profile"}).json()["trace"]
+    assert [s["stage"] for s in traced["stages"]] == ["retrieval", "extractive"]
+    assert "cumulative" in traced["retrieval_profile"]
+
+    # a second concurrent profile is skipped rather than failing the request
+    with profiled(Trace(), key="outer"):
+        traced = client.post("/query", json=payload, headers={"X-RAG-Trace": "profile"}).json()["trace"]
+    assert traced["retrieval_profile"] == "skipped: another request is being profiled"
+
+def test_hybrid_skips_llm_only_when_confident(monkeypatch):
+    monkeypatch.setattr(api, "get_retriever", lambda name: DummyRetriever())
+    calls = []
+    monkeypatch.setattr(api, "answer_with_llm", lambda q, hits, **kw: calls.append(q) or {"answer": "llm", "citations": ["c1"]})
+
+    client = TestClient(api.app)
+    payload = {"question": "What AC voltage range is supported?", "top_k": 2, "retriever": "bm25", "mode": "hybrid"}
+    body = client.post("/query", json=payload).json()
+    assert body["answered_by"] == "extractive" and body["confidence"] >= 0.75
+    assert "100-240V" in body["answer"] and calls == []
+
+    body = client.post("/query", json={**payload, "confidence_threshold": 1.01}).json()
+    assert body["answered_by"] == "llm" and body["answer"] == "llm"
+    assert len(calls) == 1
+
+def test_hybrid_wrong_unit_falls_back_to_llm(monkeypatch):
+    class WrongUnit:
+        def search(self, q: str, top_k: int = 5):
+            return [{"doc_id": "DS10", "chunk_id": "c1", "score": 1.0, "source": "s1",
+                     "text": "DS10 input frequency range is 100-240 VAC."}][:top_k]
+
+    monkeypatch.setattr(api, "get_retriever", lambda name: WrongUnit())
+    calls = []
+    monkeypatch.setattr(api, "answer_with_llm", lambda q, hits, **kw: calls.append(q) or {"answer": "llm", "citations": ["c1"]})
+
+    client = TestClient(api.app)
+    payload = {"question": "What is the DS10 input frequency range?", "top_k": 1, "retriever": "bm25", "mode": "hybrid"}
+    body = client.post("/query", json=payload).json()
+    # every question term matches, but a voltage doesn't answer a frequency question
+    assert body["confidence"] < 0.75
+    assert body["answered_by"] == "llm" and len(calls) == 1
+
+def test_index_update_swaps_loaded_retrievers(monkeypatch):
+    class Built(DummyRetriever):
+        def __init__(self, version):
+            self.index_version = version
+            self.chunks = []
+
+    versions = iter(["v1", "v2"])
+    monkeypatch.setattr(api, "_load_retriever", lambda name, **kw: Built(next(versions)))
+    monkeypatch.setattr(api, "LOADED_RETRIEVERS", {})
+    first = api.get_retriever("bm25")
+    assert api.get_retriever("bm25") is first
+
+    client = TestClient(api.app)
+    body = client.post("/index/update", json={"doc_ids": ["Doc1"], "detected_at": 0}).json()
+    assert body["retrievers"]["bm25"]["index_version"] == "v2"
+    assert body["freshness_s"] > 0
+    assert api.get_retriever("bm25").index_version == "v2"
+    assert client.get("/index").json() == {"live_updates": True, "retrievers": {"bm25": "v2"}}
+
+    # preforked (src.serve): the POST would only reach one worker
+    monkeypatch.setattr(api, "PREFORKED", True)
+    assert client.post("/index/update", json={"doc_ids": ["Doc1"]}).status_code == 409
+    assert api.get_retriever("bm25").index_version == "v2"
+
+@pytest.mark.parametrize("preload", [api.preload_retrievers, serve.build_indexes])
+def test_preload_builds_reranker_and_its_pair(monkeypatch, preload):
+    # serve.build_indexes runs it in the preforked parent: the workers' lifespan finds it cached
+    built = []
+    monkeypatch.setattr(api, "_load_retriever", lambda name, **kw: built.append(name) or DummyRetriever())
+    monkeypatch.setattr(api, "LOADED_RETRIEVERS", {})
+    monkeypatch.setattr(api, "RERANK", True)
+    monkeypatch.setattr(api, "PRELOAD_RETRIEVERS", ["bm25"])
+    monkeypatch.setattr(api, "Reranker", lambda **kw: kw)
+    api.get_reranker.cache_clear()
+    preload()
+    assert built == ["bm25", "tfidf"]
+    assert api.get_reranker.cache_info().currsize == 1
+    api.get_reranker("bm25")
+    assert api.get_reranker.cache_info().hits == 1
+    api.get_reranker.cache_clear()
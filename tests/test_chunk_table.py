@@ -0,0 +1,53 @@
+import pickle
+import zlib
+
+from src.bm25 import BM25Retriever, Chunk
+from src.chunk_table import ChunkTable, GroupTable, StringTable
+from src.retrieve import TfidfRetriever
+
+
+def _chunks():
+    return [
+        Chunk("Doc1", "d1_00001", "Set the DS20 line voltage selector to 230 V before connecting mains power."),
+        Chunk("Doc2", "d2_00002", "Die Ausgangsspannung beträgt 5 V; the Überlast relay trips at 12 A.", source="doc2.pdf"),
+        Chunk("Doc3", "d3_00003", "Replace the fuse with a 2 A slow-blow type of the same rating only."),
+    ]
+
+
+def test_string_table_looks_up_positions():
+    t = StringTable(["voltage", "Überlast", "", "fuse"])
+    assert len(t) == 4 and list(t) == ["voltage", "Überlast", "", "fuse"]
+    assert t["Überlast"] == 1 and t[""] == 2 and t.get("relay") is None and t.get(None) is None
+    assert t.string(3) == "fuse" and "fuse" in t and dict(t) == {"voltage": 0, "Überlast": 1, "": 2, "fuse": 3}
+    assert dict(pickle.loads(pickle.dumps(t))) == dict(t)
+
+
+def test_string_table_resolves_hash_collisions():
+    # "plumless" / "buckeroo" share a crc32
+    assert zlib.crc32(b"plumless") == zlib.crc32(b"buckeroo")
+    t = StringTable(["plumless", "buckeroo"])
+    assert t["plumless"] == 0 and t["buckeroo"] == 1
+
+
+def test_chunk_table_rebuilds_chunks():
+    chunks = _chunks()
+    table = ChunkTable(chunks)
+    assert len(table) == 3 and list(table) == chunks and table[-1] == chunks[2] and table[1:] == chunks[1:]
+    assert table[0].source is None and table[1].source == "doc2.pdf"
+    assert table.index_of("d2_00002") == 1 and table.index_of("nope") is None
+    assert table.text(1) == chunks[1].text and ChunkTable.of(table) is table
+
+
+def test_retrievers_share_one_chunk_table():
+    table = ChunkTable(_chunks())
+    dups = GroupTable({"d1_00001": ["d9_00001", "d9_00002"]})
+    assert dups == {"d1_00001": ["d9_00001", "d9_00002"]} and "d3_00003" not in dups
+    bm25 = BM25Retriever(table, duplicates=dups)
+    tfidf = TfidfRetriever(table, duplicates=dups)
+    assert bm25.chunks is table and tfidf.chunks is table
+
+    hits = bm25.search("DS20 line voltage", top_k=1)
+    assert hits[0]["chunk_id"] == "d1_00001" and hits[0]["duplicate_chunk_ids"] == ["d9_00001", "d9_00002"]
+    hits = tfidf.search("slow-blow fuse", top_k=1)
+    assert hits[0]["chunk_id"] == "d3_00003" and "duplicate_chunk_ids" not in hits[0]
+    assert isinstance(tfidf.vectorizer.vocabulary_, StringTable)
@@ -0,0 +1,63 @@
+from src.chunker import chunk_pages, document_text
+
+PARA = "The power supply accepts 100 to 240 VAC and must be connected before the system is powered on.\n"
+
+
+def _pages():
+    return [
+        "Chapter 1 Installation\n" + PARA * 6 + "\n- Unpack the system\n- Connect the cables\n",
+        "1.2 Power\n" + PARA * 6,
+        "Chapter 2 Console\n" + PARA * 3,
+    ]
+
+
+def test_chunks_are_exact_document_slices_without_overlap():
+    pages = _pages()
+    doc = document_text(pages)
+    rows = list(chunk_pages(pages, token_budget=200, min_tokens=50))
+    assert len(rows) > 1
+    for r in rows:
+        assert doc[r["start_char"]:r["end_char"]] == r["text"]
+    for a, b in zip(rows, rows[1:]):
+        assert a["end_char"] <= b["start_char"]
+    assert sum(len(r["text"].split()) for r in rows) == len(doc.split())
+
+
+def test_split_lines_and_merged_tails_keep_their_exact_separators():
+    # a long line cut at spaces whose short last piece merges into the previous chunk
+    doc = ("word " * 82).strip()
+    rows = list(chunk_pages([doc], token_budget=50, min_tokens=10))
+    assert len(rows) == 2
+    for r in rows:
+        assert doc[r["start_char"]:r["end_char"]] == r["text"]
+    assert rows[1]["text"].endswith("word word")
+
+    # whitespace-only lines dropped between the previous chunk and the merged tail
+    pages = [PARA * 2 + " \nshort tail"]
+    doc = document_text(pages)
+    rows = list(chunk_pages(pages, token_budget=50, min_tokens=10))
+    assert len(rows) == 1
+    assert rows[0]["text"].endswith("\n \nshort tail")
+    for r in rows:
+        assert doc[r["start_char"]:r["end_char"]] == r["text"]
+
+
+def test_headings_start_chunks_and_pages_are_tracked():
+    rows = list(chunk_pages(_pages(), token_budget=400, min_tokens=50))
+    starts = [r["text"].split("\n")[0] for r in rows]
+    assert starts == ["Chapter 1 Installation", "1.2 Power", "Chapter 2 Console"]
+    assert [(r["page_start"], r["page_end"]) for r in rows] == [(1, 1), (2, 2), (3, 3)]
+    assert rows[1]["section"] == "1.2 Power"
+
+
+def test_pages_are_consumed_lazily():
+    seen = []
+
+    def pages():
+        for i, p in enumerate(_pages() * 20):
+            seen.append(i)
+            yield p
+
+    it = chunk_pages(pages(), token_budget=200, min_tokens=50)
+    next(it)
+    assert len(seen) < 10
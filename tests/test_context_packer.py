@@ -0,0 +1,31 @@
+from src.context_packer import pack_context
+
+HITS = [
+    {"chunk_id": "c1", "doc_id": "Doc1", "text": "Unpack the unit on a flat surface. Keep the packaging for transport. "
+                                                 "The nominal input voltage is 100 to 240 VAC at 50/60 Hz. The unit draws 2 A at full load."},
+    {"chunk_id": "c2", "doc_id": "Doc2", "text": "Operating temperature is 10 to 35 C. Relative humidity must stay between 20 and 80 percent."},
+]
+
+
+def test_budget_and_anchors():
+    packed = pack_context("What is the input voltage range?", HITS, token_budget=30)
+    assert packed.tokens <= 30
+    assert packed.text.startswith("[c1]\n")
+    assert "100 to 240 VAC" in packed.text
+    assert packed.chunk_ids == ["c1"]
+    assert packed.compression_ratio > 1.0
+
+
+def test_large_budget_keeps_hit_order():
+    packed = pack_context("input voltage humidity", HITS, token_budget=1000)
+    assert packed.chunk_ids == ["c1", "c2"]
+    assert packed.text.index("[c1]") < packed.text.index("[c2]")
+
+
+def test_falls_back_to_lead_of_top_hit_when_nothing_is_selected():
+    noise = {"chunk_id": "t1", "doc_id": "Doc3",
+             "text": "| Input | 100-240 VAC |\n| Current | 2 A |\n| Frequency | 50/60 Hz |\n" * 10}
+    packed = pack_context("What is the input voltage range?", [noise, HITS[1]], token_budget=30)
+    assert packed.chunk_ids == ["t1"]
+    assert packed.text.startswith("[t1]\n| Input | 100-240 VAC |")
+    assert 0 < packed.tokens <= 30
@@ -0,0 +1,34 @@
+from src.bm25 import BM25Retriever, Chunk
+from src.dedup import collapse_chunks, collapse_near_duplicates, find_near_duplicates
+
+BOILERPLATE = (
+    "Refer servicing to qualified personnel. Disconnect the power cord before removing the cover. "
+    "This equipment generates, uses, and can radiate radio frequency energy and if not installed "
+    "and used in accordance with the instructions may cause interference to radio communications."
+)
+
+def _chunks():
+    return [
+        Chunk("Doc1", "d1_00001", BOILERPLATE + " See chapter 2 for the DS10."),
+        Chunk("Doc2", "d2_00007", "The AC input voltage range is 100 to 240 VAC at 50/60 Hz for the DS20 power supply."),
+        Chunk("Doc3", "d3_00004", BOILERPLATE + " See chapter 3 for the DS20."),
+    ]
+
+def test_find_near_duplicates_groups_boilerplate():
+    texts = [c.text for c in _chunks()]
+    assert find_near_duplicates(texts, threshold=0.7) == [[0, 2]]
+
+def test_dedup_index_keeps_one_representative():
+    kept, duplicates = collapse_chunks(_chunks(), threshold=0.7)
+    assert [c.chunk_id for c in kept] == ["d1_00001", "d2_00007"]
+
+    r = BM25Retriever(kept, duplicates=duplicates)
+    hits = r.search("qualified personnel cord", top_k=5)
+    assert [h["chunk_id"] for h in hits] == ["d1_00001"]
+    assert hits[0]["duplicate_chunk_ids"] == ["d3_00004"]
+
+def test_collapse_near_duplicates_in_results():
+    hits = [{"chunk_id": c.chunk_id, "text": c.text} for c in _chunks()]
+    out = collapse_near_duplicates(hits, threshold=0.7)
+    assert [h["chunk_id"] for h in out] == ["d1_00001", "d2_00007"]
+    assert out[0]["duplicate_chunk_ids"] == ["d3_00004"]
@@ -0,0 +1,60 @@
+import json
+
+import numpy as np
+import pytest
+
+from src.bm25 import build_bm25_retriever
+from src.eval import (
+    _GRID, EvalItem, _grid_retriever, grid_configs, ndcg_at_k, prepare_grid, recall_at_k, reciprocal_rank, run_grid,
+)
+
+ROWS = [
+    {"doc_id": "Doc1", "chunk_id": "c1", "source": "s1", "text": "This chunk explains AC voltage range and power supply input voltage."},
+    {"doc_id": "Doc2", "chunk_id": "c2", "source": "s2", "text": "This chunk describes environmental conditions for operating a server."},
+    {"doc_id": "Doc3", "chunk_id": "c3", "source": "s3", "text": "This chunk is about floppy disk eject procedure and yellow activity light."},
+]
+
+
+def _write_chunks(tmp_path):
+    p = tmp_path / "chunks.jsonl"
+    p.write_text("".join(json.dumps(r) + "\n" for r in ROWS), encoding="utf-8")
+    return p
+
+
+def test_ranking_metrics():
+    retrieved = ["a", "g1", "b", "g2"]
+    gold = ["g1", "g2"]
+    assert reciprocal_rank(retrieved, gold, 10) == 0.5
+    assert reciprocal_rank(retrieved, gold, 1) == 0.0
+    assert recall_at_k(retrieved, gold, 2) == 0.5
+    assert recall_at_k(retrieved, gold, 4) == 1.0
+    assert ndcg_at_k(["g1", "g2"], gold, 10) == pytest.approx(1.0)
+    assert 0 < ndcg_at_k(retrieved, gold, 10) < 1
+
+
+def test_bm25_with_params_matches_fresh_build(tmp_path):
+    path = str(_write_chunks(tmp_path))
+    base = build_bm25_retriever(path)
+    fresh = build_bm25_retriever(path, k1=0.9, b=0.3)
+    tuned = base.with_params(0.9, 0.3)
+    assert tuned.post_docs is base.post_docs
+    assert tuned.index_version == fresh.index_version
+    np.testing.assert_allclose(tuned.search_ids("AC input voltage", top_k=3)[1],
+                               fresh.search_ids("AC input voltage", top_k=3)[1])
+
+
+def test_run_grid_serial(tmp_path):
+    items = [EvalItem("q1", "floppy disk eject", ["c3"]), EvalItem("q2", "AC input voltage", ["c1"])]
+    configs = grid_configs(["bm25", "tfidf"], [1.2], [0.5, 0.75], [(1, 1)])
+    rows = run_grid(_write_chunks(tmp_path), items, configs, ks=[1, 3], workers=1)
+    assert len(rows) == 3 * 2
+    assert all(r["mrr"] == 1.0 and r["recall"] == 1.0 for r in rows)
+    assert {r["retriever"] for r in rows} == {"bm25", "tfidf"}
+
+
+def test_grid_retrievers_share_one_classification_and_sentence_store(tmp_path):
+    items = [EvalItem("q1", "floppy disk eject", ["c3"])]
+    configs = grid_configs(["bm25", "tfidf"], [1.2], [0.5], [(1, 1), (1, 2)])
+    prepare_grid(_write_chunks(tmp_path), items, configs, ks=[3])
+    built = [_grid_retriever(c) for c in configs]
+    assert all(r.sentences is _GRID["sentences"] and r.junk is _GRID["junk"][0] for r in built)
@@ -0,0 +1,111 @@
+import json
+
+from src import ingest
+from src.pdf_audit import save_audit
+
+PAGES = {
+    b"pdf-a": ["Installing the DS20 power supply. " * 20, "Removing the fan tray. " * 20],
+    b"pdf-b": ["Console commands for the GS80 system. " * 20],
+    b"pdf-b2": ["Console commands for the GS80 system, revised. " * 20],
+}
+
+
+def _fake_extractor(monkeypatch, calls):
+    def extract_pages(pdf_path, start, end):
+        calls.append(pdf_path)
+        with open(pdf_path, "rb") as f:
+            pages = PAGES[f.read()]
+        return pdf_path, start, pages[start:end]
+
+    def page_count(pdf_path):
+        with open(pdf_path, "rb") as f:
+            return len(PAGES[f.read()])
+
+    monkeypatch.setattr(ingest, "extract_pages", extract_pages)
+    monkeypatch.setattr(ingest, "page_count", page_count)
+
+
+def _run(tmp_path, sink=None):
+    return ingest.run_ingest(tmp_path / "raw", tmp_path / "chunks.jsonl", tmp_path / "cache",
+                             tmp_path / "manifest.json", workers=1, audit_path=tmp_path / "audit.json", sink=sink)
+
+
+def test_incremental_ingest_only_extracts_changed_pdfs(tmp_path, monkeypatch):
+    calls = []
+    _fake_extractor(monkeypatch, calls)
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    (raw / "A.pdf").write_bytes(b"pdf-a")
+    (raw / "B.pdf").write_bytes(b"pdf-b")
+
+    r = _run(tmp_path)
+    assert r.added == ["A", "B"] and r.pages_extracted == 3
+    first = [json.loads(l) for l in (tmp_path / "chunks.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert [c["chunk_id"] for c in first if c["doc_id"] == "A"][0] == "A_00000"
+
+    calls.clear()
+    sent = {}
+    r = _run(tmp_path, sink=sent.__setitem__)
+    assert r.unchanged == ["A", "B"] and calls == [] and sent == {}
+    # unchanged documents are copied over, not re-chunked
+    assert r.chunks_rechunked == 0 and r.chunks_written == len(first)
+    assert (tmp_path / "chunks.jsonl").read_text(encoding="utf-8").splitlines() == [json.dumps(c) for c in first]
+
+    (raw / "B.pdf").write_bytes(b"pdf-b2")
+    r = _run(tmp_path, sink=sent.__setitem__)
+    assert r.changed == ["B"] and r.unchanged == ["A"]
+    assert calls == [str(raw / "B.pdf")]
+    assert list(sent) == ["B"] and {row["doc_id"] for row in sent["B"]} == {"B"}
+    assert r.chunks_rechunked == len(sent["B"])
+
+    (raw / "A.pdf").unlink()
+    sent.clear()
+    r = _run(tmp_path, sink=sent.__setitem__)
+    assert r.removed == ["A"] and sent == {"A": []}
+    rows = [json.loads(l) for l in (tmp_path / "chunks.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert {c["doc_id"] for c in rows} == {"B"}
+
+
+def test_audited_needs_ocr_pdfs_are_skipped_unopened(tmp_path, monkeypatch):
+    calls = []
+    _fake_extractor(monkeypatch, calls)
+    monkeypatch.setattr(ingest, "page_count", lambda p: (_ for _ in ()).throw(AssertionError(p)))
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    (raw / "A.pdf").write_bytes(b"pdf-a")
+    (raw / "B.pdf").write_bytes(b"pdf-b")
+    audit = []
+    for name, status, pages in [("A.pdf", "OK", 2), ("B.pdf", "NEEDS_OCR", 1)]:
+        p = raw / name
+        audit.append({"pdf": name, "sha256": ingest.file_sha256(p), "size": p.stat().st_size,
+                      "mtime_ns": p.stat().st_mtime_ns, "pages": pages, "status": status})
+    save_audit(audit, tmp_path / "audit.json")
+
+    r = _run(tmp_path)
+    assert r.added == ["A"] and r.needs_ocr == ["B"]
+    assert calls == [str(raw / "A.pdf")]
+    rows = [json.loads(l) for l in (tmp_path / "chunks.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert {c["doc_id"] for c in rows} == {"A"}
+
+
+def test_documents_without_a_pdf_are_carried_over_unless_pruned(tmp_path, monkeypatch):
+    _fake_extractor(monkeypatch, [])
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    (raw / "A.pdf").write_bytes(b"pdf-a")
+    legacy = [{"doc_id": "Notes", "source": "data_text\\Notes.txt", "chunk_id": f"Notes_{j:05d}", "text": "x" * 300}
+              for j in range(2)]
+    ingest.write_chunks(legacy + [{"doc_id": "A", "source": "old", "chunk_id": "A_00000", "text": "old"}],
+                        tmp_path / "chunks.jsonl")
+
+    r = _run(tmp_path)
+    assert r.added == ["A"] and r.carried == ["Notes"] and r.removed == []
+    rows = [json.loads(l) for l in (tmp_path / "chunks.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert [c for c in rows if c["doc_id"] == "Notes"] == legacy
+    assert all(c["source"] != "old" for c in rows if c["doc_id"] == "A")
+
+    r = ingest.run_ingest(raw, tmp_path / "chunks.jsonl", tmp_path / "cache", tmp_path / "manifest.json",
+                          workers=1, audit_path=None, prune=True)
+    assert r.removed == ["Notes"] and r.carried == []
+    rows = [json.loads(l) for l in (tmp_path / "chunks.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert {c["doc_id"] for c in rows} == {"A"}
@@ -0,0 +1,46 @@
+import pytest
+import requests
+
+from src.llm_client import LLMClient
+from src.mock_ollama import MockConfig, start_mock_server
+
+
+def _client(url, **kw):
+    return LLMClient(base_url=url, model="mock", options={"num_predict": 5}, backoff_s=0.0, **kw)
+
+
+def test_generate_against_mock():
+    server, url = start_mock_server(config=MockConfig(time_scale=0))
+    try:
+        data = _client(url).generate("Context:\n[c1]\nThe unit runs on 100 to 240 VAC.\n\nQuestion: voltage?")
+        assert data["eval_count"] == 5
+        assert data["load_duration"] > 0 and data["prompt_eval_count"] > 0
+        assert "[c1]" in data["response"]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_retries_503_then_gives_up():
+    server, url = start_mock_server(config=MockConfig(time_scale=0, fail_first=2))
+    try:
+        assert _client(url, retries=2).generate_text("hi")
+        assert server.state.requests == 3
+
+        server.state.config.fail_first = 10
+        with pytest.raises(requests.HTTPError) as e:
+            _client(url, retries=1).generate("hi")
+        assert e.value.response.status_code == 503
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_batch_keeps_order():
+    server, url = start_mock_server(config=MockConfig(time_scale=0, parallel=2))
+    try:
+        out = _client(url).generate_batch([f"[c{i}] prompt" for i in range(4)], max_workers=4)
+        assert [f"[c{i}]" in d["response"] for i, d in enumerate(out)] == [True] * 4
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,93 @@
+import threading
+import time
+import pytest
+from fastapi.testclient import TestClient
+import src.api as api
+import src.llm_gate as llm_gate
+import src.llm_ollama as llm_ollama
+from src.llm_gate import LLMBusy, LLMGate
+
+class DummyRetriever:
+    def search(self, q: str, top_k: int = 5):
+        return [{"doc_id": "Doc1", "chunk_id": "c1", "score": 1.0, "text": "AC voltage range is 100-240V.", "source": "s1"}]
+
+def test_gate_rejects_when_queue_full():
+    gate = LLMGate(max_concurrency=1, max_queue=0, initial_service_s=1.0)
+    entered, release = threading.Event(), threading.Event()
+
+    def hold():
+        with gate.slot():
+            entered.set()
+            release.wait(5)
+
+    t = threading.Thread(target=hold)
+    t.start()
+    entered.wait(5)
+    with pytest.raises(LLMBusy) as e:
+        with gate.slot():
+            pass
+    assert e.value.reason == "queue_full"
+    release.set()
+    t.join()
+
+def test_gate_rejects_over_budget_before_queueing():
+    gate = LLMGate(initial_service_s=20.0)
+    with pytest.raises(LLMBusy) as e:
+        with gate.slot(latency_budget_s=5.0):
+            pass
+    assert e.value.reason == "expected_wait"
+
+def test_preforked_workers_split_the_gate_limits(monkeypatch):
+    monkeypatch.setenv("RAG_LLM_CONCURRENCY", "4")
+    monkeypatch.setenv("RAG_LLM_MAX_QUEUE", "8")
+    monkeypatch.setattr(llm_gate, "_GATE", None)
+    assert (llm_gate.get_llm_gate().max_concurrency, llm_gate.get_llm_gate().max_queue) == (4, 8)
+
+    # src.serve --workers 4: the limits are for the whole server
+    monkeypatch.setenv("RAG_PREFORKED", "1")
+    monkeypatch.setenv("RAG_PREFORKED_WORKERS", "4")
+    monkeypatch.setattr(llm_gate, "_GATE", None)
+    gate = llm_gate.get_llm_gate()
+    assert (gate.max_concurrency, gate.max_queue) == (1, 2)
+
+def test_gate_admits_until_service_time_is_measured():
+    gate = LLMGate(ewma_alpha=1.0)
+    with gate.slot(latency_budget_s=0.5):
+        time.sleep(0.05)
+    assert gate.samples == 1 and 0.05 <= gate.avg_service_s < 0.5
+    with gate.slot(latency_budget_s=0.5):
+        pass
+    gate.avg_service_s = 1.0
+    with pytest.raises(LLMBusy) as e:
+        with gate.slot(latency_budget_s=0.5):
+            pass
+    assert e.value.reason == "expected_wait"
+
+def _setup(monkeypatch, gate):
+    monkeypatch.setattr(api, "get_retriever", lambda name: DummyRetriever())
+    monkeypatch.setattr(api, "get_llm_gate", lambda: gate)
+    monkeypatch.setattr(llm_ollama, "get_answer_cache", lambda: None)
+    monkeypatch.setattr(llm_ollama, "ask_ollama", lambda prompt, model=None: "from llm")
+    return TestClient(api.app)
+
+def test_query_degrades_to_extractive_when_over_budget(monkeypatch):
+    client = _setup(monkeypatch, LLMGate(initial_service_s=60.0))
+    payload = {"question": "What AC voltage range?", "retriever": "bm25", "mode": "llm", "latency_budget_s": 2.0}
+    body = client.post("/query", json=payload).json()
+    assert body["degraded"] is True
+    assert body["degrade_reason"] == "expected_wait"
+    assert "[c1]" in body["answer"]
+
+def test_query_returns_429_without_fallback(monkeypatch):
+    client = _setup(monkeypatch, LLMGate(initial_service_s=60.0))
+    payload = {"question": "What AC voltage range?", "retriever": "bm25", "mode": "llm",
+               "latency_budget_s": 2.0, "allow_fallback": False}
+    resp = client.post("/query", json=payload)
+    assert resp.status_code == 429
+    assert "retry-after" in resp.headers
+
+def test_query_uses_llm_within_budget(monkeypatch):
+    client = _setup(monkeypatch, LLMGate(initial_service_s=0.1))
+    payload = {"question": "What AC voltage range?", "retriever": "bm25", "mode": "llm", "latency_budget_s": 30}
+    body = client.post("/query", json=payload).json()
+    assert body["answer"] == "from llm" and body["degraded"] is False
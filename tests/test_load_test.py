@@ -0,0 +1,66 @@
+import socket
+import threading
+import time
+
+import uvicorn
+
+import src.api as api
+import src.llm_ollama as llm_ollama
+from scripts.load_test import Runner, pct, run_closed, summarize
+from src.llm_client import LLMClient, set_llm_client
+from src.llm_gate import LLMGate
+from src.mock_ollama import MockConfig, start_mock_server
+
+
+class DummyRetriever:
+    def search(self, q: str, top_k: int = 5):
+        return [{"doc_id": "Doc1", "chunk_id": "c1", "score": 1.0, "text": "AC voltage range is 100-240V.", "source": "s1"}]
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_pct_interpolates():
+    assert pct([], 0.5) is None
+    assert pct([4, 1, 3, 2], 0.5) == 2.5
+    assert pct([1, 2, 3, 4], 0.0) == 1 and pct([1, 2, 3, 4], 1.0) == 4
+
+
+def test_load_generator_against_mock_llm(monkeypatch):
+    mock, mock_url = start_mock_server(config=MockConfig(time_scale=0))
+    set_llm_client(LLMClient(base_url=mock_url, model="mock", options={"num_predict": 5}, backoff_s=0.0))
+    monkeypatch.setattr(api, "get_retriever", lambda name: DummyRetriever())
+    monkeypatch.setattr(api, "get_llm_gate", lambda: LLMGate())
+    monkeypatch.setattr(llm_ollama, "get_answer_cache", lambda: None)
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(api.app, host="127.0.0.1", port=port, log_level="warning"))
+    t = threading.Thread(target=server.run, daemon=True)
+    t.start()
+    try:
+        deadline = time.time() + 10
+        while not server.started and time.time() < deadline:
+            time.sleep(0.02)
+        assert server.started
+
+        runner = Runner(f"http://127.0.0.1:{port}", timeout=10, trace=True, pool=2, extra={})
+        t0 = time.perf_counter()
+        results = run_closed(runner, ["What AC voltage range?", "AC voltage?"], "bm25", "llm",
+                             concurrency=2, n_requests=6, duration=None)
+        s = summarize(results, time.perf_counter() - t0)
+    finally:
+        server.should_exit = True
+        t.join(10)
+        mock.shutdown()
+        mock.server_close()
+        set_llm_client(None)
+
+    assert s["requests"] == 6 and s["ok"] == 6
+    assert s["error_rate"] == 0 and s["errors"] == {}
+    assert s["p50_ms"] <= s["p95_ms"] <= s["p99_ms"] <= s["max_ms"]
+    assert s["server_p50_ms"] is not None and s["throughput_rps"] > 0
+    assert s["answered_by"] == {"llm": 6} and s["degraded_rate"] == 0
+    assert mock.state.requests == 6
+    assert s["stages"] and all(v["n"] == 6 for v in s["stages"].values())
@@ -0,0 +1,53 @@
+import sys
+import types
+
+from src import pdf_audit
+
+
+class _Page:
+    def __init__(self, text, opened):
+        self.text = text
+        self.opened = opened
+
+    def extract_text(self):
+        self.opened.append(self.text)
+        return self.text
+
+    def close(self):
+        pass
+
+
+def _fake_pdfplumber(monkeypatch, docs, opened):
+    class _Pdf:
+        def __init__(self, path):
+            self.pages = [_Page(t, opened) for t in docs[path.read_bytes()]]
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+    monkeypatch.setitem(sys.modules, "pdfplumber", types.SimpleNamespace(open=_Pdf))
+
+
+def test_audit_stops_at_threshold_and_reuses_unchanged_rows(tmp_path, monkeypatch):
+    opened = []
+    docs = {b"text": ["", "x" * 150, "y" * 150, "z" * 150], b"scan": ["", "", ""]}
+    _fake_pdfplumber(monkeypatch, docs, opened)
+    (tmp_path / "a.pdf").write_bytes(b"text")
+    (tmp_path / "b.pdf").write_bytes(b"scan")
+    pdfs = sorted(tmp_path.glob("*.pdf"))
+
+    a, b = pdf_audit.run_audit(pdfs, workers=1, min_chars=200)
+    assert a["status"] == "OK" and a["pages"] == 4 and a["chars_per_page"] == [0, 150, 150]
+    assert b["status"] == "NEEDS_OCR" and b["pages_checked"] == 3
+    assert len(opened) == 6
+
+    pdf_audit.save_audit([a, b], tmp_path / "audit.json")
+    previous = pdf_audit.load_audit(tmp_path / "audit.json")
+    opened.clear()
+    assert pdf_audit.run_audit(pdfs, workers=1, min_chars=200, previous=previous) == [a, b]
+    assert opened == []
+    assert pdf_audit.audit_entry(previous, pdfs[1])["status"] == "NEEDS_OCR"
+    assert pdf_audit.audit_entry(previous, pdfs[1], sha256="other") is None
@@ -1,5 +1,45 @@
-from src.query_utils import normalize_and_expand_query
+from src.bm25 import BM25Index
+from src.mine_expansions import acronym_rules, mine_acronyms
+from src.query_utils import ExpansionMatcher, expand_query, normalize_and_expand_query
 
 def test_query_expansion_adds_synonyms():
     q = normalize_and_expand_query("AC voltage")
     assert "input voltage" in q or "vac" in q
+
+def test_matcher_finds_overlapping_phrases_in_one_pass():
+    m = ExpansionMatcher([
+        ("logical storage manager", ["lsm"], 0.5),
+        ("storage manager", ["volume manager"], 0.5),
+        ("manager", ["mgr"], 0.3),
+        ("storage unit", ["su"], 0.5),
+    ])
+    matched = m.match("configure the logical storage manager".split())
+    assert sorted(m.phrases[i] for i in matched) == ["logical storage manager", "manager", "storage manager"]
+    assert m.match("storage storage unit".split()) == [3]
+
+    eq = expand_query("Configure the A/C logical storage manager", matcher=m)
+    assert eq.text == "configure the ac logical storage manager"
+    assert eq.expansions == (("lsm", 0.5), ("volume manager", 0.5), ("mgr", 0.3))
+
+def test_expansion_weights_scale_bm25_contributions():
+    index = BM25Index([["power", "supply"], ["psu"], ["fan"]])
+    cand, full = index.score_terms(["power", "psu"])
+    _, weighted = index.score_terms(["power", "psu"], weights=[1.0, 0.5])
+    assert cand.tolist() == [0, 1]
+    assert weighted[0] == full[0] and abs(weighted[1] - 0.5 * full[1]) < 1e-12
+
+def test_mined_acronyms_expand_both_ways_when_unambiguous():
+    texts = [
+        "Use the Logical Storage Manager (LSM) to mirror disks. LSM volumes ...",
+        "The system control block (SCB) and the storage control block (SCB) differ.",
+        "The Versatile Interface Adaptor (VIA) is reached via the bus.",
+    ]
+    acronyms = mine_acronyms(texts, min_count=1)
+    assert set(acronyms) == {"lsm", "scb"}
+    rules = {(r["match"], tuple(r["expand"])) for r in acronym_rules(acronyms)}
+    assert ("logical storage manager", ("lsm",)) in rules and ("lsm", ("logical storage manager",)) in rules
+    assert ("system control block", ("scb",)) in rules and not any(m == "scb" for m, _ in rules)
+
+    # by default an acronym needs two definitions; hand-excluded acronyms get no rules
+    assert set(mine_acronyms(texts)) == {"scb"}
+    assert not any("lsm" in r["expand"] or r["match"] == "lsm" for r in acronym_rules(acronyms, exclude=["LSM"]))
@@ -0,0 +1,42 @@
+import numpy as np
+
+from src.bm25 import BM25Retriever, Chunk
+from src.rerank import Reranker
+from src.retrieve import TfidfRetriever
+
+CHUNKS = [
+    Chunk("Doc1", "c1", "Power cords. Use the power cord supplied. The supply voltage label is on the rear panel, "
+                        "next to the fan. Check the voltage before connecting power."),
+    Chunk("Doc2", "c2", "Input voltage\nThe nominal input voltage is 100 to 240 VAC at 50/60 Hz."),
+    Chunk("Doc3", "c3", "Floppy disc eject procedure and the yellow activity light."),
+]
+
+
+def _hits(order):
+    return [{"chunk_id": c.chunk_id, "doc_id": c.doc_id, "text": c.text, "score": 1.0} for c in (CHUNKS[i] for i in order)]
+
+
+def test_rerank_prefers_phrase_and_heading_match():
+    rr = Reranker(bm25=BM25Retriever(CHUNKS), tfidf=TfidfRetriever(CHUNKS))
+    out = rr.rerank("What is the nominal input voltage?", _hits([0, 2, 1]), top_k=2)
+    assert [h["chunk_id"] for h in out] == ["c2", "c1"]
+    assert out[0]["rerank_score"] > out[1]["rerank_score"]
+
+
+def test_exhausted_budget_keeps_retrieval_order():
+    rr = Reranker()
+    out = rr.rerank("nominal input voltage", _hits([0, 2, 1]), top_k=3, budget_s=0.0)
+    assert [h["chunk_id"] for h in out] == ["c1", "c3", "c2"]
+
+
+def test_pool_features_match_per_hit_features():
+    rr = Reranker(bm25=BM25Retriever(CHUNKS))
+    query = "What is the nominal input voltage at the rear panel?"
+    indexed, _ = rr.features(query, _hits([0, 1, 2]))
+    # chunk ids the index doesn't know are featurized from the hit text instead
+    unknown = [dict(h, chunk_id=h["chunk_id"] + "_x") for h in _hits([0, 1, 2])]
+    from_text, _ = Reranker().features(query, unknown)
+    np.testing.assert_allclose(indexed[:, 2:6], from_text[:, 2:6])
+    assert indexed[1, 4] > 0 and indexed[1, 5] > 0
+    # proximity comes from the index's token id sequences, matching the text's
+    assert indexed[0, 3] > 0 and indexed[1, 3] > indexed[0, 3]
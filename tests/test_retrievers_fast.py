@@ -1,6 +1,13 @@
+import pytest
 import json
+import os
+import signal
 from src.bm25 import build_bm25_retriever
 from src.retrieve import build_retriever
+from src.retrieval_cache import CachedRetriever
+from src.metrics import QUERY_POSTINGS, STAGE_SECONDS
+from src.tracing import start_trace
+from src.retrieval_pool import _SHARED, PooledRetriever, _search_ids, fork_available
 
 def _write_chunks(tmp_path):
     p = tmp_path / "chunks.jsonl"
@@ -26,4 +33,161 @@ def test_tfidf_returns_results_on_tiny_corpus(tmp_path):
     r = build_retriever(chunks_path)
     hits = r.search("environmental conditions operating", top_k=3)
     assert len(hits) > 0
-    assert hits[0]["chunk_id"]
\ No newline at end of file
+    assert hits[0]["chunk_id"]
+
+def test_cached_retriever_shares_normalized_variants(tmp_path):
+    chunks_path = _write_chunks(tmp_path)
+    r = CachedRetriever(build_bm25_retriever(chunks_path), "bm25")
+    first = r.search("A/C voltage input", top_k=3)
+    second = r.search("  input   ac VOLTAGE ", top_k=3)
+    assert [h["chunk_id"] for h in first] == [h["chunk_id"] for h in second]
+    assert r.stats()["hits"] == 1 and r.stats()["misses"] == 1
+
+def test_cached_retriever_drops_entries_on_index_version_change(tmp_path):
+    chunks_path = _write_chunks(tmp_path)
+    r = CachedRetriever(build_retriever(chunks_path), "tfidf")
+    r.search("environmental conditions", top_k=3)
+    r.retriever.index_version = "rebuilt"
+    r.search("environmental conditions", top_k=3)
+    assert r.stats()["hits"] == 0 and r.stats()["entries"] == 1
+
+def test_cached_retriever_stores_ids_not_hit_dicts(tmp_path):
+    chunks_path = _write_chunks(tmp_path)
+    r = CachedRetriever(build_bm25_retriever(chunks_path), "bm25")
+    first = r.search("floppy disk", top_k=3)
+    first[0]["text"] = "mutated"
+    second = r.search("floppy disk", top_k=3)
+    assert second[0]["chunk_id"] == "c3" and "floppy" in second[0]["text"]
+    (idxs, scores), = r._entries.values()
+    assert list(idxs) == [2] and list(scores) == [second[0]["score"]]
+
+def test_bm25_trace_records_posting_lengths(tmp_path):
+    chunks_path = _write_chunks(tmp_path)
+    r = build_bm25_retriever(chunks_path)
+    with start_trace() as trace:
+        r.search("floppy disk", top_k=3)
+    info = trace.to_dict()
+    assert info["posting_lengths"]["floppy"] == 1
+    assert info["candidates_scored"] == 1
+    assert [s["stage"] for s in info["stages"]] == ["query_expansion", "scoring"]
+
+def test_bm25_query_plan_collapses_and_prunes_terms(tmp_path):
+    chunks_path = _write_chunks(tmp_path)
+    r = build_bm25_retriever(chunks_path)
+    # default: only duplicates are merged, so scores are unchanged
+    plan = r.plan_query(["this", "chunk", "voltage", "power", "voltage", "unseen"], [1.0, 1.0, 1.0, 1.0, 0.5, 1.0])
+    assert plan.terms == ["voltage", "power", "this", "chunk"] and plan.weights == [1.5, 1.0, 1.0, 1.0]
+    assert plan.dropped == [] and plan.postings_saved == 1
+
+    r.max_df_ratio = 0.5
+    plan = r.plan_query(["this", "chunk", "voltage", "power", "voltage", "unseen"], [1.0, 1.0, 1.0, 1.0, 0.5, 1.0])
+    assert plan.terms == ["voltage", "power"] and plan.weights == [1.5, 1.0]
+    assert plan.dropped == ["this", "chunk"]
+    assert plan.postings == 2 and plan.postings_saved == 7
+
+    # only over-the-cutoff terms in the query: nothing is dropped
+    assert r.plan_query(["this", "chunk"]).terms == ["this", "chunk"]
+
+def test_bm25_scores_pruned_terms_when_top_k_is_short(tmp_path):
+    chunks_path = _write_chunks(tmp_path)
+    r = build_bm25_retriever(chunks_path)
+    r.max_df_ratio = 0.5
+    with start_trace() as trace:
+        assert [h["chunk_id"] for h in r.search("this chunk floppy", top_k=1)] == ["c3"]
+    assert trace.to_dict()["query_plan"]["dropped"] == ["this", "chunk"]
+    with start_trace() as trace:
+        assert len(r.search("this chunk floppy", top_k=3)) == 3
+    assert trace.to_dict()["query_plan"]["fallback"]
+
+def test_bm25_metrics_use_the_retriever_name(tmp_path):
+    r = build_bm25_retriever(_write_chunks(tmp_path))
+    r.name = "bm25_sql"
+    before = QUERY_POSTINGS.value(retriever="bm25_sql", kind="scored")
+    r.search("floppy", top_k=1)
+    assert QUERY_POSTINGS.value(retriever="bm25_sql", kind="scored") == before + 1
+
+@pytest.mark.skipif(not fork_available(), reason="needs fork start method")
+def test_pooled_retriever_matches_in_process_search(tmp_path):
+    chunks_path = _write_chunks(tmp_path)
+    r = build_bm25_retriever(chunks_path)
+    pooled = PooledRetriever(r, "bm25_test", workers=2)
+    try:
+        assert pooled.search("AC voltage input", top_k=3) == r.search("AC voltage input", top_k=3)
+    finally:
+        pooled.close()
+
+@pytest.mark.skipif(not fork_available(), reason="needs fork start method")
+def test_pooled_retriever_close_waits_for_in_flight_searches(tmp_path):
+    r = build_bm25_retriever(_write_chunks(tmp_path))
+    pooled = PooledRetriever(r, "bm25_close_test", workers=1)
+    with pooled._lock:
+        pooled._active += 1  # a search holding the old retriever is still in the pool
+    pooled.close()
+    assert _SHARED.get("bm25_close_test") is r
+    # searches that arrive after the swap run in-process instead of raising
+    assert pooled.search("floppy", top_k=1) == r.search("floppy", top_k=1)
+    pooled._done()
+    assert "bm25_close_test" not in _SHARED
+
+def test_exclude_junk_fills_top_k_with_clean_hits(tmp_path):
+    chunks_path = _write_chunks(tmp_path)
+    with open(chunks_path, "a", encoding="utf-8") as f:
+        toc = "Contents\nAC voltage ....... 2-1\nInput voltage ....... 2-3\nPower supply ....... 2-5"
+        f.write(json.dumps({"doc_id": "Doc4", "chunk_id": "toc", "source": "s4", "text": toc}) + "\n")
+
+    for build in (build_bm25_retriever, build_retriever):
+        r = build(chunks_path, exclude_junk=True)
+        assert r.junk_signals[3] == ("contents_or_index", "dot_leaders")
+        hits = r.search("chunk AC voltage power supply", top_k=3)
+        assert len(hits) == 3
+        assert "toc" not in [h["chunk_id"] for h in hits]
+        assert not any(h["junk"] for h in hits)
+
+def test_section_refs_keep_their_capital_prefix():
+    from src.junk import junk_signals
+    refs = " ".join(f"B{i}-{i + 1}" for i in range(8))
+    assert junk_signals("See also " + refs) == ["section_refs"]
+
+@pytest.mark.skipif(not fork_available(), reason="needs fork start method")
+def test_pool_recovers_from_a_dead_worker(tmp_path):
+    r = build_bm25_retriever(_write_chunks(tmp_path))
+    pooled = PooledRetriever(r, "bm25_broken_test", workers=1)
+    broken = pooled._pool
+    for pid in list(broken._processes):
+        os.kill(pid, signal.SIGKILL)
+    # this search runs in-process, the next ones in a fresh pool
+    assert pooled.search("floppy", top_k=1) == r.search("floppy", top_k=1)
+    assert pooled._pool is not broken
+    assert pooled.search("floppy", top_k=1) == r.search("floppy", top_k=1)
+    pooled.close()
+
+@pytest.mark.skipif(not fork_available(), reason="needs fork start method")
+def test_pool_forked_while_a_metrics_lock_is_held(tmp_path):
+    r = build_bm25_retriever(_write_chunks(tmp_path))
+    # as if a request thread was inside STAGE_SECONDS.observe when /index/update forked
+    with STAGE_SECONDS._lock:
+        pooled = PooledRetriever(r, "bm25_fork_test", workers=1)
+    try:
+        idxs = pooled._pool.submit(_search_ids, "bm25_fork_test", "floppy", 1).result(timeout=30)[0]
+        assert list(idxs) == r.search_ids("floppy", top_k=1)[0]
+    finally:
+        pooled.close()
+
+@pytest.mark.skipif(not fork_available(), reason="needs fork start method")
+def test_pooled_search_records_worker_stats_in_the_parent(tmp_path):
+    r = build_bm25_retriever(_write_chunks(tmp_path))
+    r.name = "bm25_pool_stats"
+    with start_trace() as local:
+        r.search_ids("AC voltage input", top_k=2)
+    pooled = PooledRetriever(r, "bm25_pool_stats", workers=1)
+    try:
+        scored = QUERY_POSTINGS.value(retriever="bm25_pool_stats", kind="scored")
+        scoring = STAGE_SECONDS.count(stage="scoring", retriever="bm25_pool_stats")
+        with start_trace() as trace:
+            pooled.search_ids("AC voltage input", top_k=2)
+    finally:
+        pooled.close()
+    assert QUERY_POSTINGS.value(retriever="bm25_pool_stats", kind="scored") == scored + local.info["query_plan"]["postings"]
+    assert STAGE_SECONDS.count(stage="scoring", retriever="bm25_pool_stats") == scoring + 1
+    assert trace.info == local.info
+    assert [s["stage"] for s in trace.stages] == ["query_expansion", "scoring"]
@@ -0,0 +1,57 @@
+from src.bm25 import Chunk
+from src.spec_index import SpecIndex, answer_from_spec_index, extract_specs
+
+TABLE = """Electrical (Power Supplies are universal, PFC, auto-ranging, 100/240 VAC)
+Nominal Voltage (VAC) 100 to 120 VAC 220 to 240 VAC
+Operating Voltage Range (VAC) 90 to 128 VAC 180 to 256 VAC
+Nominal Frequency (Hz) 60 Hz 50 Hz
+Temperature
+Operating 50° to 104°F/10° to 40°C"""
+
+CHUNKS = [
+    Chunk("Compaq AlphaServer DS20 QuickSpecs (2000)", "ds20_1", TABLE),
+    Chunk("Compaq AlphaServer DS10 QuickSpecs (2001)", "ds10_1",
+          "Nominal Voltage (Vac) 100 to 120Vac / 220 Vac\nNominal Frequency (Hz) 60 Hz 50 Hz"),
+]
+
+
+def test_extract_specs_rows():
+    facts = extract_specs("Doc", "c1", TABLE)
+    nominal = [f for f in facts if f.label == "Nominal Voltage (VAC)"]
+    assert [(f.low, f.high, f.unit) for f in nominal] == [(100, 120, "VAC"), (220, 240, "VAC")]
+    temps = [f.value for f in facts if f.quantity == "temperature"]
+    assert temps == ["50° to 104°F", "10° to 40°C"]
+
+
+def test_lookup_matches_entity_and_label():
+    index = SpecIndex(CHUNKS)
+    out = answer_from_spec_index("What is the operating voltage range for the Compaq AlphaServer DS20?", index)
+    assert out["citations"] == ["ds20_1"]
+    assert out["answer"].startswith("Operating Voltage Range (VAC): 90 to 128 VAC, 180 to 256 VAC")
+
+    out = answer_from_spec_index("What is the nominal AC voltage of the DS10?", index)
+    assert out["citations"] == ["ds10_1"]
+
+    # unknown model, or not a spec question -> fall back to retrieval
+    assert answer_from_spec_index("What is the nominal voltage of the GS80?", index) is None
+    assert answer_from_spec_index("How do you unpack the DS20?", index) is None
+
+
+def test_lookup_needs_more_than_the_quantity_word():
+    index = SpecIndex(CHUNKS)
+    # "frequency" alone matches the power supply row; "processor" matches nothing
+    assert answer_from_spec_index("What is the frequency of the DS10 processor?", index) is None
+    out = answer_from_spec_index("What is the nominal frequency of the DS10?", index)
+    assert out["answer"].startswith("Nominal Frequency (Hz): 60 Hz, 50 Hz")
+    # entity + quantity only: the quantity words are the label to match
+    out = answer_from_spec_index("What is the frequency of the DS10?", index)
+    assert out["citations"] == ["ds10_1"]
+
+
+def test_lookup_skips_junk_chunks():
+    toc = Chunk("Compaq AlphaServer DS20 QuickSpecs (2000)", "ds20_toc", "Operating Voltage Range (VAC) ..... 12 VAC")
+    index = SpecIndex([toc] + CHUNKS, skip=[True, False, False])
+    assert len(index) == len(SpecIndex(CHUNKS))
+    out = answer_from_spec_index("What is the operating voltage range for the Compaq AlphaServer DS20?", index)
+    assert out["citations"] == ["ds20_1"]
+    assert index.chunks.index_of("ds20_1") == 1
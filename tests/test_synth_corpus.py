@@ -0,0 +1,33 @@
+from src.bm25 import BM25Retriever, Chunk
+from src.synth_corpus import CorpusProfile, synthesize
+
+TEXTS = [
+    "The AC input voltage range is 100 to 240 VAC at 50/60 Hz.\nSee the power supply section.",
+    "Remove the cover before replacing the fan.\nDisconnect the power cord first.",
+    "The DS20 system supports up to 2 GB of memory.\nInstall memory in pairs.",
+    "Set the console to auto boot.\nType boot and press Return at the prompt.",
+]
+
+
+def _profile():
+    return CorpusProfile.from_chunks([Chunk(f"Doc{i // 2}", f"d{i}", t) for i, t in enumerate(TEXTS)])
+
+
+def test_synthesize_is_deterministic_and_uses_profile_lengths():
+    p = _profile()
+    a = list(synthesize(p, 20, seed=1))
+    b = list(synthesize(p, 20, seed=1))
+    assert [c.text for c in a] == [c.text for c in b]
+    assert len({c.chunk_id for c in a}) == 20
+    assert {len(c.text.split()) for c in a} <= set(p.chunk_lens.tolist())
+
+
+def test_synthetic_vocabulary_keeps_growing():
+    p = _profile()
+    small = {w for c in synthesize(p, 10) for w in c.text.split()}
+    large = {w for c in synthesize(p, 200) for w in c.text.split()}
+    assert len(large) > len(small) > 0
+    assert len(large) > len(p.words)
+
+    r = BM25Retriever(list(synthesize(p, 50)))
+    assert r.N == 50
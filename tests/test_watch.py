@@ -0,0 +1,91 @@
+import pytest
+
+from src import ingest, watch
+
+
+class _Resp:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"retrievers": {}, "answers_invalidated": 0}
+
+
+def test_process_changes_notifies_api_only_when_chunks_change(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "page_count", lambda p: 1)
+    monkeypatch.setattr(ingest, "extract_pages",
+                        lambda p, start, end: (p, start, ["Replacing the DS20 power supply. " * 20]))
+    posts = []
+    monkeypatch.setattr(watch.requests, "post", lambda url, json, timeout: posts.append((url, json)) or _Resp(json))
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    (raw / "A.pdf").write_bytes(b"pdf-a")
+
+    def run():
+        return watch.process_changes(raw, tmp_path / "chunks.jsonl", tmp_path / "cache", tmp_path / "manifest.json",
+                                     audit_path=None, workers=1, api_url="http://api", detected_at=123.0)
+
+    report = run()
+    assert report["added"] == ["A"] and report["freshness_s"] > 0
+    assert posts == [("http://api/index/update", {"doc_ids": ["A"], "retrievers": None, "detected_at": 123.0})]
+
+    assert run() is None and len(posts) == 1
+
+    (raw / "A.pdf").unlink()
+    assert run()["removed"] == ["A"]
+    assert posts[-1][1]["doc_ids"] == ["A"]
+
+
+def _watch_polls(monkeypatch, n):
+    class Stop(Exception):
+        pass
+
+    polls = []
+
+    def sleep(s):
+        polls.append(s)
+        if len(polls) > n:
+            raise Stop
+
+    monkeypatch.setattr(watch.time, "sleep", sleep)
+    return Stop
+
+
+def test_watch_catches_up_from_the_manifest_and_skips_an_unchanged_tree(tmp_path, monkeypatch):
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    (raw / "A.pdf").write_bytes(b"pdf-a")
+    st = (raw / "A.pdf").stat()
+    ingest.save_manifest({"A.pdf": {"sha256": "x", "size": st.st_size, "mtime_ns": st.st_mtime_ns}},
+                         tmp_path / "manifest.json")
+    calls = []
+    monkeypatch.setattr(watch, "process_changes", lambda *a, **kw: calls.append(kw))
+
+    Stop = _watch_polls(monkeypatch, 3)
+    with pytest.raises(Stop):
+        watch.watch(raw, interval_s=0.01, log_path=tmp_path / "log.jsonl",
+                    manifest_path=tmp_path / "manifest.json", api_url=None)
+    assert calls == []
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["manifest.json", "raw"]
+
+    # added while the watcher was down: picked up once the directory is stable
+    (raw / "B.pdf").write_bytes(b"pdf-b")
+    Stop = _watch_polls(monkeypatch, 3)
+    with pytest.raises(Stop):
+        watch.watch(raw, interval_s=0.01, log_path=None, manifest_path=tmp_path / "manifest.json", api_url=None)
+    assert len(calls) == 1
+
+
+def test_watch_refuses_a_preforked_server(monkeypatch):
+    class Info:
+        status_code = 200
+
+        def json(self):
+            return {"live_updates": False, "retrievers": {}}
+
+    monkeypatch.setattr(watch.requests, "get", lambda url, timeout: Info())
+    with pytest.raises(SystemExit):
+        watch.watch(api_url="http://api")